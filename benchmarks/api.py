@@ -0,0 +1,363 @@
+"""
+Benchmark of public methods of LemkPgApi and AsyncLemkPgApi against throwaway local PostgreSQL.
+
+Cluster is created with initdb in temporary directory (initdb and pg_ctl are taken from --pg-bin or PATH) and
+removed at the end, or existing server is used when --db-host is given. Tables are seeded with --rows rows.
+Each case is run with sync and async API at each of --concurrency levels and throughput and latency
+percentiles are written as JSON, so results of two releases can be compared.
+
+Light cases (point queries and writes) run --ops calls, heavy cases (full table reads) run --repeat calls
+at concurrency 1.
+
+Example:
+    $ python benchmarks/api.py --rows 1000000 --concurrency 1 8 32 --output results.json
+    $ python benchmarks/api.py --db-host 127.0.0.1 --db-password pass --rows 100000 --cases get_with_conditions insert
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import datetime
+import inspect
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from lemkpg import LemkPgApi, AsyncLemkPgApi
+from lemkpg.constants import INNER_JOIN, INSERT_COPY
+
+TABLE_NAME = "lemkpg_bench"
+JOIN_TABLE_NAME = "lemkpg_bench_join"
+WRITE_TABLE_NAME = "lemkpg_bench_write"
+# count of distinct values of "n" column, it is key of join table
+GROUPS = 1000
+
+
+class LocalPostgres:
+    """
+    Throwaway PostgreSQL cluster in temporary directory, server listens only on unix socket in this directory.
+    """
+
+    def __init__(self, pg_bin=None):
+        self.pg_bin = pg_bin
+        self.path = None
+
+    def get_command(self, name):
+        command = os.path.join(self.pg_bin, name) if self.pg_bin else shutil.which(name)
+        if not command or not os.path.exists(command):
+            raise SystemExit(f"{name} is not found, please define directory of PostgreSQL binaries with --pg-bin")
+        return command
+
+    def __enter__(self):
+        self.path = tempfile.mkdtemp(prefix="lemkpg_bench_")
+        data = os.path.join(self.path, "data")
+        subprocess.run([self.get_command("initdb"), "-D", data, "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+                       check=True, stdout=subprocess.DEVNULL)
+        # durability isn't needed for throwaway cluster, fsync only adds noise to results of writes
+        options = f"-k {self.path} -c listen_addresses='' -c fsync=off -c synchronous_commit=off"
+        subprocess.run([self.get_command("pg_ctl"), "start", "-w", "-D", data, "-o", options,
+                        "-l", os.path.join(self.path, "server.log")], check=True, stdout=subprocess.DEVNULL)
+        return self.path
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        subprocess.run([self.get_command("pg_ctl"), "stop", "-m", "fast", "-D", os.path.join(self.path, "data")],
+                       stdout=subprocess.DEVNULL)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class NullFile:
+    """
+    File-like object which drops data of export.
+    """
+
+    def write(self, data):
+        return len(data)
+
+
+async def seed(db_conn, rows):
+    for table_name in (TABLE_NAME, JOIN_TABLE_NAME, WRITE_TABLE_NAME):
+        await db_conn.raw_query(f"DROP TABLE IF EXISTS {table_name}")
+    fields = {"n": "integer", "price": "float8", "symbol": "text"}
+    await db_conn.create_table(TABLE_NAME, fields, primary_key=True)
+    await db_conn.create_table(WRITE_TABLE_NAME, fields, primary_key=True)
+    await db_conn.create_table(JOIN_TABLE_NAME, {"n": "integer", "info": "text"})
+    await db_conn.insert_many(TABLE_NAME, ((i % GROUPS, i / 3, f"S{i % 100}") for i in range(rows)),
+                              columns=("n", "price", "symbol"), method=INSERT_COPY)
+    await db_conn.insert_many(JOIN_TABLE_NAME, ((i, f"info {i}") for i in range(GROUPS)), method=INSERT_COPY)
+    await db_conn.raw_query(f"CREATE INDEX ON {TABLE_NAME} (n)")
+    await db_conn.raw_query(f"CREATE INDEX ON {WRITE_TABLE_NAME} (n)")
+    await db_conn.raw_query(f"CREATE UNIQUE INDEX ON {JOIN_TABLE_NAME} (n)")
+    await db_conn.raw_query(f"VACUUM ANALYZE {TABLE_NAME}")
+    await db_conn.raw_query(f"VACUUM ANALYZE {JOIN_TABLE_NAME}")
+
+
+def get_cases(rows, bulk_size):
+    """
+    :return: list with tuples (name, heavy, sync call, async call). Call gets db_conn and number of call and
+     returns result, coroutine or (async) generator. None instead of call - case isn't supported by API
+    """
+    on_condition = (f"{TABLE_NAME}.n", "=", f"{JOIN_TABLE_NAME}.n")
+    join_conditions = [(f"{TABLE_NAME}.id", "<=", GROUPS, None)]
+    bulk = [(i % GROUPS, i / 3, f"S{i % 100}") for i in range(bulk_size)]
+
+    def point(i):
+        return [("id", "=", i % rows + 1, None)]
+
+    def group(i):
+        return [("n", "=", i % GROUPS, None)]
+
+    def ddl(db_conn, i):
+        table_name = f"lemkpg_bench_ddl_{i}"
+        db_conn.create_table(table_name, {"n": "integer"}, primary_key=True)
+        db_conn.alter_table(table_name, "n", "ALTER COLUMN", "bigint")
+        db_conn.clear_table(table_name)
+        return db_conn.delete_table(table_name)
+
+    async def async_ddl(db_conn, i):
+        table_name = f"lemkpg_bench_ddl_{i}"
+        await db_conn.create_table(table_name, {"n": "integer"}, primary_key=True)
+        await db_conn.alter_table(table_name, "n", "ALTER COLUMN", "bigint")
+        await db_conn.clear_table(table_name)
+        return await db_conn.delete_table(table_name)
+
+    def batch(db_conn, i):
+        with db_conn.batch() as queries:
+            rows_future = queries.get(TABLE_NAME, ["n", "price"], point(i))
+            count_future = queries.count(TABLE_NAME, "id", group(i))
+        return rows_future.result(), count_future.result()
+
+    async def async_batch(db_conn, i):
+        async with db_conn.batch() as queries:
+            rows_future = queries.get(TABLE_NAME, ["n", "price"], point(i))
+            count_future = queries.count(TABLE_NAME, "id", group(i))
+        return rows_future.result(), count_future.result()
+
+    def transaction(db_conn, i):
+        with db_conn.transaction() as tx:
+            tx.update(WRITE_TABLE_NAME, {"price": i}, group(i))
+            return tx.get(WRITE_TABLE_NAME, ["id"], group(i))
+
+    async def async_transaction(db_conn, i):
+        async with db_conn.transaction() as tx:
+            await tx.update(WRITE_TABLE_NAME, {"price": i}, group(i))
+            return await tx.get(WRITE_TABLE_NAME, ["id"], group(i))
+
+    def same(call):
+        return call, call
+
+    return [
+        # writes go first, so update and delete_records find rows
+        ("insert", False, *same(lambda db, i: db.insert(WRITE_TABLE_NAME, (i % GROUPS, i / 3, "S"),
+                                                        ("n", "price", "symbol")))),
+        ("insert_many_values", False, *same(lambda db, i: db.insert_many(WRITE_TABLE_NAME, bulk,
+                                                                         ("n", "price", "symbol")))),
+        ("insert_many_copy", False, *same(lambda db, i: db.insert_many(WRITE_TABLE_NAME, bulk, ("n", "price", "symbol"),
+                                                                       method=INSERT_COPY))),
+        ("update", False, *same(lambda db, i: db.update(WRITE_TABLE_NAME, {"price": i}, [("id", "=", i + 1, None)]))),
+        # upserts use negative ids, so they don't conflict with ids from sequence of insert
+        ("upsert", False, *same(lambda db, i: db.upsert(WRITE_TABLE_NAME, {"id": -i - 1, "n": i % GROUPS, "price": i},
+                                                        ["id"]))),
+        ("upsert_many", False, *same(lambda db, i: db.upsert_many(WRITE_TABLE_NAME, [(-j - 1, *row) for j, row
+                                                                                     in enumerate(bulk)],
+                                                                  ("id", "n", "price", "symbol"), ["id"]))),
+        ("update_many", False, *same(lambda db, i: db.update_many(WRITE_TABLE_NAME, [(-j - 1, i) for j
+                                                                                     in range(bulk_size)],
+                                                                  ["id"], ["price"]))),
+        ("delete_records", False, *same(lambda db, i: db.delete_records(WRITE_TABLE_NAME,
+                                                                        [("id", "=", i + 1, None)]))),
+        ("transaction", False, transaction, async_transaction),
+        ("ddl", False, ddl, async_ddl),
+        ("get_with_conditions", False, *same(lambda db, i: db.get(TABLE_NAME, ["n", "price", "symbol"], point(i)))),
+        ("get_without_conditions", True, *same(lambda db, i: db.get(TABLE_NAME, ["n", "price", "symbol"]))),
+        ("get_all", True, *same(lambda db, i: db.get_all(TABLE_NAME))),
+        ("iter_all", True, *same(lambda db, i: db.iter_all(TABLE_NAME, itersize=10000))),
+        ("iter_get", False, *same(lambda db, i: db.iter_get(TABLE_NAME, ["id", "price"], group(i)))),
+        ("paginate", False, *same(lambda db, i: db.paginate(TABLE_NAME, ["n", "price"], ["id"], 100,
+                                                             after=i % rows))),
+        ("iter_pages", True, *same(lambda db, i: db.iter_pages(TABLE_NAME, ["n", "price"], ["id"], 10000))),
+        ("raw_query", False, *same(lambda db, i: db.raw_query(f"SELECT * FROM {TABLE_NAME} WHERE id = %s",
+                                                              [i % rows + 1]))),
+        ("iter_raw", False, *same(lambda db, i: db.iter_raw(f"SELECT * FROM {TABLE_NAME} WHERE n = %s",
+                                                            [i % GROUPS]))),
+        ("query_compiled", False, *same(lambda db, i: db.query(TABLE_NAME).select("n", "price").where("id", "=")
+                                        .compile()(i % rows + 1))),
+        ("fetch_columns", True, *same(lambda db, i: db.fetch_columns(f"SELECT n, price FROM {TABLE_NAME}"))),
+        ("fetch_numpy", True, *same(lambda db, i: db.fetch_numpy(f"SELECT n, price FROM {TABLE_NAME}"))),
+        ("export", True, *same(lambda db, i: db.export(TABLE_NAME, NullFile()))),
+        ("parallel_scan", True, *same(lambda db, i: db.parallel_scan(TABLE_NAME, ["n", "price"], partitions=8))),
+        ("get_with_join", False, *same(lambda db, i: db.get_with_join(TABLE_NAME, JOIN_TABLE_NAME, INNER_JOIN, ["*"],
+                                                                      on_condition, join_conditions))),
+        ("inner_join", False, *same(lambda db, i: db.inner_join(TABLE_NAME, JOIN_TABLE_NAME, on_condition,
+                                                                join_conditions))),
+        ("left_join", False, *same(lambda db, i: db.left_join(TABLE_NAME, JOIN_TABLE_NAME, on_condition,
+                                                              join_conditions))),
+        ("right_join", False, *same(lambda db, i: db.right_join(TABLE_NAME, JOIN_TABLE_NAME, on_condition,
+                                                                join_conditions))),
+        ("full_join", False, *same(lambda db, i: db.full_join(TABLE_NAME, JOIN_TABLE_NAME, on_condition,
+                                                              join_conditions))),
+        ("count", False, *same(lambda db, i: db.count(TABLE_NAME, "id", group(i)))),
+        ("avg", False, *same(lambda db, i: db.avg(TABLE_NAME, "price", group(i)))),
+        ("sum", False, *same(lambda db, i: db.sum(TABLE_NAME, "price", group(i)))),
+        ("min", False, *same(lambda db, i: db.min(TABLE_NAME, "price", group(i)))),
+        ("max", False, *same(lambda db, i: db.max(TABLE_NAME, "price", group(i)))),
+        ("aggregate_group_by", True, *same(lambda db, i: db.aggregate(TABLE_NAME, {"count": "id", "avg": "price"},
+                                                                      group_by=["n"]))),
+        ("batch", False, batch, async_batch),
+        ("map", False, None, lambda db, i: db.map("get", [(TABLE_NAME, ["n"], point(i + j)) for j in range(10)])),
+        ("gather", False, None, lambda db, i: db.gather(*(db.count(TABLE_NAME, "id", group(i + j))
+                                                          for j in range(10)))),
+    ]
+
+
+def get_summary(name, api, concurrency, latencies, elapsed):
+    latencies = sorted(latencies)
+
+    def percentile(percent):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+
+    return {
+        "case": name,
+        "api": api,
+        "concurrency": concurrency,
+        "ops": len(latencies),
+        "seconds": elapsed,
+        "ops_per_second": len(latencies) / elapsed,
+        "latency": {
+            "mean": sum(latencies) / len(latencies),
+            "p50": percentile(50),
+            "p95": percentile(95),
+            "p99": percentile(99),
+            "max": latencies[-1],
+        },
+    }
+
+
+def run_sync(db_conn, call, ops, concurrency):
+    numbers = itertools.count()
+
+    def worker():
+        latencies = []
+        for i in numbers:
+            if i >= ops:
+                return latencies
+            started = time.perf_counter()
+            result = call(db_conn, i)
+            if inspect.isgenerator(result):
+                for _ in result:
+                    pass
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        results = [future.result() for future in [executor.submit(worker) for _ in range(concurrency)]]
+    return list(itertools.chain.from_iterable(results)), time.perf_counter() - started
+
+
+async def run_async(db_conn, call, ops, concurrency):
+    numbers = itertools.count()
+    latencies = []
+
+    async def worker():
+        for i in numbers:
+            if i >= ops:
+                return
+            started = time.perf_counter()
+            result = call(db_conn, i)
+            if inspect.isasyncgen(result):
+                async for _ in result:
+                    pass
+            else:
+                await result
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+async def main(args):
+    with contextlib.ExitStack() as stack:
+        host = args.db_host or stack.enter_context(LocalPostgres(args.pg_bin))
+        credentials = dict(db_name=args.db_name, db_user=args.db_user, db_password=args.db_password, db_host=host,
+                           pool_maxsize=args.pool_maxsize or max(args.concurrency))
+        async with AsyncLemkPgApi(**credentials) as db_conn:
+            await seed(db_conn, args.rows)
+            server_version = (await db_conn.raw_query("SHOW server_version"))[0][0]
+        cases = [case for case in get_cases(args.rows, args.bulk_size) if not args.cases or case[0] in args.cases]
+        results = []
+        for api in ("sync", "async"):
+            for concurrency in args.concurrency:
+                # new instance for each level, so pool isn't warmed up by previous runs
+                if api == "sync":
+                    db_conn = LemkPgApi(**credentials)
+                else:
+                    db_conn = AsyncLemkPgApi(**credentials)
+                for name, heavy, sync_call, async_call in cases:
+                    call = sync_call if api == "sync" else async_call
+                    if call is None or (heavy and concurrency != min(args.concurrency)):
+                        continue
+                    ops = args.repeat if heavy else args.ops
+                    try:
+                        if api == "sync":
+                            latencies, elapsed = run_sync(db_conn, call, ops, 1 if heavy else concurrency)
+                        else:
+                            latencies, elapsed = await run_async(db_conn, call, ops, 1 if heavy else concurrency)
+                        result = get_summary(name, api, 1 if heavy else concurrency, latencies, elapsed)
+                    except Exception as e:
+                        # e.g. fetch_numpy without numpy
+                        result = {"case": name, "api": api, "concurrency": concurrency, "error": repr(e)}
+                    results.append(result)
+                    print(f"{api:>5} {result['concurrency']:>3} {name:>22}: "
+                          f"{result.get('ops_per_second', 0):10.1f} ops/s"
+                          f"{'  ' + result['error'] if 'error' in result else ''}", file=sys.stderr)
+                if api == "sync":
+                    db_conn.close()
+                else:
+                    await db_conn.close()
+        async with AsyncLemkPgApi(**credentials) as db_conn:
+            for table_name in (TABLE_NAME, JOIN_TABLE_NAME, WRITE_TABLE_NAME):
+                await db_conn.raw_query(f"DROP TABLE IF EXISTS {table_name}")
+    report = {
+        "meta": {
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server_version": server_version,
+            "rows": args.rows,
+            "bulk_size": args.bulk_size,
+            "ops": args.ops,
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pg-bin", help="directory with initdb and pg_ctl of throwaway cluster")
+    parser.add_argument("--db-host", help="host of existing server instead of throwaway cluster")
+    parser.add_argument("--db-name", default="postgres")
+    parser.add_argument("--db-user", default="postgres")
+    parser.add_argument("--db-password", default="postgres")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--bulk-size", type=int, default=1000, help="count of rows in one call of insert_many")
+    parser.add_argument("--ops", type=int, default=1000, help="count of calls of light cases")
+    parser.add_argument("--repeat", type=int, default=3, help="count of calls of heavy cases")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--pool-maxsize", type=int, help="max size of pool. Default - max concurrency")
+    parser.add_argument("--cases", nargs="+", help="names of cases to run. Default - all cases")
+    parser.add_argument("--output", help="path of JSON file with results. Default - stdout")
+    asyncio.run(main(parser.parse_args()))
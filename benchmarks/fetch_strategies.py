@@ -0,0 +1,67 @@
+"""
+Compare fetch strategies of LemkPgApi on big results of get_all and get_with_join.
+
+Example:
+    $ python benchmarks/fetch_strategies.py --db-name demo_db --db-user postgres --db-password pass --rows 100000
+"""
+import argparse
+import asyncio
+import time
+
+from lemkpg import AsyncLemkPgApi
+from lemkpg.constants import FETCH_STRATEGIES, INNER_JOIN
+
+TABLE_NAME = "lemkpg_bench_fetch"
+JOIN_TABLE_NAME = "lemkpg_bench_fetch_join"
+
+
+async def seed(db_conn, rows):
+    await db_conn.delete_table(TABLE_NAME)
+    await db_conn.delete_table(JOIN_TABLE_NAME)
+    await db_conn.create_table(TABLE_NAME, {"n": "integer", "price": "float8", "symbol": "text"}, primary_key=True)
+    await db_conn.create_table(JOIN_TABLE_NAME, {"n": "integer", "info": "text"})
+    await db_conn.insert_many(TABLE_NAME, ((i, i / 3, f"S{i % 100}") for i in range(rows)),
+                              columns=("n", "price", "symbol"), method="copy")
+    await db_conn.insert_many(JOIN_TABLE_NAME, ((i, f"info {i}") for i in range(rows)), method="copy")
+
+
+async def measure(db_conn, repeat):
+    timings = {}
+    for name, call in [
+        ("get_all", lambda: db_conn.get_all(TABLE_NAME)),
+        ("get_with_join", lambda: db_conn.get_with_join(TABLE_NAME, JOIN_TABLE_NAME, INNER_JOIN, ["*"],
+                                                        (f"{TABLE_NAME}.n", "=", f"{JOIN_TABLE_NAME}.n"))),
+    ]:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = await call()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = (best, len(result))
+    return timings
+
+
+async def main(args):
+    credentials = dict(db_name=args.db_name, db_user=args.db_user, db_password=args.db_password, db_host=args.db_host)
+    async with AsyncLemkPgApi(**credentials) as db_conn:
+        await seed(db_conn, args.rows)
+    for strategy in FETCH_STRATEGIES:
+        async with AsyncLemkPgApi(**credentials, fetch_strategy=strategy, fetch_size=args.fetch_size) as db_conn:
+            for name, (elapsed, count) in (await measure(db_conn, args.repeat)).items():
+                print(f"{strategy:>10} {name:>14}: {elapsed:8.3f} s, {elapsed / count * 1e6:6.2f} us per row")
+    async with AsyncLemkPgApi(**credentials) as db_conn:
+        await db_conn.delete_table(TABLE_NAME)
+        await db_conn.delete_table(JOIN_TABLE_NAME)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-name", default="postgres")
+    parser.add_argument("--db-user", default="postgres")
+    parser.add_argument("--db-password", default="postgres")
+    parser.add_argument("--db-host", default="127.0.0.1")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--fetch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
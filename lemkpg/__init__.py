@@ -1,19 +1,34 @@
 import asyncio
-import sys
+import concurrent.futures
+import contextlib
+import copy
 
+from .engine import LemkPgEngine, LemkPgTransactionEngine, LemkPgLoopThread
 from .utils import LemkPgUtils
+from .columns import LemkPgColumns
+from .batch import LemkPgBatch
+from .query import LemkPgQuery
+from .metrics import LemkPgMetrics
 from .exceptions import LemkPgError
-from .constants import JOINS_LIST
+from .constants import (GET_ALL_COLUMNS, INNER_JOIN, LEFT_JOIN, RIGHT_JOIN, FULL_OUTER_JOIN, INSERT_VALUES,
+                        INSERT_COPY, INSERT_METHODS, COUNT, AVG, SUM, MIN, MAX, FETCH_ALL,
+                        EXPORT_CSV, ROUND_ROBIN, ORDER_BY_ASC, ID)
 
 
 class LemkPgApi:
     """
     LemkPgApi class give API interface for quick access to PostgreSQL DB via async way.
     You can use CRUD and other DB operations with some methods above.
-    This DB API will be work only with Python 3.5 and greater versions.
+    Each instance owns one connection pool which is created on first query and lives until close() is called.
+    This DB API will be work only with Python 3.7 and greater versions.
     """
 
-    def __init__(self, db_name: str, db_user: str, db_password: str, db_host: str, *args, **kwargs):
+    def __init__(self, db_name: str, db_user: str, db_password: str, db_host: str, *args,
+                 pool_minsize=1, pool_maxsize=10, pool_idle_timeout=-1.0, statement_cache_size=0,
+                 fetch_strategy=FETCH_ALL, fetch_size=1000, row_factory=None, replicas=None,
+                 replica_strategy=ROUND_ROBIN, replica_retry_interval=30.0, result_cache_size=0, result_cache_ttl=60.0,
+                 result_cache_memory=None, result_cache_channel=None, query_metrics=False, slow_query_time=None,
+                 pool_stats_callback=None, pool_stats_interval=60.0, **kwargs):
         """
         You can create db_connect of LemkPgApi when you define all required attrs.
         Example of db_connect creation:
@@ -24,6 +39,39 @@ class LemkPgApi:
         :param db_password: string with password for selected user
         :param db_host: string with database host
         :param args: additional attr
+        :param pool_minsize: minimal count of opened connections in pool. Default 1
+        :param pool_maxsize: maximal count of opened connections in pool. Default 10
+        :param pool_idle_timeout: seconds after which idle connection will be reopened. Default -1 (never)
+        :param statement_cache_size: max count of prepared statements kept for each connection of pool.
+         Default 0 (queries are not prepared)
+        :param fetch_strategy: string with way of fetching result rows: "fetchall" - all rows at once (default),
+         "fetchmany" - by fetch_size rows, "iterate" - row by row
+        :param fetch_size: count of rows fetched at once with "fetchmany" strategy. Default 1000
+        :param row_factory: None, callable or string with type of result rows: "tuple" (default), "dict",
+         "namedtuple", "record" (compact object with __slots__) or "columns" (dict with column name and list
+         of its values, or array.array for numeric columns). Callable gets cursor.description and list of tuples
+        :param replicas: None or list with replica hosts (db_name, db_user and db_password are the same as for
+         db_host) or DSN strings of replicas. Read-only queries (get_all, get, joins, aggregates, raw_query with
+         readonly=True) are balanced across replicas, other queries go to primary db_host
+        :param replica_strategy: string with way of replica selection: "round_robin" (default) or "least_busy"
+         (replica with the fewest queries in progress)
+        :param replica_retry_interval: seconds during which replica isn't used after connection error. Default 30
+        :param result_cache_size: max count of cached results of get_all, get, joins and aggregates.
+         Default 0 (results are not cached). Writes through this instance (insert, insert_many, update,
+         delete_records, clear_table, delete_table, alter_table) evict cached results of their table
+        :param result_cache_ttl: seconds after which cached result expires. Default 60
+        :param result_cache_memory: None or max approximate size of cached results in bytes. Default None (no limit)
+        :param result_cache_channel: None or name of PostgreSQL channel for invalidation of result cache between
+         processes. Writes of this instance send NOTIFY with table name to this channel and background listener
+         evicts cached results of tables changed by other processes. Default None (only local invalidation)
+        :param query_metrics: True for aggregation of timings of queries by their shape (SQL text with placeholders
+         instead of values), see query_stats(). Default False
+        :param slow_query_time: None or seconds after which query is logged as slow with warning of "lemkpg"
+         logger. Default None
+        :param pool_stats_callback: None or callable which gets result of pool_stats() each pool_stats_interval
+         seconds (e.g. for export of stats to monitoring). It is called in event loop of db_conn, so it shouldn't
+         block. Default None
+        :param pool_stats_interval: seconds between calls of pool_stats_callback. Default 60
         :param kwargs: additional attr
         """
         self.db_name = db_name
@@ -31,15 +79,197 @@ class LemkPgApi:
         self.db_password = db_password
         self.db_host = db_host
         self.dsn = f"dbname={self.db_name} user={self.db_user} password={self.db_password} host={self.db_host}"
+        self.replica_dsns = [replica if "=" in replica else
+                             f"dbname={self.db_name} user={self.db_user} password={self.db_password} host={replica}"
+                             for replica in replicas or []]
+        self._engine = LemkPgEngine(self.dsn, minsize=pool_minsize, maxsize=pool_maxsize,
+                                    idle_timeout=pool_idle_timeout, statement_cache_size=statement_cache_size,
+                                    fetch_strategy=fetch_strategy, fetch_size=fetch_size, row_factory=row_factory,
+                                    replica_dsns=self.replica_dsns, replica_strategy=replica_strategy,
+                                    replica_retry_interval=replica_retry_interval,
+                                    result_cache_size=result_cache_size, result_cache_ttl=result_cache_ttl,
+                                    result_cache_memory=result_cache_memory, cache_channel=result_cache_channel,
+                                    query_metrics=query_metrics, slow_query_time=slow_query_time,
+                                    pool_stats_callback=pool_stats_callback, pool_stats_interval=pool_stats_interval)
+        self._loop_thread = LemkPgLoopThread()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def _run_async(self, func):
-        # check python version
-        if sys.version_info[1] < 7:
-            # if python3 version less then python3.7 - run this case
-            return asyncio.get_event_loop().run_until_complete(func)
-        else:
-            # if python3 version equal or greater then python3.7 - run this case
-            return asyncio.run(func)
+        # all queries of this instance run in one background event loop, so pool is bound to it
+        return self._loop_thread.run(func)
+
+    def _run_async_iter(self, batches):
+        # rows are taken from background loop by batches, not one by one
+        for batch in self._loop_thread.iterate(batches):
+            yield from batch
+
+    def close(self):
+        """
+        >>> db_conn.close()
+
+        Close connection pool of this instance. Pool will be opened again on next query.
+        """
+        if self._engine.in_transaction:
+            # db_conn of transaction shares pool and event loop with parent db_conn
+            return
+        if not self._engine.closed:
+            self._run_async(self._engine.close())
+        self._loop_thread.stop()
+
+    def statement_cache_stats(self):
+        """
+        >>> db_conn.statement_cache_stats()
+
+        :return: dict with size, hits, misses and count of prepared statements of statement cache
+        """
+        return self._engine.statements.stats()
+
+    def result_cache_stats(self):
+        """
+        >>> db_conn.result_cache_stats()
+
+        :return: dict with size, count of entries, approximate memory in bytes, hits, misses, hit_rate,
+         evictions and invalidations of result cache
+        """
+        return self._engine.cache.stats()
+
+    def pool_stats(self):
+        """
+        >>> db_conn.pool_stats()
+
+        :return: dict with size, minsize and maxsize of connection pool, count of connections in_use and idle,
+         count of queries waiting for connection, acquires (count of taken connections), wait_time, mean_wait and
+         max_wait (seconds of waiting for connection), wait_histogram (upper bound of bucket in seconds and count
+         of acquires), opened and closed (count of connections opened and closed by pool), broken (connections
+         closed because of error) and recycled (connections closed by pool_idle_timeout or after failed
+         transaction). Stats of replicas are in "replicas" list
+        """
+        return self._engine.get_pool_stats()
+
+    def add_query_hook(self, before=None, after=None):
+        """
+        >>> db_conn.add_query_hook(before=lambda method, query, param_count: print(method, query))
+        >>> db_conn.add_query_hook(after=lambda method, query, param_count, timings: print(timings["time"]))
+
+        Add hooks, which are called before and after each query of this instance (and of its transactions).
+        Errors of hooks are logged and don't break queries.
+
+        :param before: None or callable which gets name of method, SQL text and count of params
+        :param after: None or callable which gets name of method, SQL text, count of params and dict with
+         timings: "time" (seconds of query), "acquire", "execute", "fetch" and "convert" (seconds of phases),
+         "rows" (count of rows), "bytes" (count of bytes of COPY data) and "error" (None or exception)
+        """
+        if before is not None:
+            self._engine.metrics.before_hooks.append(before)
+        if after is not None:
+            self._engine.metrics.after_hooks.append(after)
+
+    def remove_query_hook(self, before=None, after=None):
+        """
+        >>> db_conn.remove_query_hook(before=print_query)
+
+        :param before: None or callable which was added as before hook
+        :param after: None or callable which was added as after hook
+        """
+        if before is not None:
+            self._engine.metrics.before_hooks.remove(before)
+        if after is not None:
+            self._engine.metrics.after_hooks.remove(after)
+
+    def query_stats(self):
+        """
+        >>> db_conn.query_stats()
+
+        Timings of queries aggregated by shape of query (db_conn should be created with query_metrics=True).
+
+        :return: dict with shape of query and dict with its count, errors, total, mean, p50, p95, p99 and max
+         (seconds), rows, bytes, phases (mean seconds of acquire, execute, fetch and convert) and methods
+         (count of queries by method name). The slowest shapes by total time are first
+        """
+        return self._engine.metrics.stats()
+
+    def reset_query_stats(self):
+        """
+        >>> db_conn.reset_query_stats()
+        """
+        self._engine.metrics.reset()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        >>> with db_conn.batch() as batch:
+        ...     rows = batch.get("demo", ["date", "symbol"], [("id", "=", 1, None)])
+        ...     count = batch.count("demo", "id")
+        ...     batch.insert("demo", (3, "2006-01-05", "BUY", "RHAT", 35.14))
+        >>> rows.result(), count.result()
+
+        Queries are executed when block is exited: consecutive writes (insert, update, delete_records) are sent
+        as one multi-statement query in one transaction, consecutive reads run concurrently on connections of pool.
+        Batch has get_all, get, raw_query, get_with_join, aggregate, count, avg, sum, min, max, insert, update
+        and delete_records methods, which return concurrent.futures.Future with result of query.
+        If query fails, its future gets exception, futures of next queries are cancelled and exception is raised.
+        """
+        batch = LemkPgBatch(self._engine, concurrent.futures.Future)
+        try:
+            yield batch
+        except BaseException:
+            batch.cancel()
+            raise
+        self._run_async(batch.execute())
+
+    @contextlib.contextmanager
+    def transaction(self, isolation=None, readonly=False):
+        """
+        >>> with db_conn.transaction(isolation="SERIALIZABLE") as tx:
+        ...     tx.insert("demo", (3, "2006-01-05", "BUY", "RHAT", 35.14))
+        ...     tx.update("demo", {"price": 40}, [("id", "=", 3, None)])
+
+        All queries of transaction run on one connection of pool and are committed together at the end of block
+        (or rolled back if block raises exception). Transaction inside transaction is done with SAVEPOINT.
+        insert_many with "copy" method, export, fetch_columns and fetch_numpy can't be used inside transaction.
+
+        :param isolation: None or string with isolation level ("READ COMMITTED", "REPEATABLE READ" or "SERIALIZABLE").
+         Default None (default level of database)
+        :param readonly: True for READ ONLY transaction
+        :return: db_conn with the same methods bound to connection of transaction
+        """
+
+        async def begin():
+            return await LemkPgTransactionEngine(self._engine, isolation, readonly).begin()
+
+        engine = self._run_async(begin())
+        tx = copy.copy(self)
+        tx._engine = engine
+        try:
+            yield tx
+        except BaseException:
+            self._run_async(engine.end(commit=False))
+            raise
+        self._run_async(engine.end())
+
+    def query(self, table_name: str):
+        """
+        >>> get_by_date = db_conn.query("demo").select("date", "symbol").where("date", "=").order_by("date").compile()
+        >>> get_by_date("2006-01-05")
+        >>> set_price = db_conn.query("demo").update("price").where("id", "=").compile()
+        >>> set_price(40, 3)
+
+        Query is built step by step with select, distinct, join, where, or_where, order_by, update and delete methods
+        and compiled once to SQL text with slots for values. Calling of compiled query only binds values and runs it.
+
+        :param table_name: string with table name
+        :return: LemkPgQuery
+        """
+
+        def executor(compiled, params, row_factory):
+            return self._run_async(compiled.run(self._engine, params, row_factory))
+
+        return LemkPgQuery(table_name, executor)
 
     def create_table(self, table_name: str, fields: dict, primary_key=False):
         """
@@ -57,7 +287,7 @@ class LemkPgApi:
                 query = f"""CREATE TABLE IF NOT EXISTS {table_name} ({", ".join(new_fields)})"""
             else:
                 query = f"""CREATE TABLE IF NOT EXISTS {table_name} (id SERIAL PRIMARY KEY, {", ".join(new_fields)})"""
-            await LemkPgUtils.execute_query(self.dsn, query)
+            await LemkPgUtils.execute_query(self._engine, query, tables=[table_name])
             return True
 
         return self._run_async(func())
@@ -73,31 +303,131 @@ class LemkPgApi:
         """
 
         async def func():
-            query = f"""INSERT INTO {table_name} {'(' + ', '.join(columns) + ')' if columns else ''} VALUES {values}"""
-            await LemkPgUtils.execute_query(self.dsn, query)
+            query, params = LemkPgUtils.get_insert_query(table_name, values, columns)
+            await LemkPgUtils.execute_query(self._engine, query, params, [table_name])
             return True
 
         return self._run_async(func())
 
-    def get_all(self, table_name: str, order_by=None, sort_type=None):
+    def insert_many(self, table_name: str, rows, columns=None, method=INSERT_VALUES, chunk_size=1000):
+        """
+        >>> db_conn.insert_many("demo", [(1, '2006-01-05', 'Some Text', 'A'), (2, '2006-01-06', 'Text', 'B')])
+
+        :param table_name: string with table name
+        :param rows: iterable (list, generator, etc.) with tuples of values
+        :param columns: None or tuple with columns
+        :param method: string with insert method (e.g. "values" or "copy"). Default "values".
+                 "values" - rows are inserted by multi-row INSERT statements with chunk_size rows in each
+                 "copy" - rows are streamed to the table via COPY FROM STDIN
+        :param chunk_size: count of rows in one INSERT statement (used only with "values" method). Default 1000
+        :return: True if query success
+        """
+
+        async def func():
+            if method not in INSERT_METHODS:
+                message = f"Incorrect insert method. Please use one of the valid methods: {', '.join(INSERT_METHODS)}"
+                raise LemkPgError(message)
+            if method == INSERT_COPY:
+                return await LemkPgUtils.copy_from(self._engine, table_name, rows, columns)
+            return await LemkPgUtils.insert_values(self._engine, table_name, rows, columns, chunk_size)
+
+        return self._run_async(func())
+
+    def upsert(self, table_name: str, row: dict, conflict_columns: list, update_columns=None, return_keys=False):
+        """
+        >>> db_conn.upsert("demo", {"id": 1, "date": "2006-01-05", "symbol": "A"}, conflict_columns=["id"])
+
+        Insert row or update existing row with the same key in one statement (INSERT ... ON CONFLICT DO UPDATE).
+
+        :param table_name: string with table name
+        :param row: dict with columns and their values
+        :param conflict_columns: list with columns of unique index or primary key, which define conflicting row
+        :param update_columns: None or list with columns, which are updated in conflicting row by new values.
+         Default None (all columns except conflict_columns). Empty list - conflicting row is left as is
+        :param return_keys: True for list with tuples of conflict_columns values of inserted and updated rows
+         instead of True. Default False
+        :return: True (or list with keys) if query success
+        """
+
+        async def func():
+            return await LemkPgUtils.upsert_values(self._engine, table_name, [tuple(row.values())], tuple(row),
+                                                   conflict_columns, update_columns, return_keys=return_keys)
+
+        return self._run_async(func())
+
+    def upsert_many(self, table_name: str, rows, columns: tuple, conflict_columns: list, update_columns=None,
+                    chunk_size=1000, return_keys=False):
+        """
+        >>> db_conn.upsert_many("demo", [(1, "2006-01-05", "A"), (2, "2006-01-06", "B")], ("id", "date", "symbol"),
+        ...                     conflict_columns=["id"], update_columns=["date"])
+
+        Insert rows or update existing rows with the same key by multi-row INSERT ... ON CONFLICT DO UPDATE
+        statements with chunk_size rows in each. All chunks are upserted in one transaction. If rows of one chunk
+        have the same key, the last of them is used.
+
+        :param table_name: string with table name
+        :param rows: iterable (list, generator, etc.) with tuples of values
+        :param columns: tuple with columns of values
+        :param conflict_columns: list with columns of unique index or primary key, which define conflicting row
+        :param update_columns: None or list with columns, which are updated in conflicting row by new values.
+         Default None (all columns except conflict_columns). Empty list - conflicting row is left as is
+        :param return_keys: True for list with tuples of conflict_columns values of inserted and updated rows
+         instead of True. Default False
+        :param chunk_size: count of rows in one statement. Default 1000
+        :return: True (or list with keys) if query success
+        """
+
+        async def func():
+            return await LemkPgUtils.upsert_values(self._engine, table_name, rows, columns, conflict_columns,
+                                                   update_columns, chunk_size, return_keys)
+
+        return self._run_async(func())
+
+    def get_all(self, table_name: str, order_by=None, sort_type=None, row_factory=None):
         """
         >>> db_conn.get_all("demo")
 
         :param table_name: string with table name
         :param order_by: string with column for ordering
         :param sort_type: string with type of ordering (ASC / DESC)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
 
         async def func():
-            sort = f"{' ORDER BY ' + order_by + ' ' + sort_type if order_by and sort_type else ''}"
-            query = f"""SELECT * FROM {table_name}{sort}"""
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
+            query, params = LemkPgUtils.get_select_query(table_name, GET_ALL_COLUMNS,
+                                                         order_by=order_by, sort_type=sort_type)
+            result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                        row_factory=row_factory, readonly=True,
+                                                        tables=[table_name])
             return result
 
         return self._run_async(func())
 
-    def get(self, table_name: str, fields: list, conditions_list=None, distinct=False, order_by=None, sort_type=None):
+    def iter_all(self, table_name: str, order_by=None, sort_type=None, itersize=1000, row_factory=None):
+        """
+        >>> for row in db_conn.iter_all("demo"):
+        ...     print(row)
+
+        Rows are fetched from server-side cursor by itersize rows, so memory doesn't depend on result size.
+        Connection of pool is held until all rows are fetched or iteration is stopped.
+
+        :param table_name: string with table name
+        :param order_by: string with column for ordering
+        :param sort_type: string with type of ordering (ASC / DESC)
+        :param itersize: count of rows fetched from server in one round-trip. Default 1000
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :return: generator with rows
+        """
+        query, params = LemkPgUtils.get_select_query(table_name, GET_ALL_COLUMNS,
+                                                     order_by=order_by, sort_type=sort_type)
+        return self._run_async_iter(LemkPgUtils.iter_query_batches(self._engine, query, params, itersize,
+                                                                   row_factory, readonly=True))
+
+    def get(self, table_name: str, fields: list, conditions_list=None, distinct=False, order_by=None, sort_type=None,
+            row_factory=None):
         """
         >>> db_conn.get("demo", ["date", "symbol"], conditions_list=[("date", "=", "2006-01-05", None)], distinct=True)
 
@@ -113,23 +443,119 @@ class LemkPgApi:
         :param distinct: bool value. Default False. If True - get unique records
         :param order_by: string with column for ordering
         :param sort_type: string with type of ordering (ASC / DESC)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
 
         async def func():
-            dist = f"{'DISTINCT ' if distinct else ''}"
-            sort = f"{' ORDER BY ' + order_by + ' ' + sort_type if order_by and sort_type else ''}"
-            if conditions_list:
-                conditions = LemkPgUtils.get_conditions(conditions_list)
-                query = f"""SELECT {dist}{", ".join(fields)} FROM {table_name} WHERE {" ".join(
-                    conditions)}{sort}"""
-            else:
-                query = f"""SELECT {dist}{", ".join(fields)} FROM {table_name}{sort}"""
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
+            query, params = LemkPgUtils.get_select_query(table_name, fields, conditions_list, distinct,
+                                                         order_by, sort_type)
+            result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                        row_factory=row_factory, readonly=True,
+                                                        tables=[table_name])
             return result
 
         return self._run_async(func())
 
+    def iter_get(self, table_name: str, fields: list, conditions_list=None, distinct=False, order_by=None,
+                 sort_type=None, itersize=1000, row_factory=None):
+        """
+        >>> for row in db_conn.iter_get("demo", ["date", "symbol"], conditions_list=[("symbol", "=", "A", None)]):
+        ...     print(row)
+
+        Rows are fetched from server-side cursor by itersize rows, so memory doesn't depend on result size.
+        Connection of pool is held until all rows are fetched or iteration is stopped.
+
+        :param table_name: string with table name
+        :param fields: list with fields for selection
+        :param conditions_list: list with tuples with conditions in it. In each tuple should be defined four values:
+                 1) column for assert in WHERE clause (e.g. "date")
+                 2) operand for assert column (e.g. "=", or "!=")
+                 3) value for assert (e.g. "2006-01-05")
+                 4) additional value if you need more then one conditions in where clause.
+                    if one tuple in list - this value should be None. If more then one tuple in conditions_list -
+                    this value should be string (e.g. "AND", or "OR")
+        :param distinct: bool value. Default False. If True - get unique records
+        :param order_by: string with column for ordering
+        :param sort_type: string with type of ordering (ASC / DESC)
+        :param itersize: count of rows fetched from server in one round-trip. Default 1000
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :return: generator with rows
+        """
+        query, params = LemkPgUtils.get_select_query(table_name, fields, conditions_list, distinct,
+                                                     order_by, sort_type)
+        return self._run_async_iter(LemkPgUtils.iter_query_batches(self._engine, query, params, itersize,
+                                                                   row_factory, readonly=True))
+
+    def paginate(self, table_name: str, fields: list, order_by: list, page_size=100, after=None, conditions_list=None,
+                 sort_type=ORDER_BY_ASC, row_factory=None):
+        """
+        >>> rows, cursor = db_conn.paginate("demo", ["id", "date"], order_by=["id"], page_size=50)
+        >>> next_rows, next_cursor = db_conn.paginate("demo", ["id", "date"], ["id"], page_size=50, after=cursor)
+
+        Keyset pagination: page starts after the key of the last row of previous page
+        (WHERE (a, b) > (%s, %s) ORDER BY a, b LIMIT n), so deep pages are as fast as the first one
+        if there is index on order_by columns.
+
+        :param table_name: string with table name
+        :param fields: list with fields of result
+        :param order_by: list with columns of unique key (e.g. ["id"] or ["date", "id"]), which define order of rows
+        :param page_size: count of rows on page. Default 100
+        :param conditions_list: list with tuples with conditions in it. In each tuple should be defined four values:
+                 1) column for assert in WHERE clause (e.g. "date")
+                 2) operand for assert column (e.g. "=", or "!=")
+                 3) value for assert (e.g. "2006-01-05")
+                 4) additional value if you need more then one conditions in where clause.
+                    if one tuple in list - this value should be None. If more then one tuple in conditions_list -
+                    this value should be string (e.g. "AND", or "OR")
+        :param sort_type: string with type of ordering for all order_by columns (ASC / DESC). Default ASC
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :param after: None (first page) or cursor returned with previous page
+        :return: tuple with list of rows and cursor of next page (tuple with key of the last row, None for last page)
+        """
+
+        async def func():
+            return await LemkPgUtils.get_page(self._engine, table_name, fields, order_by, page_size, after,
+                                              conditions_list, sort_type, row_factory)
+
+        return self._run_async(func())
+
+    def iter_pages(self, table_name: str, fields: list, order_by: list, page_size=100, conditions_list=None,
+                   sort_type=ORDER_BY_ASC, row_factory=None):
+        """
+        >>> for rows in db_conn.iter_pages("demo", ["id", "date"], order_by=["id"], page_size=1000):
+        ...     print(len(rows))
+
+        Walk whole table (or rows matching conditions_list) page by page with keyset pagination.
+
+        :param table_name: string with table name
+        :param fields: list with fields of result
+        :param order_by: list with columns of unique key (e.g. ["id"] or ["date", "id"]), which define order of rows
+        :param page_size: count of rows on page. Default 100
+        :param conditions_list: list with tuples with conditions in it. In each tuple should be defined four values:
+                 1) column for assert in WHERE clause (e.g. "date")
+                 2) operand for assert column (e.g. "=", or "!=")
+                 3) value for assert (e.g. "2006-01-05")
+                 4) additional value if you need more then one conditions in where clause.
+                    if one tuple in list - this value should be None. If more then one tuple in conditions_list -
+                    this value should be string (e.g. "AND", or "OR")
+        :param sort_type: string with type of ordering for all order_by columns (ASC / DESC). Default ASC
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :return: generator with pages (lists of rows)
+        """
+        after = None
+        while True:
+            rows, after = self.paginate(table_name, fields, order_by, page_size, after, conditions_list, sort_type,
+                                        row_factory)
+            if rows:
+                yield rows
+            if after is None:
+                return
+
     def update(self, table_name: str, fields: dict, conditions_list=None):
         """
         >>> db_conn.update("demo", {"date": "2005-01-05", "symbol": "Adc"}, [("date", "=", "2006-01-05", None),
@@ -148,18 +574,34 @@ class LemkPgApi:
         """
 
         async def func():
-            columns_for_update = [f"{field[0]} = '{field[1]}'" for field in fields.items()]
-            if conditions_list:
-                conditions = LemkPgUtils.get_conditions(conditions_list)
-                query = f"""UPDATE {table_name} SET {", ".join(columns_for_update)} WHERE {" ".join(
-                    conditions)}"""
-            else:
-                query = f"""UPDATE {table_name} SET {", ".join(columns_for_update)}"""
-            result = await LemkPgUtils.execute_query(self.dsn, query)
+            query, params = LemkPgUtils.get_update_query(table_name, fields, conditions_list)
+            result = await LemkPgUtils.execute_query(self._engine, query, params, [table_name])
             return result
 
         return self._run_async(func())
 
+    def update_many(self, table_name: str, rows, key_columns: list, set_columns: list):
+        """
+        >>> db_conn.update_many("demo", [(1, "RHAT", 35.14), (2, "IBM", 41.5)], ["id"], ["symbol", "price"])
+        2
+
+        COPY rows into temporary table and update rows of table by one UPDATE ... FROM statement in one
+        transaction, so many rows with different values are updated in a few round-trips. Rows are matched by
+        key_columns, rows of table without new values are left as is. If rows have the same key, which of them
+        is applied isn't defined. COPY isn't supported inside transaction().
+
+        :param table_name: string with table name
+        :param rows: iterable (list, generator, etc.) with tuples of values of key_columns and then of set_columns
+        :param key_columns: list with columns which identify row (e.g. ["id"])
+        :param set_columns: list with columns which are updated
+        :return: count of updated rows
+        """
+
+        async def func():
+            return await LemkPgUtils.update_from_copy(self._engine, table_name, rows, key_columns, set_columns)
+
+        return self._run_async(func())
+
     def alter_table(self, table_name: str, column_name: str, action: str, column_type=None):
         """
         >>> db_conn.alter_table("demo", "date", "ALTER COLUMN", column_type="varchar")
@@ -174,27 +616,144 @@ class LemkPgApi:
         async def func():
             query = (f"""ALTER TABLE {table_name} {action} {column_name}"""
                      f"""{' TYPE ' + column_type if column_type else ''}""")
-            result = await LemkPgUtils.execute_query(self.dsn, query)
+            result = await LemkPgUtils.execute_query(self._engine, query, tables=[table_name])
             return result
 
         return self._run_async(func())
 
-    def raw_query(self, query: str):
+    def raw_query(self, query: str, params=None, row_factory=None, readonly=False):
         """
         >>> db_conn.raw_query("SELECT * FROM demo INNER JOIN datatable ON demo.trans = datatable.trans")
 
         :param query: string with query for manual execution
+        :param params: None or list (tuple) with values for %s placeholders in query
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :param readonly: True if query only reads data, so it can be executed on replica
         :return: result if query success
         """
 
         async def func():
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
+            result = await LemkPgUtils.get_query_result(self._engine, query, params, row_factory=row_factory,
+                                                        readonly=readonly)
             return result
 
         return self._run_async(func())
 
+    def iter_raw(self, query: str, params=None, itersize=1000, row_factory=None, readonly=False):
+        """
+        >>> for row in db_conn.iter_raw("SELECT * FROM demo WHERE id > %s", [100]):
+        ...     print(row)
+
+        Rows are fetched from server-side cursor by itersize rows, so memory doesn't depend on result size.
+        Connection of pool is held until all rows are fetched or iteration is stopped.
+
+        :param query: string with query for manual execution
+        :param params: None or list (tuple) with values for %s placeholders in query
+        :param itersize: count of rows fetched from server in one round-trip. Default 1000
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :param readonly: True if query only reads data, so it can be executed on replica
+        :return: generator with rows
+        """
+        return self._run_async_iter(LemkPgUtils.iter_query_batches(self._engine, query, params, itersize,
+                                                                   row_factory, readonly=readonly))
+
+    def fetch_columns(self, query: str, params=None):
+        """
+        >>> db_conn.fetch_columns("SELECT id, price FROM demo WHERE date > %s", ["2006-01-05"])
+
+        Result is read via COPY in binary format and decoded straight into columns, without tuple for each row.
+
+        :param query: string with SELECT query
+        :param params: None or list (tuple) with values for %s placeholders in query
+        :return: dict with column name as key and array.array (numeric columns without NULLs) or list as value
+        """
+
+        async def func():
+            return await LemkPgUtils.copy_binary_result(self._engine, query, params, LemkPgColumns.decode_columns)
+
+        return self._run_async(func())
+
+    def fetch_numpy(self, query: str, params=None):
+        """
+        >>> db_conn.fetch_numpy("SELECT id, price FROM demo WHERE date > %s", ["2006-01-05"])
+
+        Result is read via COPY in binary format and decoded straight into columns, without tuple for each row.
+        numpy is optional dependency: pip install lemkpg[numpy]
+
+        :param query: string with SELECT query
+        :param params: None or list (tuple) with values for %s placeholders in query
+        :return: dict with column name as key and numpy.ndarray as value. Integer columns with NULLs are
+         converted to float64 with NaN
+        """
+
+        async def func():
+            return await LemkPgUtils.copy_binary_result(self._engine, query, params, LemkPgColumns.decode_numpy)
+
+        return self._run_async(func())
+
+    def export(self, table_or_query: str, file_like, format=EXPORT_CSV, params=None, header=False):
+        """
+        >>> with open("demo.csv", "w") as f:
+        ...     db_conn.export("demo", f, format="csv", header=True)
+        >>> db_conn.export("SELECT * FROM demo WHERE date > %s", sock.makefile("wb"), "binary", ["2006-01-05"])
+
+        Table or query result is streamed via COPY ... TO STDOUT directly into file_like block by block,
+        without creating rows in memory.
+
+        :param table_or_query: string with table name or SELECT query
+        :param file_like: object with write() method (file, socket file, io.BytesIO etc.).
+         Data in "binary" format needs file opened in binary mode
+        :param format: string with format of data ("csv", "text" or "binary"). Default "csv"
+        :param params: None or list (tuple) with values for %s placeholders in query
+        :param header: True for first line with column names ("csv" format only). Default False
+        :return: count of exported rows
+        """
+        query = LemkPgUtils.get_export_query(table_or_query, format, header)
+
+        async def func():
+            return await LemkPgUtils.copy_to(self._engine, query, file_like, params)
+
+        return self._run_async(func())
+
+    def parallel_scan(self, table_name: str, fields: list, partition_column=ID, partitions=8, concurrency=None,
+                      conditions_list=None, row_factory=None, path=None, format=EXPORT_CSV, header=False):
+        """
+        >>> for rows in db_conn.parallel_scan("demo", ["*"], partition_column="id", partitions=16, concurrency=4):
+        ...     print(len(rows))
+        >>> paths = list(db_conn.parallel_scan("demo", ["*"], partitions=16, path="demo_{partition}.csv"))
+
+        Key range of partition_column (from MIN to MAX) is split into "partitions" ranges, which are read
+        concurrently on connections of pool (or replicas). Each partition is read in separate transaction,
+        so scan isn't one snapshot of table which is changed during it.
+
+        :param table_name: string with table name
+        :param fields: list with fields of result
+        :param partition_column: string with integer column (preferably indexed) for split. Default "id"
+        :param partitions: count of key ranges. Default 8
+        :param concurrency: max count of partitions read at once. Default None (max size of connection pool)
+        :param conditions_list: list with tuples with conditions in it. In each tuple should be defined four values:
+                 1) column for assert in WHERE clause (e.g. "date")
+                 2) operand for assert column (e.g. "=", or "!=")
+                 3) value for assert (e.g. "2006-01-05")
+                 4) additional value if you need more then one conditions in where clause.
+                    if one tuple in list - this value should be None. If more then one tuple in conditions_list -
+                    this value should be string (e.g. "AND", or "OR")
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :param path: None or path of files with "{partition}" in it (e.g. "demo_{partition}.csv"). If defined,
+         each partition is streamed via COPY into its own file instead of returning rows
+        :param format: string with format of files ("csv", "text" or "binary"). Default "csv"
+        :param header: True for first line with column names in each file ("csv" format only). Default False
+        :return: generator with results of partitions (lists of rows or file paths) in order of completion
+        """
+        return self._loop_thread.iterate(LemkPgUtils.scan_partitions(
+            self._engine, table_name, fields, partition_column, partitions, concurrency or self._engine.maxsize,
+            conditions_list, row_factory, path, format, header))
+
     def get_with_join(self, table_name: str, join_table_name: str, join_type: str,
-                      fields: list, on_condition: tuple, where_conditions_list=None):
+                      fields: list, on_condition: tuple, where_conditions_list=None, row_factory=None):
         """
         >>> db_conn.get_with_join("demo", "datatable", "INNER JOIN", ["*"], ("demo.trans", "=", "datatable.trans"))
 
@@ -213,29 +772,23 @@ class LemkPgApi:
                  4) additional value if you need more then one conditions in where clause.
                     if one tuple in list - this value should be None. If more then one tuple in conditions_list -
                     this value should be string (e.g. "AND", or "OR")
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
 
         async def func():
-            if join_type not in JOINS_LIST:
-                message = f"Incorrect JOIN type. Please use one of the valid JOIN types: {', '.join(JOINS_LIST)}"
-                raise LemkPgError(message)
-
-            if where_conditions_list:
-                conditions = LemkPgUtils.get_conditions(where_conditions_list)
-                query = (f"""SELECT {", ".join(fields)} FROM {table_name} {join_type} {join_table_name}"""
-                         f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}"""
-                         f""" WHERE {" ".join(conditions)}""")
-            else:
-                query = (f"""SELECT {", ".join(fields)} FROM {table_name} {join_type} {join_table_name}"""
-                         f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}""")
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
+            query, params = LemkPgUtils.get_join_query(table_name, join_table_name, join_type, fields, on_condition,
+                                                       where_conditions_list)
+            result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                        row_factory=row_factory, readonly=True,
+                                                        tables=[table_name, join_table_name])
             return result
 
         return self._run_async(func())
 
     def inner_join(self, table_name: str, join_table_name: str,
-                   on_condition: tuple, where_conditions_list=None, fields=None, all=True):
+                   on_condition: tuple, where_conditions_list=None, fields=None, all=True, row_factory=None):
         """
         >>> db_conn.inner_join("demo", "datatable", ("demo.trans", "=", "datatable.trans"))
 
@@ -255,26 +808,24 @@ class LemkPgApi:
         :param fields: list with strings with columns names in it
          (e.g. "["trans", "date"]. Default None (get all columns -  if param all is True)"
         :param all: bool param - for check do we need all fields or not. Default - True (get all fields)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
 
         async def func():
-            query_fields = ("*" if not fields and all else f'{", ".join(fields)}')
-            if where_conditions_list:
-                conditions = LemkPgUtils.get_conditions(where_conditions_list)
-                query = (f"""SELECT {query_fields} FROM {table_name} INNER JOIN {join_table_name}"""
-                         f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}"""
-                         f""" WHERE {" ".join(conditions)}""")
-            else:
-                query = (f"""SELECT {query_fields} FROM {table_name} INNER JOIN {join_table_name}"""
-                         f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}""")
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
+            query_fields = LemkPgUtils.get_join_fields(fields, all)
+            query, params = LemkPgUtils.get_join_query(table_name, join_table_name, INNER_JOIN, query_fields,
+                                                       on_condition, where_conditions_list)
+            result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                        row_factory=row_factory, readonly=True,
+                                                        tables=[table_name, join_table_name])
             return result
 
         return self._run_async(func())
 
     def left_join(self, table_name: str, join_table_name: str,
-                  on_condition: tuple, where_conditions_list=None, fields=None, all=True):
+                  on_condition: tuple, where_conditions_list=None, fields=None, all=True, row_factory=None):
         """
         >>> db_conn.left_join("demo", "datatable", ("demo.trans", "=", "datatable.trans"))
 
@@ -294,26 +845,24 @@ class LemkPgApi:
         :param fields: list with strings with columns names in it
          (e.g. "["trans", "date"]. Default None (get all columns -  if param all is True)"
         :param all: bool param - for check do we need all fields or not. Default - True (get all fields)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
 
         async def func():
-            query_fields = ("*" if not fields and all else f'{", ".join(fields)}')
-            if where_conditions_list:
-                conditions = LemkPgUtils.get_conditions(where_conditions_list)
-                query = (f"""SELECT {query_fields} FROM {table_name} LEFT JOIN {join_table_name}"""
-                         f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}"""
-                         f""" WHERE {" ".join(conditions)}""")
-            else:
-                query = (f"""SELECT {query_fields} FROM {table_name} LEFT JOIN {join_table_name}"""
-                         f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}""")
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
+            query_fields = LemkPgUtils.get_join_fields(fields, all)
+            query, params = LemkPgUtils.get_join_query(table_name, join_table_name, LEFT_JOIN, query_fields,
+                                                       on_condition, where_conditions_list)
+            result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                        row_factory=row_factory, readonly=True,
+                                                        tables=[table_name, join_table_name])
             return result
 
         return self._run_async(func())
 
     def right_join(self, table_name: str, join_table_name: str,
-                   on_condition: tuple, where_conditions_list=None, fields=None, all=True):
+                   on_condition: tuple, where_conditions_list=None, fields=None, all=True, row_factory=None):
         """
         >>> db_conn.right_join("demo", "datatable", ("demo.trans", "=", "datatable.trans"))
 
@@ -333,26 +882,24 @@ class LemkPgApi:
         :param fields: list with strings with columns names in it
          (e.g. "["trans", "date"]. Default None (get all columns -  if param all is True)"
         :param all: bool param - for check do we need all fields or not. Default - True (get all fields)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
 
         async def func():
-            query_fields = ("*" if not fields and all else f'{", ".join(fields)}')
-            if where_conditions_list:
-                conditions = LemkPgUtils.get_conditions(where_conditions_list)
-                query = (f"""SELECT {query_fields} FROM {table_name} RIGHT JOIN {join_table_name}"""
-                         f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}"""
-                         f""" WHERE {" ".join(conditions)}""")
-            else:
-                query = (f"""SELECT {query_fields} FROM {table_name} RIGHT JOIN {join_table_name}"""
-                         f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}""")
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
+            query_fields = LemkPgUtils.get_join_fields(fields, all)
+            query, params = LemkPgUtils.get_join_query(table_name, join_table_name, RIGHT_JOIN, query_fields,
+                                                       on_condition, where_conditions_list)
+            result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                        row_factory=row_factory, readonly=True,
+                                                        tables=[table_name, join_table_name])
             return result
 
         return self._run_async(func())
 
     def full_join(self, table_name: str, join_table_name: str,
-                  on_condition: tuple, where_conditions_list=None, fields=None, all=True):
+                  on_condition: tuple, where_conditions_list=None, fields=None, all=True, row_factory=None):
         """
         >>> db_conn.full_join("demo", "datatable", ("demo.trans", "=", "datatable.trans"))
 
@@ -372,20 +919,18 @@ class LemkPgApi:
         :param fields: list with strings with columns names in it
          (e.g. "["trans", "date"]. Default None (get all columns -  if param all is True)"
         :param all: bool param - for check do we need all fields or not. Default - True (get all fields)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
 
         async def func():
-            query_fields = ("*" if not fields and all else f'{", ".join(fields)}')
-            if where_conditions_list:
-                conditions = LemkPgUtils.get_conditions(where_conditions_list)
-                query = (f"""SELECT {query_fields} FROM {table_name} FULL OUTER JOIN {join_table_name}"""
-                         f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}"""
-                         f""" WHERE {" ".join(conditions)}""")
-            else:
-                query = (f"""SELECT {query_fields} FROM {table_name} FULL OUTER JOIN {join_table_name}"""
-                         f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}""")
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
+            query_fields = LemkPgUtils.get_join_fields(fields, all)
+            query, params = LemkPgUtils.get_join_query(table_name, join_table_name, FULL_OUTER_JOIN, query_fields,
+                                                       on_condition, where_conditions_list)
+            result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                        row_factory=row_factory, readonly=True,
+                                                        tables=[table_name, join_table_name])
             return result
 
         return self._run_async(func())
@@ -400,10 +945,10 @@ class LemkPgApi:
 
         async def func():
             query = f"""DROP TABLE IF EXISTS {table_name}"""
-            await LemkPgUtils.execute_query(self.dsn, query)
+            await LemkPgUtils.execute_query(self._engine, query, tables=[table_name])
             return True
 
-        return self.run_async(func())
+        return self._run_async(func())
 
     def clear_table(self, table_name: str):
         """
@@ -415,7 +960,7 @@ class LemkPgApi:
 
         async def func():
             query = f"""TRUNCATE TABLE {table_name}"""
-            await LemkPgUtils.execute_query(self.dsn, query)
+            await LemkPgUtils.execute_query(self._engine, query, tables=[table_name])
             return True
 
         return self._run_async(func())
@@ -436,16 +981,45 @@ class LemkPgApi:
         """
 
         async def func():
-            if conditions_list:
-                conditions = LemkPgUtils.get_conditions(conditions_list)
-                query = f"""DELETE FROM {table_name} WHERE {" ".join(conditions)}"""
-            else:
-                query = f"""DELETE FROM {table_name}"""
-            await LemkPgUtils.execute_query(self.dsn, query)
+            query, params = LemkPgUtils.get_delete_query(table_name, conditions_list)
+            await LemkPgUtils.execute_query(self._engine, query, params, [table_name])
             return True
 
         return self._run_async(func())
 
+    def aggregate(self, table_name: str, aggregates: dict, conditions_list=None, group_by=None, having=None):
+        """
+        >>> db_conn.aggregate("demo", {"count": "id", "avg": "price", "max": ["date", "price"]})
+        {'count': 5, 'avg': Decimal('20.5'), 'max': [datetime.date(2006, 1, 5), Decimal('35.14')]}
+        >>> db_conn.aggregate("demo", {"count": "id"}, group_by=["symbol"], having=[("COUNT(id)", ">", 1, None)])
+        {'RHAT': {'count': 3}, 'AAPL': {'count': 2}}
+
+        All aggregates are computed by one query (one scan of table).
+
+        :param table_name: string with table name
+        :param aggregates: dict with aggregate function ("count", "avg", "sum", "min" or "max") as key and
+         column name (or list of column names) as value
+        :param conditions_list: list with tuples with conditions in it. In each tuple should be defined four values:
+                 1) column for assert in WHERE clause (e.g. "date")
+                 2) operand for assert column (e.g. "=", or "!=")
+                 3) value for assert (e.g. "2006-01-05")
+                 4) additional value if you need more then one conditions in where clause.
+                    if one tuple in list - this value should be None. If more then one tuple in conditions_list -
+                    this value should be string (e.g. "AND", or "OR")
+        :param group_by: None or list with column names for GROUP BY clause
+        :param having: None or list with tuples with conditions for HAVING clause, the same as in conditions_list
+         (e.g. [("COUNT(id)", ">", 5, None)])
+        :return: dict with aggregate function as key and value (or list of values for list of column names).
+         With group_by - dict with value of group column (tuple of values for several columns) as key
+         and such dict as value. Without group_by - None if having filtered out the result
+        """
+
+        async def func():
+            return await LemkPgUtils.get_aggregates(self._engine, table_name, aggregates, conditions_list, group_by,
+                                                    having)
+
+        return self._run_async(func())
+
     def count(self, table_name: str, column: str, conditions_list=None):
         """
         >>> db_conn.count("demo", "date")
@@ -463,13 +1037,8 @@ class LemkPgApi:
         """
 
         async def func():
-            if conditions_list:
-                conditions = LemkPgUtils.get_conditions(conditions_list)
-                query = f"""SELECT COUNT({column}) FROM {table_name} WHERE {" ".join(conditions)}"""
-            else:
-                query = f"""SELECT COUNT({column}) FROM {table_name}"""
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
-            return result
+            result = await LemkPgUtils.get_aggregates(self._engine, table_name, {COUNT: column}, conditions_list)
+            return result and [(result[COUNT],)]
 
         return self._run_async(func())
 
@@ -490,13 +1059,8 @@ class LemkPgApi:
         """
 
         async def func():
-            if conditions_list:
-                conditions = LemkPgUtils.get_conditions(conditions_list)
-                query = f"""SELECT AVG({column}) FROM {table_name} WHERE {" ".join(conditions)}"""
-            else:
-                query = f"""SELECT AVG({column}) FROM {table_name}"""
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
-            return result
+            result = await LemkPgUtils.get_aggregates(self._engine, table_name, {AVG: column}, conditions_list)
+            return result and [(result[AVG],)]
 
         return self._run_async(func())
 
@@ -517,13 +1081,8 @@ class LemkPgApi:
         """
 
         async def func():
-            if conditions_list:
-                conditions = LemkPgUtils.get_conditions(conditions_list)
-                query = f"""SELECT SUM({column}) FROM {table_name} WHERE {" ".join(conditions)}"""
-            else:
-                query = f"""SELECT SUM({column}) FROM {table_name}"""
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
-            return result
+            result = await LemkPgUtils.get_aggregates(self._engine, table_name, {SUM: column}, conditions_list)
+            return result and [(result[SUM],)]
 
         return self._run_async(func())
 
@@ -544,13 +1103,8 @@ class LemkPgApi:
         """
 
         async def func():
-            if conditions_list:
-                conditions = LemkPgUtils.get_conditions(conditions_list)
-                query = f"""SELECT MIN({column}) FROM {table_name} WHERE {" ".join(conditions)}"""
-            else:
-                query = f"""SELECT MIN({column}) FROM {table_name}"""
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
-            return result
+            result = await LemkPgUtils.get_aggregates(self._engine, table_name, {MIN: column}, conditions_list)
+            return result and [(result[MIN],)]
 
         return self._run_async(func())
 
@@ -571,27 +1125,27 @@ class LemkPgApi:
         """
 
         async def func():
-            if conditions_list:
-                conditions = LemkPgUtils.get_conditions(conditions_list)
-                query = f"""SELECT MAX({column}) FROM {table_name} WHERE {" ".join(conditions)}"""
-            else:
-                query = f"""SELECT MAX({column}) FROM {table_name}"""
-            result = await LemkPgUtils.get_query_result(self.dsn, query)
-            return result
+            result = await LemkPgUtils.get_aggregates(self._engine, table_name, {MAX: column}, conditions_list)
+            return result and [(result[MAX],)]
 
         return self._run_async(func())
 
-
 # AsyncVersion
 class AsyncLemkPgApi:
     """
     AsyncLemkPgApi class give async API interface for quick access to PostgreSQL DB
     and return coroutine with fetching results.
     You can use CRUD and other DB operations with some methods above.
-    This DB API will be work only with Python 3.5 and greater versions.
+    Each instance owns one connection pool which is created on first query and lives until close() is called.
+    This DB API will be work only with Python 3.7 and greater versions.
     """
 
-    def __init__(self, db_name: str, db_user: str, db_password: str, db_host: str, *args, **kwargs):
+    def __init__(self, db_name: str, db_user: str, db_password: str, db_host: str, *args,
+                 pool_minsize=1, pool_maxsize=10, pool_idle_timeout=-1.0, statement_cache_size=0,
+                 fetch_strategy=FETCH_ALL, fetch_size=1000, row_factory=None, replicas=None,
+                 replica_strategy=ROUND_ROBIN, replica_retry_interval=30.0, result_cache_size=0, result_cache_ttl=60.0,
+                 result_cache_memory=None, result_cache_channel=None, query_metrics=False, slow_query_time=None,
+                 pool_stats_callback=None, pool_stats_interval=60.0, **kwargs):
         """
         You can create db_connect of AsyncLemkPgApi when you define all required attrs.
         Example of db_connect creation:
@@ -602,6 +1156,39 @@ class AsyncLemkPgApi:
         :param db_password: string with password for selected user
         :param db_host: string with database host
         :param args: additional attr
+        :param pool_minsize: minimal count of opened connections in pool. Default 1
+        :param pool_maxsize: maximal count of opened connections in pool. Default 10
+        :param pool_idle_timeout: seconds after which idle connection will be reopened. Default -1 (never)
+        :param statement_cache_size: max count of prepared statements kept for each connection of pool.
+         Default 0 (queries are not prepared)
+        :param fetch_strategy: string with way of fetching result rows: "fetchall" - all rows at once (default),
+         "fetchmany" - by fetch_size rows, "iterate" - row by row
+        :param fetch_size: count of rows fetched at once with "fetchmany" strategy. Default 1000
+        :param row_factory: None, callable or string with type of result rows: "tuple" (default), "dict",
+         "namedtuple", "record" (compact object with __slots__) or "columns" (dict with column name and list
+         of its values, or array.array for numeric columns). Callable gets cursor.description and list of tuples
+        :param replicas: None or list with replica hosts (db_name, db_user and db_password are the same as for
+         db_host) or DSN strings of replicas. Read-only queries (get_all, get, joins, aggregates, raw_query with
+         readonly=True) are balanced across replicas, other queries go to primary db_host
+        :param replica_strategy: string with way of replica selection: "round_robin" (default) or "least_busy"
+         (replica with the fewest queries in progress)
+        :param replica_retry_interval: seconds during which replica isn't used after connection error. Default 30
+        :param result_cache_size: max count of cached results of get_all, get, joins and aggregates.
+         Default 0 (results are not cached). Writes through this instance (insert, insert_many, update,
+         delete_records, clear_table, delete_table, alter_table) evict cached results of their table
+        :param result_cache_ttl: seconds after which cached result expires. Default 60
+        :param result_cache_memory: None or max approximate size of cached results in bytes. Default None (no limit)
+        :param result_cache_channel: None or name of PostgreSQL channel for invalidation of result cache between
+         processes. Writes of this instance send NOTIFY with table name to this channel and background listener
+         evicts cached results of tables changed by other processes. Default None (only local invalidation)
+        :param query_metrics: True for aggregation of timings of queries by their shape (SQL text with placeholders
+         instead of values), see query_stats(). Default False
+        :param slow_query_time: None or seconds after which query is logged as slow with warning of "lemkpg"
+         logger. Default None
+        :param pool_stats_callback: None or callable which gets result of pool_stats() each pool_stats_interval
+         seconds (e.g. for export of stats to monitoring). It is called in event loop of db_conn, so it shouldn't
+         block. Default None
+        :param pool_stats_interval: seconds between calls of pool_stats_callback. Default 60
         :param kwargs: additional attr
         """
         self.db_name = db_name
@@ -609,6 +1196,224 @@ class AsyncLemkPgApi:
         self.db_password = db_password
         self.db_host = db_host
         self.dsn = f"dbname={self.db_name} user={self.db_user} password={self.db_password} host={self.db_host}"
+        self.replica_dsns = [replica if "=" in replica else
+                             f"dbname={self.db_name} user={self.db_user} password={self.db_password} host={replica}"
+                             for replica in replicas or []]
+        self._engine = LemkPgEngine(self.dsn, minsize=pool_minsize, maxsize=pool_maxsize,
+                                    idle_timeout=pool_idle_timeout, statement_cache_size=statement_cache_size,
+                                    fetch_strategy=fetch_strategy, fetch_size=fetch_size, row_factory=row_factory,
+                                    replica_dsns=self.replica_dsns, replica_strategy=replica_strategy,
+                                    replica_retry_interval=replica_retry_interval,
+                                    result_cache_size=result_cache_size, result_cache_ttl=result_cache_ttl,
+                                    result_cache_memory=result_cache_memory, cache_channel=result_cache_channel,
+                                    query_metrics=query_metrics, slow_query_time=slow_query_time,
+                                    pool_stats_callback=pool_stats_callback, pool_stats_interval=pool_stats_interval)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        >>> await db_conn.close()
+
+        Close connection pool of this instance. Pool will be opened again on next query.
+        """
+        await self._engine.close()
+
+    def statement_cache_stats(self):
+        """
+        >>> db_conn.statement_cache_stats()
+
+        :return: dict with size, hits, misses and count of prepared statements of statement cache
+        """
+        return self._engine.statements.stats()
+
+    def result_cache_stats(self):
+        """
+        >>> db_conn.result_cache_stats()
+
+        :return: dict with size, count of entries, approximate memory in bytes, hits, misses, hit_rate,
+         evictions and invalidations of result cache
+        """
+        return self._engine.cache.stats()
+
+    def pool_stats(self):
+        """
+        >>> db_conn.pool_stats()
+
+        :return: dict with size, minsize and maxsize of connection pool, count of connections in_use and idle,
+         count of queries waiting for connection, acquires (count of taken connections), wait_time, mean_wait and
+         max_wait (seconds of waiting for connection), wait_histogram (upper bound of bucket in seconds and count
+         of acquires), opened and closed (count of connections opened and closed by pool), broken (connections
+         closed because of error) and recycled (connections closed by pool_idle_timeout or after failed
+         transaction). Stats of replicas are in "replicas" list
+        """
+        return self._engine.get_pool_stats()
+
+    def add_query_hook(self, before=None, after=None):
+        """
+        >>> db_conn.add_query_hook(before=lambda method, query, param_count: print(method, query))
+        >>> db_conn.add_query_hook(after=lambda method, query, param_count, timings: print(timings["time"]))
+
+        Add hooks, which are called before and after each query of this instance (and of its transactions).
+        Errors of hooks are logged and don't break queries.
+
+        :param before: None or callable which gets name of method, SQL text and count of params
+        :param after: None or callable which gets name of method, SQL text, count of params and dict with
+         timings: "time" (seconds of query), "acquire", "execute", "fetch" and "convert" (seconds of phases),
+         "rows" (count of rows), "bytes" (count of bytes of COPY data) and "error" (None or exception)
+        """
+        if before is not None:
+            self._engine.metrics.before_hooks.append(before)
+        if after is not None:
+            self._engine.metrics.after_hooks.append(after)
+
+    def remove_query_hook(self, before=None, after=None):
+        """
+        >>> db_conn.remove_query_hook(before=print_query)
+
+        :param before: None or callable which was added as before hook
+        :param after: None or callable which was added as after hook
+        """
+        if before is not None:
+            self._engine.metrics.before_hooks.remove(before)
+        if after is not None:
+            self._engine.metrics.after_hooks.remove(after)
+
+    def query_stats(self):
+        """
+        >>> db_conn.query_stats()
+
+        Timings of queries aggregated by shape of query (db_conn should be created with query_metrics=True).
+
+        :return: dict with shape of query and dict with its count, errors, total, mean, p50, p95, p99 and max
+         (seconds), rows, bytes, phases (mean seconds of acquire, execute, fetch and convert) and methods
+         (count of queries by method name). The slowest shapes by total time are first
+        """
+        return self._engine.metrics.stats()
+
+    def reset_query_stats(self):
+        """
+        >>> db_conn.reset_query_stats()
+        """
+        self._engine.metrics.reset()
+
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        """
+        >>> async with db_conn.batch() as batch:
+        ...     rows = batch.get("demo", ["date", "symbol"], [("id", "=", 1, None)])
+        ...     count = batch.count("demo", "id")
+        ...     batch.insert("demo", (3, "2006-01-05", "BUY", "RHAT", 35.14))
+        >>> await rows, await count
+
+        Queries are executed when block is exited: consecutive writes (insert, update, delete_records) are sent
+        as one multi-statement query in one transaction, consecutive reads run concurrently on connections of pool.
+        Batch has get_all, get, raw_query, get_with_join, aggregate, count, avg, sum, min, max, insert, update
+        and delete_records methods, which return asyncio.Future with result of query.
+        If query fails, its future gets exception, futures of next queries are cancelled and exception is raised.
+        """
+        batch = LemkPgBatch(self._engine, asyncio.get_running_loop().create_future)
+        try:
+            yield batch
+        except BaseException:
+            batch.cancel()
+            raise
+        await batch.execute()
+
+    @contextlib.asynccontextmanager
+    async def transaction(self, isolation=None, readonly=False):
+        """
+        >>> async with db_conn.transaction(isolation="SERIALIZABLE") as tx:
+        ...     await tx.insert("demo", (3, "2006-01-05", "BUY", "RHAT", 35.14))
+        ...     await tx.update("demo", {"price": 40}, [("id", "=", 3, None)])
+
+        All queries of transaction run on one connection of pool and are committed together at the end of block
+        (or rolled back if block raises exception). Transaction inside transaction is done with SAVEPOINT.
+        insert_many with "copy" method, export, fetch_columns and fetch_numpy can't be used inside transaction.
+
+        :param isolation: None or string with isolation level ("READ COMMITTED", "REPEATABLE READ" or "SERIALIZABLE").
+         Default None (default level of database)
+        :param readonly: True for READ ONLY transaction
+        :return: db_conn with the same methods bound to connection of transaction
+        """
+        engine = await LemkPgTransactionEngine(self._engine, isolation, readonly).begin()
+        tx = copy.copy(self)
+        tx._engine = engine
+        try:
+            yield tx
+        except BaseException:
+            await engine.end(commit=False)
+            raise
+        await engine.end()
+
+    def query(self, table_name: str):
+        """
+        >>> get_by_date = db_conn.query("demo").select("date", "symbol").where("date", "=").order_by("date").compile()
+        >>> await get_by_date("2006-01-05")
+        >>> set_price = db_conn.query("demo").update("price").where("id", "=").compile()
+        >>> await set_price(40, 3)
+
+        Query is built step by step with select, distinct, join, where, or_where, order_by, update and delete methods
+        and compiled once to SQL text with slots for values. Calling of compiled query only binds values and runs it.
+
+        :param table_name: string with table name
+        :return: LemkPgQuery
+        """
+
+        def executor(compiled, params, row_factory):
+            return compiled.run(self._engine, params, row_factory)
+
+        return LemkPgQuery(table_name, executor)
+
+    async def map(self, method, arg_iterable, concurrency=None, timeout=None, return_exceptions=False):
+        """
+        >>> await db_conn.map("get", [("demo", ["date"], [("id", "=", i, None)]) for i in range(100)], concurrency=5)
+        >>> await db_conn.map(db_conn.count, [("demo", "id"), ("datatable", "id")])
+
+        Call method for each item of arg_iterable with not more than "concurrency" calls running at once,
+        so many queries share connection pool of db_conn without exhausting it.
+
+        :param method: method of db_conn (or its name) or any other coroutine function
+        :param arg_iterable: iterable with arguments for each call: tuple (positional arguments),
+         dict (keyword arguments) or any other value (one positional argument)
+        :param concurrency: max count of calls running at once. Default None (max size of connection pool)
+        :param timeout: None or seconds for each call, after which it is cancelled with asyncio.TimeoutError
+        :param return_exceptions: True for exceptions in list of results instead of raising first of them
+        :return: list with results in order of arg_iterable
+        """
+        if isinstance(method, str):
+            method = getattr(self, method)
+
+        def get_calls():
+            for args in arg_iterable:
+                if isinstance(args, tuple):
+                    yield method(*args)
+                elif isinstance(args, dict):
+                    yield method(**args)
+                else:
+                    yield method(args)
+
+        return await LemkPgUtils.gather_limited(get_calls(), concurrency or self._engine.maxsize, timeout,
+                                                return_exceptions)
+
+    async def gather(self, *calls, limit=None, timeout=None, return_exceptions=False):
+        """
+        >>> await db_conn.gather(db_conn.get_all("demo"), db_conn.count("demo", "id"), limit=2, timeout=5)
+
+        Await calls with not more than "limit" of them running at once, so many queries share
+        connection pool of db_conn without exhausting it.
+
+        :param calls: coroutines (e.g. methods of db_conn called without await)
+        :param limit: max count of calls running at once. Default None (max size of connection pool)
+        :param timeout: None or seconds for each call, after which it is cancelled with asyncio.TimeoutError
+        :param return_exceptions: True for exceptions in list of results instead of raising first of them
+        :return: list with results in order of calls
+        """
+        return await LemkPgUtils.gather_limited(calls, limit or self._engine.maxsize, timeout, return_exceptions)
 
     async def create_table(self, table_name: str, fields: dict, primary_key=False):
         """
@@ -624,7 +1429,7 @@ class AsyncLemkPgApi:
             query = f"""CREATE TABLE IF NOT EXISTS {table_name} ({", ".join(new_fields)})"""
         else:
             query = f"""CREATE TABLE IF NOT EXISTS {table_name} (id SERIAL PRIMARY KEY, {", ".join(new_fields)})"""
-        await LemkPgUtils.execute_query(self.dsn, query)
+        await LemkPgUtils.execute_query(self._engine, query, tables=[table_name])
         return True
 
     async def insert(self, table_name: str, values: tuple, columns=None):
@@ -636,26 +1441,115 @@ class AsyncLemkPgApi:
         :param columns: None or tuple with columns
         :return: True if query success
         """
-        query = f"""INSERT INTO {table_name} {'(' + ', '.join(columns) + ')' if columns else ''} VALUES {values}"""
-        await LemkPgUtils.execute_query(self.dsn, query)
+        query, params = LemkPgUtils.get_insert_query(table_name, values, columns)
+        await LemkPgUtils.execute_query(self._engine, query, params, [table_name])
         return True
 
-    async def get_all(self, table_name: str, order_by=None, sort_type=None):
+    async def insert_many(self, table_name: str, rows, columns=None, method=INSERT_VALUES, chunk_size=1000):
+        """
+        >>> await db_conn.insert_many("demo", [(1, '2006-01-05', 'Some Text', 'A'), (2, '2006-01-06', 'Text', 'B')])
+
+        :param table_name: string with table name
+        :param rows: iterable (list, generator, etc.) with tuples of values
+        :param columns: None or tuple with columns
+        :param method: string with insert method (e.g. "values" or "copy"). Default "values".
+                 "values" - rows are inserted by multi-row INSERT statements with chunk_size rows in each
+                 "copy" - rows are streamed to the table via COPY FROM STDIN
+        :param chunk_size: count of rows in one INSERT statement (used only with "values" method). Default 1000
+        :return: True if query success
+        """
+        if method not in INSERT_METHODS:
+            message = f"Incorrect insert method. Please use one of the valid methods: {', '.join(INSERT_METHODS)}"
+            raise LemkPgError(message)
+        if method == INSERT_COPY:
+            return await LemkPgUtils.copy_from(self._engine, table_name, rows, columns)
+        return await LemkPgUtils.insert_values(self._engine, table_name, rows, columns, chunk_size)
+
+    async def upsert(self, table_name: str, row: dict, conflict_columns: list, update_columns=None,
+                     return_keys=False):
+        """
+        >>> await db_conn.upsert("demo", {"id": 1, "date": "2006-01-05", "symbol": "A"}, conflict_columns=["id"])
+
+        Insert row or update existing row with the same key in one statement (INSERT ... ON CONFLICT DO UPDATE).
+
+        :param table_name: string with table name
+        :param row: dict with columns and their values
+        :param conflict_columns: list with columns of unique index or primary key, which define conflicting row
+        :param update_columns: None or list with columns, which are updated in conflicting row by new values.
+         Default None (all columns except conflict_columns). Empty list - conflicting row is left as is
+        :param return_keys: True for list with tuples of conflict_columns values of inserted and updated rows
+         instead of True. Default False
+        :return: True (or list with keys) if query success
+        """
+        return await LemkPgUtils.upsert_values(self._engine, table_name, [tuple(row.values())], tuple(row),
+                                               conflict_columns, update_columns, return_keys=return_keys)
+
+    async def upsert_many(self, table_name: str, rows, columns: tuple, conflict_columns: list, update_columns=None,
+                          chunk_size=1000, return_keys=False):
+        """
+        >>> await db_conn.upsert_many("demo", [(1, "2006-01-05", "A"), (2, "2006-01-06", "B")],
+        ...                           ("id", "date", "symbol"), conflict_columns=["id"], update_columns=["date"])
+
+        Insert rows or update existing rows with the same key by multi-row INSERT ... ON CONFLICT DO UPDATE
+        statements with chunk_size rows in each. All chunks are upserted in one transaction. If rows of one chunk
+        have the same key, the last of them is used.
+
+        :param table_name: string with table name
+        :param rows: iterable (list, generator, etc.) with tuples of values
+        :param columns: tuple with columns of values
+        :param conflict_columns: list with columns of unique index or primary key, which define conflicting row
+        :param update_columns: None or list with columns, which are updated in conflicting row by new values.
+         Default None (all columns except conflict_columns). Empty list - conflicting row is left as is
+        :param return_keys: True for list with tuples of conflict_columns values of inserted and updated rows
+         instead of True. Default False
+        :param chunk_size: count of rows in one statement. Default 1000
+        :return: True (or list with keys) if query success
+        """
+        return await LemkPgUtils.upsert_values(self._engine, table_name, rows, columns, conflict_columns,
+                                               update_columns, chunk_size, return_keys)
+
+    async def get_all(self, table_name: str, order_by=None, sort_type=None, row_factory=None):
         """
         >>> await db_conn.get_all("demo")
 
         :param table_name: string with table name
         :param order_by: string with column for ordering
         :param sort_type: string with type of ordering (ASC / DESC)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
-        sort = f"{' ORDER BY ' + order_by + ' ' + sort_type if order_by and sort_type else ''}"
-        query = f"""SELECT * FROM {table_name}{sort}"""
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
+        query, params = LemkPgUtils.get_select_query(table_name, GET_ALL_COLUMNS,
+                                                     order_by=order_by, sort_type=sort_type)
+        result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                    row_factory=row_factory, readonly=True,
+                                                    tables=[table_name])
         return result
 
+    async def iter_all(self, table_name: str, order_by=None, sort_type=None, itersize=1000, row_factory=None):
+        """
+        >>> async for row in db_conn.iter_all("demo"):
+        ...     print(row)
+
+        Rows are fetched from server-side cursor by itersize rows, so memory doesn't depend on result size.
+        Connection of pool is held until all rows are fetched or iteration is stopped.
+
+        :param table_name: string with table name
+        :param order_by: string with column for ordering
+        :param sort_type: string with type of ordering (ASC / DESC)
+        :param itersize: count of rows fetched from server in one round-trip. Default 1000
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :return: async generator with rows
+        """
+        query, params = LemkPgUtils.get_select_query(table_name, GET_ALL_COLUMNS,
+                                                     order_by=order_by, sort_type=sort_type)
+        async for row in LemkPgUtils.iter_query_result(self._engine, query, params, itersize,
+                                                       row_factory, readonly=True):
+            yield row
+
     async def get(self, table_name: str, fields: list,
-                  conditions_list=None, distinct=False, order_by=None, sort_type=None):
+                  conditions_list=None, distinct=False, order_by=None, sort_type=None, row_factory=None):
         """
         >>> await db_conn.get("demo", ["date", "symbol"], conditions_list=[("date", "=", "2006-01-05", None)],
          distinct=True)
@@ -672,19 +1566,112 @@ class AsyncLemkPgApi:
         :param distinct: bool value. Default False. If True - get unique records
         :param order_by: string with column for ordering
         :param sort_type: string with type of ordering (ASC / DESC)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
-        dist = f"{'DISTINCT ' if distinct else ''}"
-        sort = f"{' ORDER BY ' + order_by + ' ' + sort_type if order_by and sort_type else ''}"
-        if conditions_list:
-            conditions = LemkPgUtils.get_conditions(conditions_list)
-            query = f"""SELECT {dist}{", ".join(fields)} FROM {table_name} WHERE {" ".join(
-                conditions)}{sort}"""
-        else:
-            query = f"""SELECT {dist}{", ".join(fields)} FROM {table_name}{sort}"""
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
+        query, params = LemkPgUtils.get_select_query(table_name, fields, conditions_list, distinct,
+                                                     order_by, sort_type)
+        result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                    row_factory=row_factory, readonly=True,
+                                                    tables=[table_name])
         return result
 
+    async def iter_get(self, table_name: str, fields: list, conditions_list=None, distinct=False, order_by=None,
+                       sort_type=None, itersize=1000, row_factory=None):
+        """
+        >>> async for row in db_conn.iter_get("demo", ["date", "symbol"], conditions_list=[("symbol", "=", "A", None)]):
+        ...     print(row)
+
+        Rows are fetched from server-side cursor by itersize rows, so memory doesn't depend on result size.
+        Connection of pool is held until all rows are fetched or iteration is stopped.
+
+        :param table_name: string with table name
+        :param fields: list with fields for selection
+        :param conditions_list: list with tuples with conditions in it. In each tuple should be defined four values:
+                 1) column for assert in WHERE clause (e.g. "date")
+                 2) operand for assert column (e.g. "=", or "!=")
+                 3) value for assert (e.g. "2006-01-05")
+                 4) additional value if you need more then one conditions in where clause.
+                    if one tuple in list - this value should be None. If more then one tuple in conditions_list -
+                    this value should be string (e.g. "AND", or "OR")
+        :param distinct: bool value. Default False. If True - get unique records
+        :param order_by: string with column for ordering
+        :param sort_type: string with type of ordering (ASC / DESC)
+        :param itersize: count of rows fetched from server in one round-trip. Default 1000
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :return: async generator with rows
+        """
+        query, params = LemkPgUtils.get_select_query(table_name, fields, conditions_list, distinct,
+                                                     order_by, sort_type)
+        async for row in LemkPgUtils.iter_query_result(self._engine, query, params, itersize,
+                                                       row_factory, readonly=True):
+            yield row
+
+    async def paginate(self, table_name: str, fields: list, order_by: list, page_size=100, after=None,
+                       conditions_list=None, sort_type=ORDER_BY_ASC, row_factory=None):
+        """
+        >>> rows, cursor = await db_conn.paginate("demo", ["id", "date"], order_by=["id"], page_size=50)
+        >>> next_rows, next_cursor = await db_conn.paginate("demo", ["id", "date"], ["id"], page_size=50, after=cursor)
+
+        Keyset pagination: page starts after the key of the last row of previous page
+        (WHERE (a, b) > (%s, %s) ORDER BY a, b LIMIT n), so deep pages are as fast as the first one
+        if there is index on order_by columns.
+
+        :param table_name: string with table name
+        :param fields: list with fields of result
+        :param order_by: list with columns of unique key (e.g. ["id"] or ["date", "id"]), which define order of rows
+        :param page_size: count of rows on page. Default 100
+        :param conditions_list: list with tuples with conditions in it. In each tuple should be defined four values:
+                 1) column for assert in WHERE clause (e.g. "date")
+                 2) operand for assert column (e.g. "=", or "!=")
+                 3) value for assert (e.g. "2006-01-05")
+                 4) additional value if you need more then one conditions in where clause.
+                    if one tuple in list - this value should be None. If more then one tuple in conditions_list -
+                    this value should be string (e.g. "AND", or "OR")
+        :param sort_type: string with type of ordering for all order_by columns (ASC / DESC). Default ASC
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :param after: None (first page) or cursor returned with previous page
+        :return: tuple with list of rows and cursor of next page (tuple with key of the last row, None for last page)
+        """
+        return await LemkPgUtils.get_page(self._engine, table_name, fields, order_by, page_size, after,
+                                          conditions_list, sort_type, row_factory)
+
+    async def iter_pages(self, table_name: str, fields: list, order_by: list, page_size=100, conditions_list=None,
+                         sort_type=ORDER_BY_ASC, row_factory=None):
+        """
+        >>> async for rows in db_conn.iter_pages("demo", ["id", "date"], order_by=["id"], page_size=1000):
+        ...     print(len(rows))
+
+        Walk whole table (or rows matching conditions_list) page by page with keyset pagination.
+
+        :param table_name: string with table name
+        :param fields: list with fields of result
+        :param order_by: list with columns of unique key (e.g. ["id"] or ["date", "id"]), which define order of rows
+        :param page_size: count of rows on page. Default 100
+        :param conditions_list: list with tuples with conditions in it. In each tuple should be defined four values:
+                 1) column for assert in WHERE clause (e.g. "date")
+                 2) operand for assert column (e.g. "=", or "!=")
+                 3) value for assert (e.g. "2006-01-05")
+                 4) additional value if you need more then one conditions in where clause.
+                    if one tuple in list - this value should be None. If more then one tuple in conditions_list -
+                    this value should be string (e.g. "AND", or "OR")
+        :param sort_type: string with type of ordering for all order_by columns (ASC / DESC). Default ASC
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :return: async generator with pages (lists of rows)
+        """
+        after = None
+        while True:
+            rows, after = await self.paginate(table_name, fields, order_by, page_size, after, conditions_list,
+                                              sort_type, row_factory)
+            if rows:
+                yield rows
+            if after is None:
+                return
+
     async def update(self, table_name: str, fields: dict, conditions_list=None):
         """
         >>> await db_conn.update("demo", {"date": "2005-01-05", "symbol": "Adc"}, [("date", "=", "2006-01-05", None),
@@ -701,16 +1688,28 @@ class AsyncLemkPgApi:
                     this value should be string (e.g. "AND", or "OR")
         :return: result if query success
         """
-        columns_for_update = [f"{field[0]} = '{field[1]}'" for field in fields.items()]
-        if conditions_list:
-            conditions = LemkPgUtils.get_conditions(conditions_list)
-            query = f"""UPDATE {table_name} SET {", ".join(columns_for_update)} WHERE {" ".join(
-                conditions)}"""
-        else:
-            query = f"""UPDATE {table_name} SET {", ".join(columns_for_update)}"""
-        result = await LemkPgUtils.execute_query(self.dsn, query)
+        query, params = LemkPgUtils.get_update_query(table_name, fields, conditions_list)
+        result = await LemkPgUtils.execute_query(self._engine, query, params, [table_name])
         return result
 
+    async def update_many(self, table_name: str, rows, key_columns: list, set_columns: list):
+        """
+        >>> await db_conn.update_many("demo", [(1, "RHAT", 35.14), (2, "IBM", 41.5)], ["id"], ["symbol", "price"])
+        2
+
+        COPY rows into temporary table and update rows of table by one UPDATE ... FROM statement in one
+        transaction, so many rows with different values are updated in a few round-trips. Rows are matched by
+        key_columns, rows of table without new values are left as is. If rows have the same key, which of them
+        is applied isn't defined. COPY isn't supported inside transaction().
+
+        :param table_name: string with table name
+        :param rows: iterable (list, generator, etc.) with tuples of values of key_columns and then of set_columns
+        :param key_columns: list with columns which identify row (e.g. ["id"])
+        :param set_columns: list with columns which are updated
+        :return: count of updated rows
+        """
+        return await LemkPgUtils.update_from_copy(self._engine, table_name, rows, key_columns, set_columns)
+
     async def alter_table(self, table_name: str, column_name: str, action: str, column_type=None):
         """
         >>> await db_conn.alter_table("demo", "date", "ALTER COLUMN", column_type="varchar")
@@ -723,21 +1722,129 @@ class AsyncLemkPgApi:
         """
         query = (f"""ALTER TABLE {table_name} {action} {column_name}"""
                  f"""{' TYPE ' + column_type if column_type else ''}""")
-        result = await LemkPgUtils.execute_query(self.dsn, query)
+        result = await LemkPgUtils.execute_query(self._engine, query, tables=[table_name])
         return result
 
-    async def raw_query(self, query: str):
+    async def raw_query(self, query: str, params=None, row_factory=None, readonly=False):
         """
         >>> await db_conn.raw_query("SELECT * FROM demo INNER JOIN datatable ON demo.trans = datatable.trans")
 
         :param query: string with query for manual execution
+        :param params: None or list (tuple) with values for %s placeholders in query
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :param readonly: True if query only reads data, so it can be executed on replica
         :return: result if query success
         """
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
+        result = await LemkPgUtils.get_query_result(self._engine, query, params, row_factory=row_factory,
+                                                    readonly=readonly)
         return result
 
+    async def iter_raw(self, query: str, params=None, itersize=1000, row_factory=None, readonly=False):
+        """
+        >>> async for row in db_conn.iter_raw("SELECT * FROM demo WHERE id > %s", [100]):
+        ...     print(row)
+
+        Rows are fetched from server-side cursor by itersize rows, so memory doesn't depend on result size.
+        Connection of pool is held until all rows are fetched or iteration is stopped.
+
+        :param query: string with query for manual execution
+        :param params: None or list (tuple) with values for %s placeholders in query
+        :param itersize: count of rows fetched from server in one round-trip. Default 1000
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :param readonly: True if query only reads data, so it can be executed on replica
+        :return: async generator with rows
+        """
+        async for row in LemkPgUtils.iter_query_result(self._engine, query, params, itersize,
+                                                       row_factory, readonly=readonly):
+            yield row
+
+    async def fetch_columns(self, query: str, params=None):
+        """
+        >>> await db_conn.fetch_columns("SELECT id, price FROM demo WHERE date > %s", ["2006-01-05"])
+
+        Result is read via COPY in binary format and decoded straight into columns, without tuple for each row.
+
+        :param query: string with SELECT query
+        :param params: None or list (tuple) with values for %s placeholders in query
+        :return: dict with column name as key and array.array (numeric columns without NULLs) or list as value
+        """
+        return await LemkPgUtils.copy_binary_result(self._engine, query, params, LemkPgColumns.decode_columns)
+
+    async def fetch_numpy(self, query: str, params=None):
+        """
+        >>> await db_conn.fetch_numpy("SELECT id, price FROM demo WHERE date > %s", ["2006-01-05"])
+
+        Result is read via COPY in binary format and decoded straight into columns, without tuple for each row.
+        numpy is optional dependency: pip install lemkpg[numpy]
+
+        :param query: string with SELECT query
+        :param params: None or list (tuple) with values for %s placeholders in query
+        :return: dict with column name as key and numpy.ndarray as value. Integer columns with NULLs are
+         converted to float64 with NaN
+        """
+        return await LemkPgUtils.copy_binary_result(self._engine, query, params, LemkPgColumns.decode_numpy)
+
+    async def export(self, table_or_query: str, file_like, format=EXPORT_CSV, params=None, header=False):
+        """
+        >>> with open("demo.csv", "w") as f:
+        ...     await db_conn.export("demo", f, format="csv", header=True)
+        >>> await db_conn.export("SELECT * FROM demo WHERE date > %s", sock.makefile("wb"), "binary", ["2006-01-05"])
+
+        Table or query result is streamed via COPY ... TO STDOUT directly into file_like block by block,
+        without creating rows in memory. Blocking writes to file_like are done in executor thread.
+
+        :param table_or_query: string with table name or SELECT query
+        :param file_like: object with write() method (file, socket file, io.BytesIO etc.).
+         Data in "binary" format needs file opened in binary mode
+        :param format: string with format of data ("csv", "text" or "binary"). Default "csv"
+        :param params: None or list (tuple) with values for %s placeholders in query
+        :param header: True for first line with column names ("csv" format only). Default False
+        :return: count of exported rows
+        """
+        query = LemkPgUtils.get_export_query(table_or_query, format, header)
+        return await LemkPgUtils.copy_to(self._engine, query, file_like, params)
+
+    async def parallel_scan(self, table_name: str, fields: list, partition_column=ID, partitions=8,
+                            concurrency=None, conditions_list=None, row_factory=None, path=None, format=EXPORT_CSV,
+                            header=False):
+        """
+        >>> async for rows in db_conn.parallel_scan("demo", ["*"], partition_column="id", partitions=16):
+        ...     print(len(rows))
+        >>> paths = [path async for path in db_conn.parallel_scan("demo", ["*"], path="demo_{partition}.csv")]
+
+        Key range of partition_column (from MIN to MAX) is split into "partitions" ranges, which are read
+        concurrently on connections of pool (or replicas). Each partition is read in separate transaction,
+        so scan isn't one snapshot of table which is changed during it.
+
+        :param table_name: string with table name
+        :param fields: list with fields of result
+        :param partition_column: string with integer column (preferably indexed) for split. Default "id"
+        :param partitions: count of key ranges. Default 8
+        :param concurrency: max count of partitions read at once. Default None (max size of connection pool)
+        :param conditions_list: list with tuples with conditions in it. In each tuple should be defined four values:
+                 1) column for assert in WHERE clause (e.g. "date")
+                 2) operand for assert column (e.g. "=", or "!=")
+                 3) value for assert (e.g. "2006-01-05")
+                 4) additional value if you need more then one conditions in where clause.
+                    if one tuple in list - this value should be None. If more then one tuple in conditions_list -
+                    this value should be string (e.g. "AND", or "OR")
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
+        :param path: None or path of files with "{partition}" in it (e.g. "demo_{partition}.csv"). If defined,
+         each partition is streamed via COPY into its own file instead of returning rows
+        :param format: string with format of files ("csv", "text" or "binary"). Default "csv"
+        :param header: True for first line with column names in each file ("csv" format only). Default False
+        :return: async generator with results of partitions (lists of rows or file paths) in order of completion
+        """
+        async for result in LemkPgUtils.scan_partitions(self._engine, table_name, fields, partition_column,
+                                                        partitions, concurrency or self._engine.maxsize,
+                                                        conditions_list, row_factory, path, format, header):
+            yield result
+
     async def get_with_join(self, table_name: str, join_table_name: str, join_type: str,
-                            fields: list, on_condition: tuple, where_conditions_list=None):
+                            fields: list, on_condition: tuple, where_conditions_list=None, row_factory=None):
         """
         >>> await db_conn.get_with_join("demo", "datatable", "INNER JOIN", ["*"], ("demo.trans", "=", "datatable.trans"))
 
@@ -756,25 +1863,19 @@ class AsyncLemkPgApi:
                  4) additional value if you need more then one conditions in where clause.
                     if one tuple in list - this value should be None. If more then one tuple in conditions_list -
                     this value should be string (e.g. "AND", or "OR")
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
-        if join_type not in JOINS_LIST:
-            message = f"Incorrect JOIN type. Please use one of the valid JOIN types: {', '.join(JOINS_LIST)}"
-            raise LemkPgError(message)
-
-        if where_conditions_list:
-            conditions = LemkPgUtils.get_conditions(where_conditions_list)
-            query = (f"""SELECT {", ".join(fields)} FROM {table_name} {join_type} {join_table_name}"""
-                     f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}"""
-                     f""" WHERE {" ".join(conditions)}""")
-        else:
-            query = (f"""SELECT {", ".join(fields)} FROM {table_name} {join_type} {join_table_name}"""
-                     f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}""")
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
+        query, params = LemkPgUtils.get_join_query(table_name, join_table_name, join_type, fields, on_condition,
+                                                   where_conditions_list)
+        result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                    row_factory=row_factory, readonly=True,
+                                                    tables=[table_name, join_table_name])
         return result
 
     async def inner_join(self, table_name: str, join_table_name: str,
-                         on_condition: tuple, where_conditions_list=None, fields=None, all=True):
+                         on_condition: tuple, where_conditions_list=None, fields=None, all=True, row_factory=None):
         """
         >>> await db_conn.inner_join("demo", "datatable", ("demo.trans", "=", "datatable.trans"))
 
@@ -794,22 +1895,20 @@ class AsyncLemkPgApi:
         :param fields: list with strings with columns names in it
          (e.g. "["trans", "date"]. Default None (get all columns -  if param all is True)"
         :param all: bool param - for check do we need all fields or not. Default - True (get all fields)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
-        query_fields = ("*" if not fields and all else f'{", ".join(fields)}')
-        if where_conditions_list:
-            conditions = LemkPgUtils.get_conditions(where_conditions_list)
-            query = (f"""SELECT {query_fields} FROM {table_name} INNER JOIN {join_table_name}"""
-                     f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}"""
-                     f""" WHERE {" ".join(conditions)}""")
-        else:
-            query = (f"""SELECT {query_fields} FROM {table_name} INNER JOIN {join_table_name}"""
-                     f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}""")
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
+        query_fields = LemkPgUtils.get_join_fields(fields, all)
+        query, params = LemkPgUtils.get_join_query(table_name, join_table_name, INNER_JOIN, query_fields,
+                                                   on_condition, where_conditions_list)
+        result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                    row_factory=row_factory, readonly=True,
+                                                    tables=[table_name, join_table_name])
         return result
 
     async def left_join(self, table_name: str, join_table_name: str,
-                        on_condition: tuple, where_conditions_list=None, fields=None, all=True):
+                        on_condition: tuple, where_conditions_list=None, fields=None, all=True, row_factory=None):
         """
         >>> await db_conn.left_join("demo", "datatable", ("demo.trans", "=", "datatable.trans"))
 
@@ -829,22 +1928,20 @@ class AsyncLemkPgApi:
         :param fields: list with strings with columns names in it
          (e.g. "["trans", "date"]. Default None (get all columns -  if param all is True)"
         :param all: bool param - for check do we need all fields or not. Default - True (get all fields)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
-        query_fields = ("*" if not fields and all else f'{", ".join(fields)}')
-        if where_conditions_list:
-            conditions = LemkPgUtils.get_conditions(where_conditions_list)
-            query = (f"""SELECT {query_fields} FROM {table_name} LEFT JOIN {join_table_name}"""
-                     f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}"""
-                     f""" WHERE {" ".join(conditions)}""")
-        else:
-            query = (f"""SELECT {query_fields} FROM {table_name} LEFT JOIN {join_table_name}"""
-                     f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}""")
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
+        query_fields = LemkPgUtils.get_join_fields(fields, all)
+        query, params = LemkPgUtils.get_join_query(table_name, join_table_name, LEFT_JOIN, query_fields,
+                                                   on_condition, where_conditions_list)
+        result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                    row_factory=row_factory, readonly=True,
+                                                    tables=[table_name, join_table_name])
         return result
 
     async def right_join(self, table_name: str, join_table_name: str,
-                         on_condition: tuple, where_conditions_list=None, fields=None, all=True):
+                         on_condition: tuple, where_conditions_list=None, fields=None, all=True, row_factory=None):
         """
         >>> await db_conn.right_join("demo", "datatable", ("demo.trans", "=", "datatable.trans"))
 
@@ -864,22 +1961,20 @@ class AsyncLemkPgApi:
         :param fields: list with strings with columns names in it
          (e.g. "["trans", "date"]. Default None (get all columns -  if param all is True)"
         :param all: bool param - for check do we need all fields or not. Default - True (get all fields)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
-        query_fields = ("*" if not fields and all else f'{", ".join(fields)}')
-        if where_conditions_list:
-            conditions = LemkPgUtils.get_conditions(where_conditions_list)
-            query = (f"""SELECT {query_fields} FROM {table_name} RIGHT JOIN {join_table_name}"""
-                     f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}"""
-                     f""" WHERE {" ".join(conditions)}""")
-        else:
-            query = (f"""SELECT {query_fields} FROM {table_name} RIGHT JOIN {join_table_name}"""
-                     f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}""")
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
+        query_fields = LemkPgUtils.get_join_fields(fields, all)
+        query, params = LemkPgUtils.get_join_query(table_name, join_table_name, RIGHT_JOIN, query_fields,
+                                                   on_condition, where_conditions_list)
+        result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                    row_factory=row_factory, readonly=True,
+                                                    tables=[table_name, join_table_name])
         return result
 
     async def full_join(self, table_name: str, join_table_name: str,
-                        on_condition: tuple, where_conditions_list=None, fields=None, all=True):
+                        on_condition: tuple, where_conditions_list=None, fields=None, all=True, row_factory=None):
         """
         >>> await db_conn.full_join("demo", "datatable", ("demo.trans", "=", "datatable.trans"))
 
@@ -899,18 +1994,16 @@ class AsyncLemkPgApi:
         :param fields: list with strings with columns names in it
          (e.g. "["trans", "date"]. Default None (get all columns -  if param all is True)"
         :param all: bool param - for check do we need all fields or not. Default - True (get all fields)
+        :param row_factory: None, callable or string with type of rows ("tuple", "dict", "namedtuple", "record" or
+         "columns"). Default None (row_factory of db_conn is used)
         :return: result if query success
         """
-        query_fields = ("*" if not fields and all else f'{", ".join(fields)}')
-        if where_conditions_list:
-            conditions = LemkPgUtils.get_conditions(where_conditions_list)
-            query = (f"""SELECT {query_fields} FROM {table_name} FULL OUTER JOIN {join_table_name}"""
-                     f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}"""
-                     f""" WHERE {" ".join(conditions)}""")
-        else:
-            query = (f"""SELECT {query_fields} FROM {table_name} FULL OUTER JOIN {join_table_name}"""
-                     f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}""")
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
+        query_fields = LemkPgUtils.get_join_fields(fields, all)
+        query, params = LemkPgUtils.get_join_query(table_name, join_table_name, FULL_OUTER_JOIN, query_fields,
+                                                   on_condition, where_conditions_list)
+        result = await LemkPgUtils.get_query_result(self._engine, query, params, prepare=True,
+                                                    row_factory=row_factory, readonly=True,
+                                                    tables=[table_name, join_table_name])
         return result
 
     async def delete_table(self, table_name: str):
@@ -921,7 +2014,7 @@ class AsyncLemkPgApi:
         :return: True if query success
         """
         query = f"""DROP TABLE IF EXISTS {table_name}"""
-        await LemkPgUtils.execute_query(self.dsn, query)
+        await LemkPgUtils.execute_query(self._engine, query, tables=[table_name])
         return True
 
     async def clear_table(self, table_name: str):
@@ -932,7 +2025,7 @@ class AsyncLemkPgApi:
         :return: True if query success
         """
         query = f"""TRUNCATE TABLE {table_name}"""
-        await LemkPgUtils.execute_query(self.dsn, query)
+        await LemkPgUtils.execute_query(self._engine, query, tables=[table_name])
         return True
 
     async def delete_records(self, table_name: str, conditions_list=None):
@@ -949,14 +2042,41 @@ class AsyncLemkPgApi:
                     this value should be string (e.g. "AND", or "OR")
         :return: True if query success
         """
-        if conditions_list:
-            conditions = LemkPgUtils.get_conditions(conditions_list)
-            query = f"""DELETE FROM {table_name} WHERE {" ".join(conditions)}"""
-        else:
-            query = f"""DELETE FROM {table_name}"""
-        await LemkPgUtils.execute_query(self.dsn, query)
+        query, params = LemkPgUtils.get_delete_query(table_name, conditions_list)
+        await LemkPgUtils.execute_query(self._engine, query, params, [table_name])
         return True
 
+    async def aggregate(self, table_name: str, aggregates: dict, conditions_list=None, group_by=None,
+                        having=None):
+        """
+        >>> await db_conn.aggregate("demo", {"count": "id", "avg": "price", "max": ["date", "price"]})
+        {'count': 5, 'avg': Decimal('20.5'), 'max': [datetime.date(2006, 1, 5), Decimal('35.14')]}
+        >>> await db_conn.aggregate("demo", {"count": "id"}, group_by=["symbol"],
+        ...                         having=[("COUNT(id)", ">", 1, None)])
+        {'RHAT': {'count': 3}, 'AAPL': {'count': 2}}
+
+        All aggregates are computed by one query (one scan of table).
+
+        :param table_name: string with table name
+        :param aggregates: dict with aggregate function ("count", "avg", "sum", "min" or "max") as key and
+         column name (or list of column names) as value
+        :param conditions_list: list with tuples with conditions in it. In each tuple should be defined four values:
+                 1) column for assert in WHERE clause (e.g. "date")
+                 2) operand for assert column (e.g. "=", or "!=")
+                 3) value for assert (e.g. "2006-01-05")
+                 4) additional value if you need more then one conditions in where clause.
+                    if one tuple in list - this value should be None. If more then one tuple in conditions_list -
+                    this value should be string (e.g. "AND", or "OR")
+        :param group_by: None or list with column names for GROUP BY clause
+        :param having: None or list with tuples with conditions for HAVING clause, the same as in conditions_list
+         (e.g. [("COUNT(id)", ">", 5, None)])
+        :return: dict with aggregate function as key and value (or list of values for list of column names).
+         With group_by - dict with value of group column (tuple of values for several columns) as key
+         and such dict as value. Without group_by - None if having filtered out the result
+        """
+        return await LemkPgUtils.get_aggregates(self._engine, table_name, aggregates, conditions_list, group_by,
+                                                having)
+
     async def count(self, table_name: str, column: str, conditions_list=None):
         """
         >>> await db_conn.count("demo", "date")
@@ -972,13 +2092,8 @@ class AsyncLemkPgApi:
                     this value should be string (e.g. "AND", or "OR")
         :return: result if query success
         """
-        if conditions_list:
-            conditions = LemkPgUtils.get_conditions(conditions_list)
-            query = f"""SELECT COUNT({column}) FROM {table_name} WHERE {" ".join(conditions)}"""
-        else:
-            query = f"""SELECT COUNT({column}) FROM {table_name}"""
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
-        return result
+        result = await LemkPgUtils.get_aggregates(self._engine, table_name, {COUNT: column}, conditions_list)
+        return result and [(result[COUNT],)]
 
     async def avg(self, table_name: str, column: str, conditions_list=None):
         """
@@ -995,13 +2110,8 @@ class AsyncLemkPgApi:
                     this value should be string (e.g. "AND", or "OR")
         :return: result if query success
         """
-        if conditions_list:
-            conditions = LemkPgUtils.get_conditions(conditions_list)
-            query = f"""SELECT AVG({column}) FROM {table_name} WHERE {" ".join(conditions)}"""
-        else:
-            query = f"""SELECT AVG({column}) FROM {table_name}"""
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
-        return result
+        result = await LemkPgUtils.get_aggregates(self._engine, table_name, {AVG: column}, conditions_list)
+        return result and [(result[AVG],)]
 
     async def sum(self, table_name: str, column: str, conditions_list=None):
         """
@@ -1018,13 +2128,8 @@ class AsyncLemkPgApi:
                     this value should be string (e.g. "AND", or "OR")
         :return: result if query success
         """
-        if conditions_list:
-            conditions = LemkPgUtils.get_conditions(conditions_list)
-            query = f"""SELECT SUM({column}) FROM {table_name} WHERE {" ".join(conditions)}"""
-        else:
-            query = f"""SELECT SUM({column}) FROM {table_name}"""
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
-        return result
+        result = await LemkPgUtils.get_aggregates(self._engine, table_name, {SUM: column}, conditions_list)
+        return result and [(result[SUM],)]
 
     async def min(self, table_name: str, column: str, conditions_list=None):
         """
@@ -1041,13 +2146,8 @@ class AsyncLemkPgApi:
                     this value should be string (e.g. "AND", or "OR")
         :return: result if query success
         """
-        if conditions_list:
-            conditions = LemkPgUtils.get_conditions(conditions_list)
-            query = f"""SELECT MIN({column}) FROM {table_name} WHERE {" ".join(conditions)}"""
-        else:
-            query = f"""SELECT MIN({column}) FROM {table_name}"""
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
-        return result
+        result = await LemkPgUtils.get_aggregates(self._engine, table_name, {MIN: column}, conditions_list)
+        return result and [(result[MIN],)]
 
     async def max(self, table_name: str, column: str, conditions_list=None):
         """
@@ -1064,10 +2164,9 @@ class AsyncLemkPgApi:
                     this value should be string (e.g. "AND", or "OR")
         :return: result if query success
         """
-        if conditions_list:
-            conditions = LemkPgUtils.get_conditions(conditions_list)
-            query = f"""SELECT MAX({column}) FROM {table_name} WHERE {" ".join(conditions)}"""
-        else:
-            query = f"""SELECT MAX({column}) FROM {table_name}"""
-        result = await LemkPgUtils.get_query_result(self.dsn, query)
-        return result
+        result = await LemkPgUtils.get_aggregates(self._engine, table_name, {MAX: column}, conditions_list)
+        return result and [(result[MAX],)]
+
+
+LemkPgMetrics.add_methods(LemkPgApi)
+LemkPgMetrics.add_methods(AsyncLemkPgApi)
@@ -0,0 +1,144 @@
+import asyncio
+
+from .utils import LemkPgUtils
+from .constants import COUNT, AVG, SUM, MIN, MAX
+
+READ = "read"
+WRITE = "write"
+
+
+class LemkPgBatch:
+    """
+    LemkPgBatch queues queries and returns future for each of them. Queries are executed when batch is closed:
+    consecutive writes are sent to database as one multi-statement query in one transaction (one round-trip),
+    consecutive reads run concurrently on connections of pool. Order of reads and writes is kept.
+    """
+
+    def __init__(self, engine, create_future):
+        """
+        :param engine: LemkPgEngine of db_conn
+        :param create_future: callable which returns new future (asyncio or concurrent.futures one)
+        """
+        self._engine = engine
+        self._create_future = create_future
+        self._items = []
+        self._written = False
+
+    def __len__(self):
+        return len(self._items)
+
+    def _add(self, kind, value):
+        future = self._create_future()
+        self._items.append((kind, future, value))
+        return future
+
+    def _read(self, query, params=None, prepare=True, row_factory=None, readonly=True, tables=None):
+        # replica can lag behind primary, so reads after writes of this batch are executed on primary
+        return self._add(READ, lambda: LemkPgUtils.get_query_result(self._engine, query, params, prepare, row_factory,
+                                                                    readonly and not self._written, tables))
+
+    def _write(self, table_name, query, params=None):
+        return self._add(WRITE, (table_name, query, params))
+
+    def get_all(self, table_name: str, order_by=None, sort_type=None, row_factory=None):
+        query, params = LemkPgUtils.get_select_query(table_name, ["*"], order_by=order_by, sort_type=sort_type)
+        return self._read(query, params, row_factory=row_factory, tables=[table_name])
+
+    def get(self, table_name: str, fields: list, conditions_list=None, distinct=False, order_by=None, sort_type=None,
+            row_factory=None):
+        query, params = LemkPgUtils.get_select_query(table_name, fields, conditions_list, distinct, order_by,
+                                                     sort_type)
+        return self._read(query, params, row_factory=row_factory, tables=[table_name])
+
+    def raw_query(self, query: str, params=None, row_factory=None, readonly=False):
+        return self._read(query, params, prepare=False, row_factory=row_factory, readonly=readonly)
+
+    def get_with_join(self, table_name: str, join_table_name: str, join_type: str,
+                      fields: list, on_condition: tuple, where_conditions_list=None, row_factory=None):
+        query, params = LemkPgUtils.get_join_query(table_name, join_table_name, join_type, fields, on_condition,
+                                                   where_conditions_list)
+        return self._read(query, params, row_factory=row_factory, tables=[table_name, join_table_name])
+
+    def aggregate(self, table_name: str, aggregates: dict, conditions_list=None, group_by=None, having=None):
+        # query is built now, so incorrect aggregates raise error right away
+        LemkPgUtils.get_aggregates_query(table_name, aggregates, conditions_list, group_by, having)
+        return self._add(READ, lambda: LemkPgUtils.get_aggregates(self._engine, table_name, aggregates,
+                                                                  conditions_list, group_by, having,
+                                                                  not self._written))
+
+    def _aggregate(self, table_name, function, column, conditions_list):
+
+        async def func():
+            result = await LemkPgUtils.get_aggregates(self._engine, table_name, {function: column}, conditions_list,
+                                                      readonly=not self._written)
+            return result and [(result[function],)]
+
+        return self._add(READ, func)
+
+    def count(self, table_name: str, column: str, conditions_list=None):
+        return self._aggregate(table_name, COUNT, column, conditions_list)
+
+    def avg(self, table_name: str, column: str, conditions_list=None):
+        return self._aggregate(table_name, AVG, column, conditions_list)
+
+    def sum(self, table_name: str, column: str, conditions_list=None):
+        return self._aggregate(table_name, SUM, column, conditions_list)
+
+    def min(self, table_name: str, column: str, conditions_list=None):
+        return self._aggregate(table_name, MIN, column, conditions_list)
+
+    def max(self, table_name: str, column: str, conditions_list=None):
+        return self._aggregate(table_name, MAX, column, conditions_list)
+
+    def insert(self, table_name: str, values: tuple, columns=None):
+        return self._write(table_name, *LemkPgUtils.get_insert_query(table_name, values, columns))
+
+    def update(self, table_name: str, fields: dict, conditions_list=None):
+        return self._write(table_name, *LemkPgUtils.get_update_query(table_name, fields, conditions_list))
+
+    def delete_records(self, table_name: str, conditions_list=None):
+        return self._write(table_name, *LemkPgUtils.get_delete_query(table_name, conditions_list))
+
+    def cancel(self):
+        for _, future, _ in self._items:
+            future.cancel()
+        self._items = []
+
+    def get_segments(self):
+        # consecutive items of the same kind are executed together
+        segments = []
+        for item in self._items:
+            if segments and segments[-1][0] == item[0]:
+                segments[-1][1].append(item)
+            else:
+                segments.append((item[0], [item]))
+        return segments
+
+    async def execute(self):
+        segments = self.get_segments()
+        self._items = []
+        for index, (kind, items) in enumerate(segments):
+            if kind == READ:
+                results = await asyncio.gather(*(func() for _, _, func in items), return_exceptions=True)
+            else:
+                try:
+                    writes = [write for _, _, write in items]
+                    await LemkPgUtils.execute_statements(self._engine, [(query, params) for _, query, params in writes],
+                                                         [table_name for table_name, _, _ in writes])
+                    results = [True] * len(items)
+                    self._written = True
+                except Exception as e:
+                    results = [e] * len(items)
+            error = None
+            for (_, future, _), result in zip(items, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                    error = error or result
+                else:
+                    future.set_result(result)
+            if error is not None:
+                # next queries can depend on failed ones, so they are not executed
+                for _, next_items in segments[index + 1:]:
+                    for _, future, _ in next_items:
+                        future.cancel()
+                raise error
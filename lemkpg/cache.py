@@ -0,0 +1,116 @@
+import collections
+import sys
+import time
+
+from .rows import LemkPgRecord
+
+
+class LemkPgResultCache:
+    """
+    LemkPgResultCache keeps results of read queries of query builders in LRU order with TTL and memory budget.
+    Results are keyed by SQL text and params and are indexed by tables of query,
+    so write to table through the same db_conn evicts all results which depend on it.
+    """
+
+    def __init__(self, size=0, ttl=60.0, max_memory=None):
+        """
+        :param size: max count of cached results. Default 0 (cache is disabled)
+        :param ttl: seconds after which cached result expires. Default 60
+        :param max_memory: None or max approximate size of cached results in bytes
+        """
+        self.size = size
+        self.ttl = ttl
+        self.max_memory = max_memory
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = collections.OrderedDict()
+        self._tables = collections.defaultdict(set)
+        # version of table is changed on each write, so result of read which was running during write isn't cached
+        self._versions = collections.defaultdict(int)
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    @classmethod
+    def get_key(cls, query, params):
+        # tuple rows are cached and converted on each hit, so one entry serves all row factories
+        return query, repr(params)
+
+    @classmethod
+    def get_memory_size(cls, value, depth=3):
+        size = sys.getsizeof(value)
+        if depth:
+            if isinstance(value, dict):
+                size += sum(cls.get_memory_size(item, depth - 1) for item in value.values())
+            elif isinstance(value, (list, tuple, LemkPgRecord)):
+                size += sum(cls.get_memory_size(item, depth - 1) for item in value)
+        return size
+
+    def get_versions(self, tables):
+        return tuple(self._versions[table] for table in tables)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, tables, versions, result):
+        if self.get_versions(tables) != versions:
+            return
+        memory = self.get_memory_size(result)
+        if self.max_memory is not None and memory > self.max_memory:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, result, tables, memory)
+        self.memory += memory
+        for table in tables:
+            self._tables[table].add(key)
+        while len(self._entries) > self.size or (self.max_memory is not None and self.memory > self.max_memory):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, _, tables, memory = self._entries.pop(key)
+        self.memory -= memory
+        for table in tables:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+    def invalidate(self, tables):
+        for table in tables:
+            self._versions[table] += 1
+            for key in list(self._tables.get(table, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._tables.clear()
+        self.memory = 0
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            "size": self.size,
+            "entries": len(self._entries),
+            "memory": self.memory,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,173 @@
+import datetime
+import decimal
+import struct
+import uuid
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .exceptions import LemkPgError
+from .rows import LemkPgRows
+
+COPY_BINARY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+POSTGRES_EPOCH_DATE = datetime.date(2000, 1, 1)
+POSTGRES_EPOCH = datetime.datetime(2000, 1, 1)
+# PostgreSQL type OID -> struct format of fixed width value in COPY binary format
+FIXED_FORMATS = {16: "?", 20: ">q", 21: ">h", 23: ">i", 26: ">I", 700: ">f", 701: ">d", 1082: ">i", 1114: ">q",
+                 1184: ">q"}
+TEXT_TYPES = {19, 25, 114, 1042, 1043}
+BYTEA_TYPE = 17
+UUID_TYPE = 2950
+NUMERIC_TYPE = 1700
+DATE_TYPE = 1082
+TIMESTAMP_TYPES = {1114, 1184}
+# PostgreSQL type OID -> numpy dtype of decoded column
+NUMPY_TYPES = {16: "bool", 20: "int64", 21: "int16", 23: "int32", 26: "uint32", 700: "float32", 701: "float64",
+               1082: "datetime64[D]", 1114: "datetime64[us]", 1184: "datetime64[us]", 1700: "float64"}
+
+
+class LemkPgColumns:
+    """
+    LemkPgColumns decodes result of COPY ... TO STDOUT WITH (FORMAT binary) straight into columns,
+    without creating tuple for each row.
+    """
+
+    @classmethod
+    def get_body_offset(cls, view):
+        if bytes(view[:len(COPY_BINARY_SIGNATURE)]) != COPY_BINARY_SIGNATURE or \
+                len(view) < len(COPY_BINARY_SIGNATURE) + 8:
+            raise LemkPgError("Incorrect COPY binary data")
+        extension_length = struct.unpack_from(">i", view, len(COPY_BINARY_SIGNATURE) + 4)[0]
+        return len(COPY_BINARY_SIGNATURE) + 8 + extension_length
+
+    @classmethod
+    def get_decoder(cls, column):
+        type_code = column.type_code
+        if type_code == DATE_TYPE:
+            return lambda view, pos, length: POSTGRES_EPOCH_DATE + datetime.timedelta(
+                days=struct.unpack_from(">i", view, pos)[0])
+        if type_code in TIMESTAMP_TYPES:
+            tzinfo = datetime.timezone.utc if type_code == 1184 else None
+            return lambda view, pos, length: (POSTGRES_EPOCH + datetime.timedelta(
+                microseconds=struct.unpack_from(">q", view, pos)[0])).replace(tzinfo=tzinfo)
+        if type_code in FIXED_FORMATS:
+            unpack_from = struct.Struct(FIXED_FORMATS[type_code]).unpack_from
+            return lambda view, pos, length: unpack_from(view, pos)[0]
+        if type_code in TEXT_TYPES:
+            return lambda view, pos, length: str(view[pos:pos + length], "utf-8")
+        if type_code == BYTEA_TYPE:
+            return lambda view, pos, length: bytes(view[pos:pos + length])
+        if type_code == UUID_TYPE:
+            return lambda view, pos, length: uuid.UUID(bytes=bytes(view[pos:pos + length]))
+        if type_code == NUMERIC_TYPE:
+            return cls.decode_numeric
+        message = f"Column {column.name} has type (OID {type_code}) which can't be decoded. " \
+                  f"Please cast it to text in query (e.g. {column.name}::text)"
+        raise LemkPgError(message)
+
+    @classmethod
+    def decode_numeric(cls, view, pos, length):
+        ndigits, weight, sign, dscale = struct.unpack_from(">hhHh", view, pos)
+        if sign == 0xC000:
+            return decimal.Decimal("NaN")
+        if sign in (0xD000, 0xF000):
+            return decimal.Decimal("Infinity" if sign == 0xD000 else "-Infinity")
+        digits = "".join(f"{digit:04d}" for digit in struct.unpack_from(f">{ndigits}H", view, pos + 8))
+        # digits are in base 10000, so they are aligned to display scale of value
+        exponent = (weight + 1 - ndigits) * 4
+        if exponent > -dscale:
+            digits += "0" * (exponent + dscale)
+        else:
+            digits = digits[:len(digits) + exponent + dscale]
+        return decimal.Decimal((1 if sign == 0x4000 else 0, tuple(map(int, digits or "0")), -dscale))
+
+    @classmethod
+    def decode_values(cls, data, description):
+        decoders = [cls.get_decoder(column) for column in description]
+        values = [[] for _ in description]
+        appends = [column_values.append for column_values in values]
+        view = memoryview(data)
+        pos = cls.get_body_offset(view)
+        unpack_from = struct.unpack_from
+        try:
+            while True:
+                fields = unpack_from(">h", view, pos)[0]
+                pos += 2
+                if fields == -1:
+                    break
+                for index in range(fields):
+                    length = unpack_from(">i", view, pos)[0]
+                    pos += 4
+                    if length == -1:
+                        appends[index](None)
+                    else:
+                        appends[index](decoders[index](view, pos, length))
+                        pos += length
+        except (struct.error, ValueError, IndexError):
+            # stream is truncated (trailer isn't reached) or has more fields than columns
+            raise LemkPgError("Incorrect COPY binary data") from None
+        return values
+
+    @classmethod
+    def decode_columns(cls, data, description):
+        return {column.name: LemkPgRows.get_column(column.type_code, column_values)
+                for column, column_values in zip(description, cls.decode_values(data, description))}
+
+    @classmethod
+    def decode_numpy(cls, data, description):
+        if numpy is None:
+            raise LemkPgError("numpy is required for this method. Please install it: pip install lemkpg[numpy]")
+        columns = cls.decode_fixed_numpy(data, description)
+        if columns is not None:
+            return columns
+        # result has NULLs or columns with variable width - values are decoded one by one
+        return {column.name: cls.get_numpy_column(column.type_code, column_values)
+                for column, column_values in zip(description, cls.decode_values(data, description))}
+
+    @classmethod
+    def decode_fixed_numpy(cls, data, description):
+        # when all columns have fixed width and there are no NULLs, all rows have the same layout,
+        # so whole COPY data is read as one numpy structured array without any loop over rows
+        if not description or any(column.type_code not in FIXED_FORMATS for column in description):
+            return None
+        view = memoryview(data)
+        body = view[cls.get_body_offset(view):len(view) - 2]
+        fields = [("fields", ">i2")]
+        for index, column in enumerate(description):
+            fields += [(f"length{index}", ">i4"), (f"value{index}", FIXED_FORMATS[column.type_code])]
+        dtype = numpy.dtype(fields)
+        if len(body) % dtype.itemsize:
+            return None
+        table = numpy.frombuffer(body, dtype=dtype)
+        if not (table["fields"] == len(description)).all():
+            return None
+        columns = {}
+        for index, column in enumerate(description):
+            if not (table[f"length{index}"] == dtype[f"value{index}"].itemsize).all():
+                return None
+            columns[column.name] = cls.get_fixed_numpy_column(column.type_code, table[f"value{index}"])
+        return columns
+
+    @classmethod
+    def get_fixed_numpy_column(cls, type_code, values):
+        if type_code == DATE_TYPE:
+            return numpy.datetime64(POSTGRES_EPOCH_DATE, "D") + values.astype("int64").astype("timedelta64[D]")
+        if type_code in TIMESTAMP_TYPES:
+            return numpy.datetime64(POSTGRES_EPOCH, "us") + values.astype("int64").astype("timedelta64[us]")
+        return values.astype(NUMPY_TYPES[type_code])
+
+    @classmethod
+    def get_numpy_column(cls, type_code, values):
+        dtype = NUMPY_TYPES.get(type_code)
+        if dtype is None or (None in values and dtype == "bool"):
+            return numpy.array(values, dtype=object)
+        if None in values and dtype.startswith(("int", "uint")):
+            # integer column with NULLs - NULL is converted to NaN
+            dtype = "float64"
+        if type_code in TIMESTAMP_TYPES:
+            values = [value.replace(tzinfo=None) if value is not None else None for value in values]
+        if dtype == "float64":
+            values = [float(value) if value is not None else numpy.nan for value in values]
+        return numpy.array(values, dtype=dtype)
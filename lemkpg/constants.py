@@ -11,3 +11,42 @@ ORDER_BY_DESC = "DESC"
 ADD = "ADD"
 DROP_COLUMN = "DROP COLUMN"
 ALTER_COLUMN = "ALTER COLUMN"
+INSERT_VALUES = "values"
+INSERT_COPY = "copy"
+INSERT_METHODS = [INSERT_VALUES, INSERT_COPY]
+COUNT = "COUNT"
+AVG = "AVG"
+SUM = "SUM"
+MIN = "MIN"
+MAX = "MAX"
+AGGREGATE_FUNCTIONS = [COUNT, AVG, SUM, MIN, MAX]
+FETCH_ALL = "fetchall"
+FETCH_MANY = "fetchmany"
+FETCH_ITERATE = "iterate"
+FETCH_STRATEGIES = [FETCH_ALL, FETCH_MANY, FETCH_ITERATE]
+ROW_TUPLE = "tuple"
+ROW_DICT = "dict"
+ROW_NAMEDTUPLE = "namedtuple"
+ROW_RECORD = "record"
+ROW_COLUMNS = "columns"
+ROW_FACTORIES = [ROW_TUPLE, ROW_DICT, ROW_NAMEDTUPLE, ROW_RECORD, ROW_COLUMNS]
+# PostgreSQL type OID -> array.array typecode for numeric columns in columnar results
+ARRAY_TYPECODES = {21: "h", 23: "i", 20: "q", 700: "f", 701: "d"}
+EXPORT_CSV = "csv"
+EXPORT_TEXT = "text"
+EXPORT_BINARY = "binary"
+EXPORT_FORMATS = [EXPORT_CSV, EXPORT_TEXT, EXPORT_BINARY]
+READ_COMMITTED = "READ COMMITTED"
+REPEATABLE_READ = "REPEATABLE READ"
+SERIALIZABLE = "SERIALIZABLE"
+ISOLATION_LEVELS = [READ_COMMITTED, REPEATABLE_READ, SERIALIZABLE]
+ROUND_ROBIN = "round_robin"
+LEAST_BUSY = "least_busy"
+REPLICA_STRATEGIES = [ROUND_ROBIN, LEAST_BUSY]
+PHASE_ACQUIRE = "acquire"
+PHASE_EXECUTE = "execute"
+PHASE_FETCH = "fetch"
+PHASE_CONVERT = "convert"
+QUERY_PHASES = [PHASE_ACQUIRE, PHASE_EXECUTE, PHASE_FETCH, PHASE_CONVERT]
+# upper bounds (seconds) of buckets of histogram of waiting for connection of pool
+POOL_WAIT_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf")]
@@ -0,0 +1,457 @@
+import asyncio
+import contextlib
+import itertools
+import re
+import threading
+import time
+import uuid
+
+import aiopg
+import psycopg2
+
+from .exceptions import LemkPgError
+from .constants import FETCH_ALL, FETCH_STRATEGIES, ISOLATION_LEVELS, ROUND_ROBIN, LEAST_BUSY, REPLICA_STRATEGIES
+from .statements import LemkPgStatementCache
+from .cache import LemkPgResultCache
+from .metrics import LemkPgMetrics, LemkPgPoolStats, logger
+from .rows import LemkPgRows
+
+
+class LemkPgEngine:
+    """
+    LemkPgEngine owns one long-lived aiopg pool for LemkPgApi / AsyncLemkPgApi instance.
+    Pool is created lazily on first use and lives until close() is called.
+    With replica DSNs engine has LemkPgEngine for each replica, read-only queries are balanced across
+    healthy replicas and all other queries go to primary.
+    """
+
+    def __init__(self, dsn: str, minsize=1, maxsize=10, idle_timeout=-1.0, statement_cache_size=0,
+                 fetch_strategy=FETCH_ALL, fetch_size=1000, row_factory=None, replica_dsns=None,
+                 replica_strategy=ROUND_ROBIN, replica_retry_interval=30.0, result_cache_size=0, result_cache_ttl=60.0,
+                 result_cache_memory=None, cache_channel=None, query_metrics=False, slow_query_time=None,
+                 pool_stats_callback=None, pool_stats_interval=60.0):
+        """
+        :param dsn: string with DSN for connection to the database
+        :param minsize: minimal count of opened connections in pool
+        :param maxsize: maximal count of opened connections in pool
+        :param idle_timeout: seconds after which idle connection will be closed and reopened.
+         Default -1 (idle connections are never recycled)
+        :param statement_cache_size: max count of prepared statements per connection. Default 0 (disabled)
+        :param fetch_strategy: string with way of fetching rows ("fetchall", "fetchmany" or "iterate")
+        :param fetch_size: count of rows fetched at once with "fetchmany" strategy
+        :param row_factory: None, callable or string with type of result rows ("tuple", "dict", "namedtuple",
+         "record" or "columns")
+        :param replica_dsns: None or list with DSN strings of replicas for read-only queries
+        :param replica_strategy: string with way of replica selection ("round_robin" or "least_busy")
+        :param replica_retry_interval: seconds during which replica isn't used after connection error
+        :param result_cache_size: max count of cached results of read queries. Default 0 (disabled)
+        :param result_cache_ttl: seconds after which cached result expires
+        :param result_cache_memory: None or max approximate size of cached results in bytes
+        :param cache_channel: None or name of channel for LISTEN / NOTIFY invalidation of result cache
+         between processes
+        :param query_metrics: True for aggregation of timings of queries by their shape
+        :param slow_query_time: None or seconds after which query is logged as slow
+        :param pool_stats_callback: None or callable which gets result of get_pool_stats() periodically
+        :param pool_stats_interval: seconds between calls of pool_stats_callback
+        """
+        if fetch_strategy not in FETCH_STRATEGIES:
+            message = f"Incorrect fetch strategy. Please use one of the valid strategies: {', '.join(FETCH_STRATEGIES)}"
+            raise LemkPgError(message)
+        if replica_strategy not in REPLICA_STRATEGIES:
+            message = (f"Incorrect replica strategy. Please use one of the valid strategies: "
+                       f"{', '.join(REPLICA_STRATEGIES)}")
+            raise LemkPgError(message)
+        if cache_channel is not None and not re.fullmatch(r"\w+", cache_channel):
+            raise LemkPgError("Cache channel name should contain only letters, digits and underscores")
+        self.dsn = dsn
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.fetch_strategy = fetch_strategy
+        self.fetch_size = fetch_size
+        self.row_factory = LemkPgRows.check_row_factory(row_factory)
+        self._pool = None
+        self._lock = None
+        self._copy_conns = None
+        self._copy_semaphore = None
+        self.copy_size = 0
+        self.statements = LemkPgStatementCache(statement_cache_size)
+        self.cache = LemkPgResultCache(result_cache_size, result_cache_ttl, result_cache_memory)
+        self.cache_channel = cache_channel
+        self.metrics = LemkPgMetrics(query_metrics, slow_query_time)
+        self.pool_stats = LemkPgPoolStats()
+        self.pool_stats_callback = pool_stats_callback
+        self.pool_stats_interval = pool_stats_interval
+        self._reporter = None
+        # notifications of this engine are marked with token, so listener skips them
+        self.token = uuid.uuid4().hex
+        self._listener = None
+        self.replica_strategy = replica_strategy
+        self.replica_retry_interval = replica_retry_interval
+        self.replicas = [LemkPgEngine(replica_dsn, minsize, maxsize, idle_timeout, statement_cache_size, fetch_strategy,
+                                      fetch_size, row_factory, replica_retry_interval=replica_retry_interval)
+                         for replica_dsn in replica_dsns or []]
+        for replica in self.replicas:
+            # cache keeps statements by connection, so one cache (and its stats) is shared with replicas
+            replica.statements = self.statements
+        self._replica_counter = itertools.count()
+        self.busy = 0
+        self.ejected_until = 0.0
+
+    in_transaction = False
+
+    @property
+    def closed(self):
+        return self._pool is None and self._copy_conns is None and all(replica.closed for replica in self.replicas)
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.ejected_until
+
+    def eject(self):
+        self.ejected_until = time.monotonic() + self.replica_retry_interval
+
+    async def invalidate(self, tables):
+        self.cache.invalidate(tables)
+        if self.cache_channel and tables:
+            # invalidate() is called in "finally" of writes, so failed notification doesn't hide error of write
+            try:
+                async with self.acquire() as conn:
+                    async with conn.cursor() as cursor:
+                        await cursor.execute("SELECT pg_notify(%s, %s || ':' || table_name) "
+                                             "FROM unnest(%s) AS table_name",
+                                             [self.cache_channel, self.token, list(tables)])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Notification of changed tables %s failed", ", ".join(tables))
+
+    async def listen(self):
+        # cached results of other processes are evicted by notifications, sent by invalidate() of their engines
+        reconnect = False
+        while True:
+            try:
+                async with aiopg.connect(self.dsn) as conn:
+                    async with conn.cursor() as cursor:
+                        await cursor.execute(f'LISTEN "{self.cache_channel}"')
+                    if reconnect:
+                        # notifications sent while listener was disconnected are lost, so all cached results are dropped
+                        self.cache.clear()
+                    reconnect = True
+                    while True:
+                        message = await conn.notifies.get()
+                        token, _, table_name = message.payload.partition(":")
+                        if token != self.token:
+                            self.cache.invalidate([table_name])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                reconnect = True
+                await asyncio.sleep(1)
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(self.pool_stats_interval)
+            try:
+                self.pool_stats_callback(self.get_pool_stats())
+            except Exception:
+                logger.exception("Pool stats callback failed")
+
+    async def on_connect(self, conn):
+        self.pool_stats.opened += 1
+
+    def get_pool_stats(self):
+        stats = self.pool_stats.summary(self._pool, self.minsize, self.maxsize)
+        # plain psycopg2 connections of COPY aren't in aiopg pool
+        stats["copy_size"] = self.copy_size
+        stats["copy_idle"] = len(self._copy_conns or ())
+        if self.replicas:
+            stats["replicas"] = [replica.get_pool_stats() for replica in self.replicas]
+        return stats
+
+    def get_replicas(self):
+        # healthy replicas in order in which they are tried for next read-only query
+        replicas = [replica for replica in self.replicas if replica.healthy]
+        if self.replica_strategy == LEAST_BUSY:
+            return sorted(replicas, key=lambda replica: replica.busy)
+        if not replicas:
+            return replicas
+        start = next(self._replica_counter) % len(replicas)
+        return replicas[start:] + replicas[:start]
+
+    async def get_pool(self):
+        if self._pool is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                # pool can be created by another coroutine while we waited for lock
+                if self._pool is None:
+                    self._pool = await aiopg.create_pool(self.dsn, minsize=self.minsize, maxsize=self.maxsize,
+                                                         pool_recycle=self.idle_timeout, on_connect=self.on_connect)
+                    if self.cache_channel and self.cache.enabled:
+                        self._listener = asyncio.ensure_future(self.listen())
+                    if self.pool_stats_callback is not None:
+                        self._reporter = asyncio.ensure_future(self.report())
+        return self._pool
+
+    async def get_connection(self, readonly=False):
+        # busy is counted before connection is acquired, so concurrent queries see each other for "least_busy"
+        for engine in (self.get_replicas() if readonly else []) + [self]:
+            engine.busy += 1
+            engine.pool_stats.waiting += 1
+            start = time.perf_counter()
+            try:
+                pool = await engine.get_pool()
+                conn = await pool.acquire()
+                engine.pool_stats.add_wait(time.perf_counter() - start)
+                return engine, pool, conn
+            except (psycopg2.OperationalError, OSError):
+                engine.busy -= 1
+                if engine is self:
+                    raise
+                # replica is down - it isn't used for replica_retry_interval, query goes to next one or primary
+                engine.eject()
+            except BaseException:
+                engine.busy -= 1
+                raise
+            finally:
+                engine.pool_stats.waiting -= 1
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, readonly=False):
+        engine, pool, conn = await self.get_connection(readonly)
+        try:
+            yield conn
+        except BaseException:
+            if engine is not self and conn.closed:
+                engine.eject()
+            raise
+        finally:
+            await engine.release_connection(pool, conn)
+
+    async def release_connection(self, pool, conn):
+        self.busy -= 1
+        if conn.closed:
+            self.pool_stats.broken += 1
+        await pool.release(conn)
+
+    async def run_in_thread(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    @contextlib.asynccontextmanager
+    async def copy_connection(self):
+        # psycopg2 doesn't support COPY for async connections of aiopg, so COPY works with plain psycopg2
+        # connections and blocking calls run in executor thread. Up to maxsize connections are opened,
+        # they are kept between calls, so each COPY doesn't pay for connect and auth
+        if self._copy_conns is None:
+            self._copy_conns = []
+            self._copy_semaphore = asyncio.Semaphore(self.maxsize)
+        idle = self._copy_conns
+        async with self._copy_semaphore:
+            if idle:
+                conn = idle.pop()
+            else:
+                conn = await self.run_in_thread(psycopg2.connect, self.dsn)
+                self.copy_size += 1
+            try:
+                yield conn
+                await self.run_in_thread(conn.commit)
+            except BaseException:
+                if not conn.closed:
+                    await self.run_in_thread(conn.rollback)
+                raise
+            finally:
+                # broken connection and connection returned after close() aren't kept
+                if conn.closed or idle is not self._copy_conns:
+                    conn.close()
+                    self.copy_size -= 1
+                else:
+                    idle.append(conn)
+
+    async def close(self):
+        tasks = [self._listener, self._reporter]
+        self._listener = self._reporter = None
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.close()
+            await pool.wait_closed()
+        # lock is bound to event loop, and pool can be opened again in another one (e.g. by next asyncio.run)
+        self._lock = None
+        if self._copy_conns is not None:
+            copy_conns, self._copy_conns = self._copy_conns, None
+            self._copy_semaphore = None
+            for conn in copy_conns:
+                conn.close()
+            self.copy_size -= len(copy_conns)
+        for replica in self.replicas:
+            await replica.close()
+
+
+class LemkPgTransactionEngine:
+    """
+    LemkPgTransactionEngine pins one connection of LemkPgEngine pool for the whole transaction.
+    All queries of transaction get this connection from acquire() one by one, other attributes are taken
+    from parent engine. Transaction inside transaction is done with SAVEPOINT on the same connection.
+    """
+
+    in_transaction = True
+    closed = True
+
+    def __init__(self, engine, isolation=None, readonly=False):
+        """
+        :param engine: LemkPgEngine or LemkPgTransactionEngine (for nested transaction)
+        :param isolation: None or string with isolation level ("READ COMMITTED", "REPEATABLE READ" or "SERIALIZABLE")
+        :param readonly: True for READ ONLY transaction
+        """
+        if isolation is not None and isolation.upper() not in ISOLATION_LEVELS:
+            message = f"Incorrect isolation level. Please use one of the valid levels: {', '.join(ISOLATION_LEVELS)}"
+            raise LemkPgError(message)
+        if engine.in_transaction and (isolation or readonly):
+            raise LemkPgError("Isolation level and readonly can't be set for nested transaction")
+        self.parent = engine
+        self.isolation = isolation
+        self.readonly = readonly
+        self.depth = engine.depth + 1 if engine.in_transaction else 0
+        self.conn = None
+        self.tables = set()
+        self._lock = asyncio.Lock()
+        self._pool = None
+
+    def __getattr__(self, name):
+        return getattr(self.parent, name)
+
+    async def invalidate(self, tables):
+        # other connections see changes only after commit, so cached results are invalidated at the end of transaction
+        self.tables.update(tables)
+
+    def get_begin_query(self):
+        if self.depth:
+            return f"SAVEPOINT lemkpg_savepoint_{self.depth}"
+        isolation = f" ISOLATION LEVEL {self.isolation.upper()}" if self.isolation else ""
+        return f"BEGIN{isolation}{' READ ONLY' if self.readonly else ''}"
+
+    async def _execute(self, query):
+        async with self.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(query)
+
+    async def begin(self):
+        if self.depth:
+            self.conn = self.parent.conn
+            await self._execute(self.get_begin_query())
+            return self
+        # connection is taken like for any query, so waiting of transactions for pool is seen in pool_stats()
+        _, self._pool, self.conn = await self.parent.get_connection()
+        try:
+            await self._execute(self.get_begin_query())
+        except BaseException:
+            await self.release()
+            raise
+        return self
+
+    async def end(self, commit=True):
+        try:
+            if self.depth:
+                savepoint = f"lemkpg_savepoint_{self.depth}"
+                await self._execute(f"RELEASE SAVEPOINT {savepoint}" if commit else
+                                    f"ROLLBACK TO SAVEPOINT {savepoint}")
+            else:
+                await self._execute("COMMIT" if commit else "ROLLBACK")
+        finally:
+            await self.release()
+            await self.parent.invalidate(self.tables)
+
+    async def release(self):
+        conn, self.conn = self.conn, None
+        if conn is not None and not self.depth:
+            await self.parent.release_connection(self._pool, conn)
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, readonly=False):
+        if self.conn is None:
+            raise LemkPgError("Transaction is already finished")
+        if self.depth:
+            async with self.parent.acquire() as conn:
+                yield conn
+            return
+        # one connection can't run several queries at once, so concurrent queries of transaction wait for each other
+        async with self._lock:
+            yield self.conn
+
+    @contextlib.asynccontextmanager
+    async def copy_connection(self):
+        message = ("COPY can't be used inside transaction. Please use insert_many with \"values\" method "
+                   "and upsert_many instead of update_many")
+        raise LemkPgError(message)
+        yield
+
+    async def close(self):
+        pass
+
+
+class LemkPgLoopThread:
+    """
+    LemkPgLoopThread runs one event loop forever in background daemon thread.
+    Sync LemkPgApi submits all coroutines to this loop, so loop and pool are reused across calls
+    and sync methods can be called from any thread (even from thread with running event loop).
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="lemkpg-loop", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro):
+        loop = self._get_loop()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            message = "Sync LemkPgApi method can't be called from coroutine which runs in LemkPgApi event loop"
+            raise LemkPgError(message)
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def iterate(self, agen):
+        """
+        Turn async generator into plain generator, each item is fetched in background loop.
+        """
+
+        async def get_next():
+            return await agen.__anext__()
+
+        async def close():
+            await agen.aclose()
+
+        loop = self._get_loop()
+        try:
+            while True:
+                try:
+                    item = self.run(get_next())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            # generator abandoned after stop() isn't closed, new loop can't close it and thread can't be started
+            # at exit of interpreter
+            if self._loop is loop:
+                self.run(close())
+
+    def stop(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
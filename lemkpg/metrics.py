@@ -0,0 +1,268 @@
+import bisect
+import collections
+import functools
+import inspect
+import logging
+import re
+import sys
+import time
+
+from .constants import QUERY_PHASES, POOL_WAIT_BUCKETS
+
+logger = logging.getLogger("lemkpg")
+
+# string and number literals of raw queries, they are replaced in shape of query
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class LemkPgQueryRecord:
+    """
+    LemkPgQueryRecord measures one query: time of its phases (pool acquire, execute, fetch, row conversion),
+    count of rows and bytes. It is used as context manager around query.
+    """
+
+    __slots__ = ("metrics", "method", "query", "param_count", "start", "last", "idle", "phases", "rows", "bytes")
+
+    def __init__(self, metrics, method, query, param_count):
+        self.metrics = metrics
+        self.method = method
+        self.query = query
+        self.param_count = param_count
+        self.start = self.last = time.perf_counter()
+        self.idle = 0.0
+        self.phases = dict.fromkeys(QUERY_PHASES, 0.0)
+        self.rows = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # iterator closed by its consumer isn't failed query
+        self.metrics.finish(self, None if isinstance(exc_val, GeneratorExit) else exc_val)
+
+    def phase(self, name):
+        # time from previous mark is added to phase, so phase of iterator is summed over its batches
+        now = time.perf_counter()
+        self.phases[name] += now - self.last
+        self.last = now
+
+    def skip(self):
+        # time of consumer of iterator between batches isn't time of query
+        now = time.perf_counter()
+        self.idle += now - self.last
+        self.last = now
+
+
+class LemkPgNullRecord:
+    """
+    LemkPgNullRecord is returned instead of LemkPgQueryRecord when metrics are disabled, so hot path
+    doesn't measure anything.
+    """
+
+    rows = 0
+    bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def phase(self, name):
+        pass
+
+    def skip(self):
+        pass
+
+
+NULL_RECORD = LemkPgNullRecord()
+
+
+class LemkPgShapeStats:
+    """
+    LemkPgShapeStats aggregates records of one query shape. Percentiles are computed from
+    the last "samples" durations.
+    """
+
+    def __init__(self, samples):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.phases = dict.fromkeys(QUERY_PHASES, 0.0)
+        self.methods = collections.Counter()
+        self.durations = collections.deque(maxlen=samples)
+
+    def add(self, record, elapsed, error):
+        self.count += 1
+        self.errors += error is not None
+        self.total += elapsed
+        self.rows += record.rows
+        self.bytes += record.bytes
+        for name, value in record.phases.items():
+            self.phases[name] += value
+        self.methods[record.method] += 1
+        self.durations.append(elapsed)
+
+    @classmethod
+    def get_percentile(cls, values, percent):
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+    def summary(self):
+        durations = sorted(self.durations)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total": self.total,
+            "mean": self.total / self.count,
+            "p50": self.get_percentile(durations, 50),
+            "p95": self.get_percentile(durations, 95),
+            "p99": self.get_percentile(durations, 99),
+            "max": durations[-1],
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "phases": {name: value / self.count for name, value in self.phases.items()},
+            "methods": dict(self.methods),
+        }
+
+
+class LemkPgMetrics:
+    """
+    LemkPgMetrics calls query hooks, logs slow queries and aggregates timings of queries by shape
+    (SQL text with placeholders instead of values). Nothing is measured until it is enabled.
+    """
+
+    # code of API methods (and of their nested functions) -> name of method, filled by add_methods()
+    methods = {}
+
+    def __init__(self, collect=False, slow_query_time=None, samples=1000):
+        """
+        :param collect: True for aggregation of timings by shape of query. Default False
+        :param slow_query_time: None or seconds after which query is logged as slow
+        :param samples: count of last durations of each shape, which are used for percentiles. Default 1000
+        """
+        self.collect = collect
+        self.slow_query_time = slow_query_time
+        self.samples = samples
+        self.before_hooks = []
+        self.after_hooks = []
+        self.shapes = {}
+
+    @property
+    def enabled(self):
+        return self.collect or self.slow_query_time is not None or bool(self.before_hooks or self.after_hooks)
+
+    @classmethod
+    def add_methods(cls, api_class):
+        for name, value in vars(api_class).items():
+            if name.startswith("_") or not inspect.isfunction(value):
+                continue
+            # code of decorated method (e.g. batch()) is taken, not code of decorator
+            codes = [inspect.unwrap(value).__code__]
+            while codes:
+                code = codes.pop()
+                cls.methods[code] = name
+                codes.extend(const for const in code.co_consts if inspect.iscode(const))
+
+    @classmethod
+    def get_method(cls, default=None):
+        # frames of awaiting coroutines are on stack while query runs, so the nearest API method is caller of query
+        frame = sys._getframe(2)
+        while frame is not None:
+            name = cls.methods.get(frame.f_code)
+            if name is not None:
+                return name
+            frame = frame.f_back
+        return default
+
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def get_shape(cls, query):
+        return LITERALS.sub("?", " ".join(query.split()))
+
+    def measure(self, query, params=None, default_method=None):
+        if not self.enabled:
+            return NULL_RECORD
+        record = LemkPgQueryRecord(self, self.get_method(default_method), query, len(params) if params else 0)
+        for hook in self.before_hooks:
+            self.call_hook(hook, record.method, query, record.param_count)
+        return record
+
+    def finish(self, record, error=None):
+        elapsed = time.perf_counter() - record.start - record.idle
+        if self.collect:
+            shape = self.get_shape(record.query)
+            stats = self.shapes.get(shape)
+            if stats is None:
+                stats = self.shapes[shape] = LemkPgShapeStats(self.samples)
+            stats.add(record, elapsed, error)
+        if self.slow_query_time is not None and elapsed >= self.slow_query_time:
+            logger.warning("Slow query (%.3f s) in %s: %s", elapsed, record.method, record.query)
+        if self.after_hooks:
+            timings = dict(record.phases, time=elapsed, rows=record.rows, bytes=record.bytes, error=error)
+            for hook in self.after_hooks:
+                self.call_hook(hook, record.method, record.query, record.param_count, timings)
+
+    @classmethod
+    def call_hook(cls, hook, *args):
+        # error of hook doesn't break query
+        try:
+            hook(*args)
+        except Exception:
+            logger.exception("Query hook %r failed", hook)
+
+    def stats(self):
+        # the slowest shapes (by total time) are first
+        summaries = {shape: stats.summary() for shape, stats in self.shapes.items()}
+        return dict(sorted(summaries.items(), key=lambda item: item[1]["total"], reverse=True))
+
+    def reset(self):
+        self.shapes = {}
+
+
+class LemkPgPoolStats:
+    """
+    LemkPgPoolStats counts waiting for connections of pool and opened and broken connections of one engine.
+    Count of used and idle connections is taken from pool itself.
+    """
+
+    def __init__(self):
+        self.waiting = 0
+        self.acquires = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.wait_buckets = [0] * len(POOL_WAIT_BUCKETS)
+        self.opened = 0
+        self.broken = 0
+
+    def add_wait(self, seconds):
+        self.acquires += 1
+        self.wait_time += seconds
+        self.max_wait = max(self.max_wait, seconds)
+        self.wait_buckets[bisect.bisect_left(POOL_WAIT_BUCKETS, seconds)] += 1
+
+    def summary(self, pool, minsize, maxsize):
+        size = pool.size if pool is not None else 0
+        idle = pool.freesize if pool is not None else 0
+        # connections which were opened, but aren't in pool now, were closed by pool:
+        # broken ones on release, others by idle_timeout or after failed transaction
+        closed = self.opened - size
+        return {
+            "size": size,
+            "minsize": minsize,
+            "maxsize": maxsize,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiting": self.waiting,
+            "acquires": self.acquires,
+            "wait_time": self.wait_time,
+            "mean_wait": self.wait_time / self.acquires if self.acquires else 0.0,
+            "max_wait": self.max_wait,
+            "wait_histogram": dict(zip(POOL_WAIT_BUCKETS, self.wait_buckets)),
+            "opened": self.opened,
+            "closed": closed,
+            "broken": self.broken,
+            "recycled": max(closed - self.broken, 0),
+        }
@@ -0,0 +1,128 @@
+import functools
+
+from .utils import LemkPgUtils
+from .exceptions import LemkPgError
+from .constants import GET_ALL_COLUMNS
+
+SELECT = "select"
+UPDATE = "update"
+DELETE = "delete"
+
+
+class LemkPgCompiledQuery:
+    """
+    LemkPgCompiledQuery holds SQL text and count of parameter slots of query, built once by LemkPgQuery.
+    Calling it only binds values to slots and runs query, without building of SQL text.
+    """
+
+    def __init__(self, sql, param_count, tables, readonly, executor):
+        self.sql = sql
+        self.param_count = param_count
+        self.tables = tables
+        self.readonly = readonly
+        self._executor = executor
+
+    def __repr__(self):
+        return f"LemkPgCompiledQuery({self.sql!r})"
+
+    def __call__(self, *values, row_factory=None):
+        """
+        :param values: values for parameter slots in order of update() fields and where() conditions
+        :param row_factory: None, callable or string with type of rows of SELECT query
+        :return: result of query (coroutine for AsyncLemkPgApi)
+        """
+        if len(values) != self.param_count:
+            message = f"Query needs {self.param_count} values, but {len(values)} were given"
+            raise LemkPgError(message)
+        return self._executor(self, list(values), row_factory)
+
+    async def run(self, engine, params, row_factory=None):
+        if self.readonly:
+            return await LemkPgUtils.get_query_result(engine, self.sql, params, prepare=True, row_factory=row_factory,
+                                                      readonly=True, tables=self.tables)
+        return await LemkPgUtils.execute_query(engine, self.sql, params, tables=self.tables)
+
+
+class LemkPgQuery:
+    """
+    LemkPgQuery builds query step by step. Each method returns new LemkPgQuery, so partly built query
+    can be reused. Values of conditions are not given to builder - they are slots, which are bound
+    when compiled query is called. SQL text is the same as of get / get_with_join / update / delete_records,
+    so compiled query shares prepared statements with these methods.
+    """
+
+    def __init__(self, table_name, executor):
+        self.table_name = table_name
+        self.kind = SELECT
+        self.fields = tuple(GET_ALL_COLUMNS)
+        self.is_distinct = False
+        self.join_spec = None
+        self.conditions = ()
+        self.order = (None, None)
+        self._executor = executor
+
+    def _copy(self, **attrs):
+        query = object.__new__(LemkPgQuery)
+        query.__dict__.update(self.__dict__, **attrs)
+        return query
+
+    def select(self, *fields):
+        return self._copy(kind=SELECT, fields=fields or tuple(GET_ALL_COLUMNS))
+
+    def distinct(self):
+        return self._copy(is_distinct=True)
+
+    def join(self, join_table_name: str, join_type: str, on_condition: tuple):
+        return self._copy(join_spec=(join_table_name, join_type, tuple(on_condition)))
+
+    def where(self, column: str, operand: str, connector=None):
+        if self.conditions and connector is None:
+            connector = "AND"
+        return self._copy(conditions=self.conditions + ((column, operand, connector if self.conditions else None),))
+
+    def or_where(self, column: str, operand: str):
+        return self.where(column, operand, "OR")
+
+    def order_by(self, column: str, sort_type="ASC"):
+        return self._copy(order=(column, sort_type))
+
+    def update(self, *fields):
+        return self._copy(kind=UPDATE, fields=fields)
+
+    def delete(self):
+        return self._copy(kind=DELETE)
+
+    def get_key(self):
+        return self.kind, self.table_name, self.fields, self.is_distinct, self.join_spec, self.conditions, self.order
+
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def get_sql(cls, kind, table_name, fields, is_distinct, join_spec, conditions, order):
+        # SQL text is built by the same LemkPgUtils methods as for other API methods, values are only placeholders
+        conditions_list = [(column, operand, None, connector) for column, operand, connector in conditions]
+        if kind == UPDATE:
+            if not fields:
+                raise LemkPgError("Please define fields for update")
+            query, _ = LemkPgUtils.get_update_query(table_name, dict.fromkeys(fields), conditions_list)
+            return query, len(fields) + len(conditions)
+        if kind == DELETE:
+            query, _ = LemkPgUtils.get_delete_query(table_name, conditions_list)
+            return query, len(conditions)
+        if join_spec is not None:
+            join_table_name, join_type, on_condition = join_spec
+            query, _ = LemkPgUtils.get_join_query(table_name, join_table_name, join_type, list(fields), on_condition,
+                                                  conditions_list, is_distinct, *order)
+        else:
+            query, _ = LemkPgUtils.get_select_query(table_name, list(fields), conditions_list, is_distinct, *order)
+        return query, len(conditions)
+
+    def compile(self):
+        """
+        >>> get_by_date = db_conn.query("demo").select("date", "symbol").where("date", "=").compile()
+        >>> get_by_date("2006-01-05")
+
+        :return: LemkPgCompiledQuery
+        """
+        sql, param_count = self.get_sql(*self.get_key())
+        tables = [self.table_name] + ([self.join_spec[0]] if self.join_spec and self.kind == SELECT else [])
+        return LemkPgCompiledQuery(sql, param_count, tables, self.kind == SELECT, self._executor)
@@ -0,0 +1,115 @@
+import array
+import collections
+import datetime
+import decimal
+import functools
+import keyword
+import uuid
+
+from .exceptions import LemkPgError
+from .constants import (ROW_TUPLE, ROW_DICT, ROW_NAMEDTUPLE, ROW_RECORD, ROW_COLUMNS, ROW_FACTORIES,
+                        ARRAY_TYPECODES)
+
+# values of these types can't be changed in place, so rows with them can be shared by several callers
+IMMUTABLE_TYPES = (type(None), bool, int, float, decimal.Decimal, str, bytes, memoryview, datetime.date,
+                   datetime.time, datetime.timedelta, uuid.UUID)
+
+
+class LemkPgRows:
+    """
+    LemkPgRows converts rows fetched by cursor (tuples) to type selected with row_factory.
+    Types of namedtuple and record rows are created once for each set of column names.
+    """
+
+    @classmethod
+    def check_row_factory(cls, row_factory):
+        if row_factory is not None and not callable(row_factory) and row_factory not in ROW_FACTORIES:
+            message = f"Incorrect row factory. Please use callable or one of the valid factories: " \
+                      f"{', '.join(ROW_FACTORIES)}"
+            raise LemkPgError(message)
+        return row_factory
+
+    @classmethod
+    def has_mutable_values(cls, rows):
+        return any(not isinstance(value, IMMUTABLE_TYPES) for row in rows for value in row)
+
+    @classmethod
+    def get_rows(cls, row_factory, description, rows):
+        if row_factory is None or row_factory == ROW_TUPLE or description is None:
+            return rows
+        if callable(row_factory):
+            return row_factory(description, rows)
+        names = tuple(column.name for column in description)
+        if row_factory == ROW_DICT:
+            return [dict(zip(names, row)) for row in rows]
+        if row_factory == ROW_NAMEDTUPLE:
+            row_type = cls.get_namedtuple_type(names)
+            return [row_type._make(row) for row in rows]
+        if row_factory == ROW_RECORD:
+            row_type = cls.get_record_type(names)
+            return [row_type(*row) for row in rows]
+        if row_factory == ROW_COLUMNS:
+            return cls.get_columns(description, names, rows)
+        cls.check_row_factory(row_factory)
+
+    @classmethod
+    def get_columns(cls, description, names, rows):
+        columns = {}
+        values_list = zip(*rows) if rows else [[] for _ in names]
+        for column, name, values in zip(description, names, values_list):
+            columns[name] = cls.get_column(column.type_code, values)
+        return columns
+
+    @classmethod
+    def get_column(cls, type_code, values):
+        typecode = ARRAY_TYPECODES.get(type_code)
+        if typecode is not None and None not in values:
+            return array.array(typecode, values)
+        return list(values)
+
+    @classmethod
+    def get_field_names(cls, names):
+        # column names like "?column?" or "class" can't be attributes, so such names are replaced with _<index>
+        fields = []
+        for index, name in enumerate(names):
+            if not name.isidentifier() or keyword.iskeyword(name) or name.startswith("_") or name in fields:
+                name = f"_{index}"
+            fields.append(name)
+        return fields
+
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def get_namedtuple_type(cls, names):
+        return collections.namedtuple("Row", names, rename=True)
+
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def get_record_type(cls, names):
+        fields = cls.get_field_names(names)
+        # __init__ is generated like in namedtuple, so record is created without loop over fields
+        namespace = {}
+        exec(f"def __init__(self, {', '.join(fields)}):\n" +
+             "".join(f"    self.{field} = {field}\n" for field in fields) + "    pass\n", namespace)
+        return type("Record", (LemkPgRecord,), {"__slots__": tuple(fields), "__init__": namespace["__init__"]})
+
+
+class LemkPgRecord:
+    """
+    Base class of compact records with __slots__ which are created for each set of column names.
+    """
+    __slots__ = ()
+
+    def __iter__(self):
+        return (getattr(self, field) for field in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return f"Record({', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)})"
+
+    def _asdict(self):
+        return dict(zip(self.__slots__, self))
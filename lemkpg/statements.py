@@ -0,0 +1,105 @@
+import collections
+import itertools
+import re
+import weakref
+
+import psycopg2
+import psycopg2.extensions
+
+
+class LemkPgStatementCache:
+    """
+    LemkPgStatementCache keeps server-side prepared statements (PREPARE / EXECUTE) of each pooled connection
+    in LRU order. Statements are keyed by SQL text from query builders, so queries with the same shape
+    and different values are parsed and planned once per connection.
+    """
+
+    def __init__(self, size=0):
+        """
+        :param size: max count of prepared statements per connection. Default 0 (cache is disabled)
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._statements = weakref.WeakKeyDictionary()
+        self._unpreparable = set()
+        self._names = itertools.count(1)
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    @classmethod
+    def get_positional_query(cls, query):
+        # PREPARE needs $1, $2, ... placeholders instead of psycopg2 %s ones
+        counter = itertools.count(1)
+        return re.sub(r"%([%s])", lambda m: "%" if m.group(1) == "%" else f"${next(counter)}", query)
+
+    @classmethod
+    def get_execute_query(cls, name, params):
+        return f"EXECUTE {name}{'(' + ', '.join(['%s'] * len(params)) + ')' if params else ''}"
+
+    def is_preparable(self, query, params):
+        # psycopg2 expands tuple to list of values (e.g. for IN operator), which can't be bound to one parameter
+        return self.enabled and query not in self._unpreparable and not any(
+            isinstance(param, (tuple, list)) for param in params or ())
+
+    async def execute(self, conn, cursor, query, params=None):
+        if not self.is_preparable(query, params):
+            await cursor.execute(query, params or None)
+            return
+        statements = self._statements.setdefault(conn, collections.OrderedDict())
+        # error of PREPARE would abort transaction of db_conn.transaction(), so PREPARE is done within savepoint
+        in_transaction = conn.raw.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        name = statements.get(query)
+        if name is None:
+            self.misses += 1
+            name = await self._prepare(cursor, statements, query, in_transaction)
+            if name is None:
+                await cursor.execute(query, params or None)
+                return
+        else:
+            self.hits += 1
+            statements.move_to_end(query)
+        try:
+            await cursor.execute(self.get_execute_query(name, params), params or None)
+        except psycopg2.NotSupportedError:
+            # "cached plan must not change result type" after table was altered - prepare statement again
+            del statements[query]
+            if in_transaction:
+                # transaction is already aborted, statement is deallocated when connection is closed
+                raise
+            await cursor.execute(f"DEALLOCATE {name}")
+            name = await self._prepare(cursor, statements, query)
+            if name is None:
+                await cursor.execute(query, params or None)
+                return
+            await cursor.execute(self.get_execute_query(name, params), params or None)
+
+    async def _prepare(self, cursor, statements, query, in_transaction=False):
+        if len(statements) >= self.size:
+            _, old_name = statements.popitem(last=False)
+            await cursor.execute(f"DEALLOCATE {old_name}")
+        name = f"lemkpg_{next(self._names)}"
+        if in_transaction:
+            await cursor.execute("SAVEPOINT lemkpg_prepare")
+        try:
+            await cursor.execute(f"PREPARE {name} AS {self.get_positional_query(query)}")
+        except psycopg2.ProgrammingError:
+            # e.g. type of parameter can't be determined - such query is always executed without PREPARE
+            if in_transaction:
+                await cursor.execute("ROLLBACK TO SAVEPOINT lemkpg_prepare")
+            self._unpreparable.add(query)
+            return None
+        if in_transaction:
+            await cursor.execute("RELEASE SAVEPOINT lemkpg_prepare")
+        statements[query] = name
+        return name
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "statements": sum(len(statements) for statements in self._statements.values()),
+        }
@@ -1,6 +1,64 @@
-import aiopg
+import asyncio
+import copy
+import datetime
+import inspect
+import io
+import itertools
+import json
+import numbers
+import re
+import uuid
+
 import psycopg2
+from psycopg2.extras import Json
 from .exceptions import LemkPgError
+from .constants import (JOINS_LIST, FETCH_ALL, FETCH_MANY, ROW_TUPLE, ROW_COLUMNS, EXPORT_CSV, EXPORT_FORMATS,
+                        AGGREGATE_FUNCTIONS, ORDER_BY_ASC, ORDER_BY_DESC, MIN, MAX, PHASE_ACQUIRE,
+                        PHASE_EXECUTE, PHASE_FETCH, PHASE_CONVERT)
+from .rows import LemkPgRows
+from .metrics import logger
+
+# values of these types are sent via COPY as their str()
+COPY_TEXT_TYPES = (str, numbers.Number, datetime.date, datetime.time, uuid.UUID)
+
+
+class LemkPgCopyReader:
+    """
+    File-like object for psycopg2 copy_expert. Rows are taken from iterable lazily
+    and encoded to COPY text format only when COPY asks for the next data block,
+    so memory stays bounded even for huge generators.
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ""
+        self.rows = 0
+        self.size = 0
+        self.error = None
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        try:
+            for row in self._rows:
+                line = LemkPgUtils.get_copy_line(row)
+                chunks.append(line)
+                length += len(line)
+                self.rows += 1
+                if -1 < size <= length:
+                    break
+        except Exception as e:
+            # psycopg2 reports error of read() as cancelled COPY, so the original error is kept for copy_rows()
+            self.error = e
+            raise
+        data = "".join(chunks)
+        if size < 0:
+            self._buffer = ""
+        else:
+            self._buffer = data[size:]
+            data = data[:size]
+        self.size += len(data)
+        return data
 
 
 class LemkPgUtils:
@@ -17,30 +75,688 @@ class LemkPgUtils:
                 raise LemkPgError(message)
 
         conditions = [
-            f"{condition[3] + ' ' if condition[3] is not None else ''}{condition[0]} {condition[1]} '{condition[2]}'"
+            f"{condition[3] + ' ' if condition[3] is not None else ''}{condition[0]} {condition[1]} %s"
             for condition in conditions_list]
+        params = [condition[2] for condition in conditions_list]
+
+        return conditions, params
+
+    @classmethod
+    def get_where(cls, conditions_list):
+        if not conditions_list:
+            return "", []
+        conditions, params = cls.get_conditions(conditions_list)
+        return f""" WHERE {" ".join(conditions)}""", params
+
+    @classmethod
+    def get_sort(cls, order_by=None, sort_type=None):
+        return f"{' ORDER BY ' + order_by + ' ' + sort_type if order_by and sort_type else ''}"
+
+    @classmethod
+    def get_insert_query(cls, table_name, values, columns=None):
+        query = (f"""INSERT INTO {table_name} {'(' + ', '.join(columns) + ')' if columns else ''}"""
+                 f""" VALUES ({", ".join(["%s"] * len(values))})""")
+        return query, list(values)
+
+    @classmethod
+    def get_upsert_query(cls, table_name, columns, conflict_columns, update_columns=None, row_count=1,
+                         return_keys=False):
+        if not conflict_columns:
+            raise LemkPgError("Please define conflict_columns (columns of unique index or primary key)")
+        if update_columns is None:
+            update_columns = [column for column in columns if column not in conflict_columns]
+        # with nothing to update conflicting rows are left as is
+        action = (f"""UPDATE SET {", ".join(f"{column} = EXCLUDED.{column}" for column in update_columns)}"""
+                  if update_columns else "NOTHING")
+        query = (f"""INSERT INTO {table_name} ({", ".join(columns)}) VALUES {", ".join(["%s"] * row_count)}"""
+                 f""" ON CONFLICT ({", ".join(conflict_columns)}) DO {action}"""
+                 f"""{" RETURNING " + ", ".join(conflict_columns) if return_keys else ""}""")
+        return query
+
+    @classmethod
+    def get_select_query(cls, table_name, fields, conditions_list=None, distinct=False, order_by=None,
+                         sort_type=None):
+        dist = f"{'DISTINCT ' if distinct else ''}"
+        where, params = cls.get_where(conditions_list)
+        query = f"""SELECT {dist}{", ".join(fields)} FROM {table_name}{where}{cls.get_sort(order_by, sort_type)}"""
+        return query, params
+
+    @classmethod
+    def get_update_query(cls, table_name, fields, conditions_list=None):
+        columns_for_update = [f"{field} = %s" for field in fields]
+        where, params = cls.get_where(conditions_list)
+        query = f"""UPDATE {table_name} SET {", ".join(columns_for_update)}{where}"""
+        return query, list(fields.values()) + params
+
+    @classmethod
+    def get_update_from_query(cls, table_name, source_table_name, key_columns, set_columns):
+        columns_for_update = [f"{column} = {source_table_name}.{column}" for column in set_columns]
+        keys = [f"{table_name}.{column} = {source_table_name}.{column}" for column in key_columns]
+        return (f"""UPDATE {table_name} SET {", ".join(columns_for_update)} FROM {source_table_name}"""
+                f""" WHERE {" AND ".join(keys)}""")
+
+    @classmethod
+    def get_delete_query(cls, table_name, conditions_list=None):
+        where, params = cls.get_where(conditions_list)
+        return f"""DELETE FROM {table_name}{where}""", params
+
+    @classmethod
+    def get_join_query(cls, table_name, join_table_name, join_type, fields, on_condition, where_conditions_list=None,
+                       distinct=False, order_by=None, sort_type=None):
+        if join_type not in JOINS_LIST:
+            message = f"Incorrect JOIN type. Please use one of the valid JOIN types: {', '.join(JOINS_LIST)}"
+            raise LemkPgError(message)
+
+        dist = f"{'DISTINCT ' if distinct else ''}"
+        where, params = cls.get_where(where_conditions_list)
+        query = (f"""SELECT {dist}{", ".join(fields)} FROM {table_name} {join_type} {join_table_name}"""
+                 f""" ON {on_condition[0]} {on_condition[1]} {on_condition[2]}{where}"""
+                 f"""{cls.get_sort(order_by, sort_type)}""")
+        return query, params
+
+    @classmethod
+    def get_join_fields(cls, fields=None, all=True):
+        return ["*"] if not fields and all else fields
+
+    @classmethod
+    def get_aggregate_query(cls, table_name, function, column, conditions_list=None):
+        where, params = cls.get_where(conditions_list)
+        return f"""SELECT {function}({column}) FROM {table_name}{where}""", params
+
+    @classmethod
+    def get_aggregate_columns(cls, aggregates):
+        if not isinstance(aggregates, dict) or not aggregates:
+            message = "Variable aggregates should be not empty dict"
+            raise LemkPgError(message)
+        aggregate_columns = []
+        for function, columns in aggregates.items():
+            if function.upper() not in AGGREGATE_FUNCTIONS:
+                message = (f"Incorrect aggregate function. Please use one of the valid functions: "
+                           f"{', '.join(AGGREGATE_FUNCTIONS)}")
+                raise LemkPgError(message)
+            for column in ([columns] if isinstance(columns, str) else columns):
+                aggregate_columns.append(f"{function.upper()}({column})")
+        return aggregate_columns
+
+    @classmethod
+    def get_aggregates_query(cls, table_name, aggregates, conditions_list=None, group_by=None, having=None):
+        fields = list(group_by or []) + cls.get_aggregate_columns(aggregates)
+        where, params = cls.get_where(conditions_list)
+        query = f"""SELECT {", ".join(fields)} FROM {table_name}{where}"""
+        if group_by:
+            query += f""" GROUP BY {", ".join(group_by)}"""
+        if having:
+            conditions, having_params = cls.get_conditions(having)
+            query += f""" HAVING {" ".join(conditions)}"""
+            params += having_params
+        return query, params
+
+    @classmethod
+    def get_aggregates_result(cls, aggregates, row):
+        # result has the same shape as aggregates: one value for column name, list of values for list of columns
+        result = {}
+        values = iter(row)
+        for function, columns in aggregates.items():
+            if isinstance(columns, str):
+                result[function] = next(values)
+            else:
+                result[function] = [next(values) for _ in columns]
+        return result
+
+    @classmethod
+    def get_transaction_queries(cls, engine):
+        # inside transaction of db_conn.transaction() BEGIN / COMMIT would finish it, so savepoint is used
+        if engine.in_transaction:
+            return "SAVEPOINT lemkpg_block", "RELEASE SAVEPOINT lemkpg_block", "ROLLBACK TO SAVEPOINT lemkpg_block"
+        return "BEGIN", "COMMIT", "ROLLBACK"
+
+    @classmethod
+    def get_page_query(cls, table_name, fields, order_by, page_size, after=None, conditions_list=None,
+                       sort_type=ORDER_BY_ASC):
+        if not order_by:
+            raise LemkPgError("Please define columns of unique key for order_by")
+        # page of zero rows would never move cursor, negative size breaks LIMIT
+        if not isinstance(page_size, int) or page_size <= 0:
+            message = f"Page size should be positive integer, but {page_size!r} was given"
+            raise LemkPgError(message)
+        if sort_type.upper() not in (ORDER_BY_ASC, ORDER_BY_DESC):
+            message = f"Incorrect sort type. Please use {ORDER_BY_ASC} or {ORDER_BY_DESC}"
+            raise LemkPgError(message)
+        conditions, params = cls.get_conditions(conditions_list) if conditions_list else ([], [])
+        where = [f"""({" ".join(conditions)})"""] if conditions else []
+        if after is not None:
+            after = list(after) if isinstance(after, (tuple, list)) else [after]
+            if len(after) != len(order_by):
+                raise LemkPgError("Cursor should have value for each column of order_by")
+            # row comparison uses index on (a, b, ...), so page is found without scanning of previous pages
+            operand = ">" if sort_type.upper() == ORDER_BY_ASC else "<"
+            where.append(f"""({", ".join(order_by)}) {operand} ({", ".join(["%s"] * len(after))})""")
+            params += after
+        # key columns are added to the end of fields to get cursor from the last row
+        query = (f"""SELECT {", ".join(list(fields) + list(order_by))} FROM {table_name}"""
+                 f"""{" WHERE " + " AND ".join(where) if where else ""}"""
+                 f""" ORDER BY {", ".join(f"{column} {sort_type.upper()}" for column in order_by)}"""
+                 f""" LIMIT {page_size + 1}""")
+        return query, params
 
-        return conditions
+    @classmethod
+    def get_unique_rows(cls, rows, key_indexes):
+        # one INSERT ... ON CONFLICT can't change the same row twice, so the last row with the same key is kept
+        unique = {tuple(row[index] for index in key_indexes): row for row in rows}
+        return list(unique.values()) if len(unique) < len(rows) else rows
+
+    @classmethod
+    def get_partition_ranges(cls, min_value, max_value, partitions):
+        # [min_value, max_value] is split into half-open ranges [low, high) of almost equal size
+        if isinstance(min_value, bool) or not isinstance(min_value, int) or not isinstance(max_value, int):
+            message = f"Partition column should have integer values, but {type(min_value).__name__} was found"
+            raise LemkPgError(message)
+        step = -(-(max_value - min_value + 1) // partitions)
+        return [(low, min(low + step, max_value + 1)) for low in range(min_value, max_value + 1, step)]
+
+    @classmethod
+    def get_partition_query(cls, table_name, fields, partition_column, conditions_list=None):
+        conditions, params = cls.get_conditions(conditions_list) if conditions_list else ([], [])
+        where = [f"""({" ".join(conditions)})"""] if conditions else []
+        # bounds of partition are the last two params, so all partitions share one prepared statement
+        where.append(f"{partition_column} >= %s AND {partition_column} < %s")
+        query = f"""SELECT {", ".join(fields)} FROM {table_name} WHERE {" AND ".join(where)}"""
+        return query, params
+
+    @classmethod
+    def check_chunk_size(cls, chunk_size):
+        # islice with zero size gives no chunks, so rows would be silently dropped
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            message = f"Chunk size should be positive integer, but {chunk_size!r} was given"
+            raise LemkPgError(message)
+
+    @classmethod
+    def get_chunks(cls, rows, chunk_size):
+        rows = iter(rows)
+        chunk = list(itertools.islice(rows, chunk_size))
+        while chunk:
+            yield chunk
+            chunk = list(itertools.islice(rows, chunk_size))
+
+    @classmethod
+    def get_copy_text(cls, value):
+        # text of value as PostgreSQL parses it, before escaping for COPY. The most common types are checked first
+        if isinstance(value, bool):
+            return "t" if value else "f"
+        if isinstance(value, COPY_TEXT_TYPES):
+            return str(value)
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return "\\x" + bytes(value).hex()
+        if isinstance(value, datetime.timedelta):
+            return f"{value.days} days {value.seconds}.{value.microseconds:06d} seconds"
+        if isinstance(value, Json):
+            return value.dumps(value.adapted)
+        if isinstance(value, dict):
+            return json.dumps(value)
+        if isinstance(value, (list, tuple)):
+            return cls.get_array_literal(value)
+        message = f"Value of type {type(value).__name__} can't be sent via COPY"
+        raise LemkPgError(message)
+
+    @classmethod
+    def get_array_literal(cls, values):
+        items = []
+        for value in values:
+            if value is None:
+                items.append("NULL")
+            elif isinstance(value, (list, tuple)):
+                items.append(cls.get_array_literal(value))
+            else:
+                text = cls.get_copy_text(value).replace("\\", "\\\\").replace('"', '\\"')
+                items.append(f'"{text}"')
+        return "{" + ",".join(items) + "}"
 
     @classmethod
-    async def get_query_result(cls, dsn, query):
-        async with aiopg.create_pool(dsn) as pool:
-            async with pool.acquire() as conn:
+    def get_copy_value(cls, value):
+        if value is None:
+            return "\\N"
+        return (cls.get_copy_text(value).replace("\\", "\\\\").replace("\t", "\\t")
+                .replace("\n", "\\n").replace("\r", "\\r"))
+
+    @classmethod
+    def get_copy_line(cls, row):
+        return "\t".join(cls.get_copy_value(value) for value in row) + "\n"
+
+    @classmethod
+    def copy_rows(cls, cursor, query, reader):
+        try:
+            cursor.copy_expert(query, reader)
+        except psycopg2.Error:
+            if reader.error is not None:
+                raise reader.error
+            raise
+
+    @classmethod
+    def get_export_query(cls, table_or_query, format=EXPORT_CSV, header=False):
+        if format not in EXPORT_FORMATS:
+            message = f"Incorrect export format. Please use one of the valid formats: {', '.join(EXPORT_FORMATS)}"
+            raise LemkPgError(message)
+        source = table_or_query
+        if re.match(r"\s*(SELECT|WITH|VALUES|TABLE)\b", table_or_query, re.IGNORECASE):
+            source = f"({table_or_query.strip().rstrip(';')})"
+        options = f"FORMAT {format}{', HEADER' if header else ''}"
+        return f"""COPY {source} TO STDOUT WITH ({options})"""
+
+    @classmethod
+    async def fetch_rows(cls, cursor, fetch_strategy=FETCH_ALL, fetch_size=1000):
+        if fetch_strategy == FETCH_ALL:
+            return await cursor.fetchall()
+        result = []
+        if fetch_strategy == FETCH_MANY:
+            rows = await cursor.fetchmany(fetch_size)
+            while rows:
+                result.extend(rows)
+                rows = await cursor.fetchmany(fetch_size)
+        else:
+            async for row in cursor:
+                result.append(row)
+        return result
+
+    @classmethod
+    async def get_query_result(cls, engine, query, params=None, prepare=False, row_factory=None, readonly=False,
+                               tables=None):
+        row_factory = LemkPgRows.check_row_factory(row_factory) or engine.row_factory
+        cache = engine.cache
+        # results are cached only for known tables (to invalidate them on write) and outside of transaction
+        if not tables or not cache.enabled or engine.in_transaction:
+            return await cls.fetch_query_result(engine, query, params, prepare, row_factory, readonly)
+        key = cache.get_key(query, params)
+        entry = cache.get(key)
+        if entry is None:
+            versions = cache.get_versions(tables)
+            entry = await cls.fetch_query_result(engine, query, params, prepare, row_factory, readonly, raw=True)
+            if entry is None:
+                return None
+            description, rows = entry
+            entry = description, rows, LemkPgRows.has_mutable_values(rows)
+            cache.put(key, tables, versions, entry)
+        return cls.get_cached_rows(row_factory, *entry)
+
+    @classmethod
+    def get_cached_rows(cls, row_factory, description, rows, mutable):
+        # cache keeps tuple rows, so each hit gets its own rows (and copies of values like json or arrays)
+        rows = copy.deepcopy(rows) if mutable else list(rows)
+        return LemkPgRows.get_rows(row_factory, description, rows)
+
+    @classmethod
+    async def fetch_query_result(cls, engine, query, params=None, prepare=False, row_factory=None, readonly=False,
+                                 raw=False):
+        with engine.metrics.measure(query, params, "fetch_query_result") as record:
+            async with engine.acquire(readonly) as conn:
+                record.phase(PHASE_ACQUIRE)
                 async with conn.cursor() as cursor:
-                    await cursor.execute(query)
-                    result = []
+                    if prepare:
+                        await engine.statements.execute(conn, cursor, query, params)
+                    else:
+                        await cursor.execute(query, params or None)
+                    record.phase(PHASE_EXECUTE)
                     try:
-                        async for row in cursor:
-                            result.append(row)
-                        return result
+                        result = await cls.fetch_rows(cursor, engine.fetch_strategy, engine.fetch_size)
                     except psycopg2.ProgrammingError as e:
-                        print(e)
+                        # query without result rows (e.g. INSERT of raw_query)
+                        logger.debug("%s: %s", e, query)
                         return None
+                    record.phase(PHASE_FETCH)
+                    record.rows = len(result)
+                    if raw:
+                        # tuple rows and their description for result cache
+                        return cursor.description, result
+                    rows = LemkPgRows.get_rows(row_factory, cursor.description, result)
+                    record.phase(PHASE_CONVERT)
+                    return rows
 
     @classmethod
-    async def execute_query(cls, dsn, query):
-        async with aiopg.create_pool(dsn) as pool:
-            async with pool.acquire() as conn:
+    async def get_aggregates(cls, engine, table_name, aggregates, conditions_list=None, group_by=None, having=None,
+                             readonly=True):
+        query, params = cls.get_aggregates_query(table_name, aggregates, conditions_list, group_by, having)
+        rows = await cls.get_query_result(engine, query, params, prepare=True, row_factory=ROW_TUPLE,
+                                          readonly=readonly, tables=[table_name])
+        if rows is None:
+            return None
+        if not group_by:
+            # HAVING without GROUP BY can filter out the only row of result
+            return cls.get_aggregates_result(aggregates, rows[0]) if rows else None
+        groups = {}
+        for row in rows:
+            key = row[0] if len(group_by) == 1 else tuple(row[:len(group_by)])
+            groups[key] = cls.get_aggregates_result(aggregates, row[len(group_by):])
+        return groups
+
+    @classmethod
+    async def get_page(cls, engine, table_name, fields, order_by, page_size, after=None, conditions_list=None,
+                       sort_type=ORDER_BY_ASC, row_factory=None):
+        row_factory = LemkPgRows.check_row_factory(row_factory) or engine.row_factory
+        query, params = cls.get_page_query(table_name, fields, order_by, page_size, after, conditions_list, sort_type)
+        key_size = len(order_by)
+        page = {}
+
+        def get_rows(description, rows):
+            # one more row than page_size is fetched only to know if next page exists
+            page["next"] = tuple(rows[page_size - 1][-key_size:]) if len(rows) > page_size else None
+            rows = [row[:-key_size] for row in rows[:page_size]]
+            return LemkPgRows.get_rows(row_factory, description[:-key_size], rows)
+
+        rows = await cls.get_query_result(engine, query, params, prepare=True, row_factory=get_rows, readonly=True)
+        return rows, page.get("next")
+
+    @classmethod
+    async def scan_partitions(cls, engine, table_name, fields, partition_column, partitions, concurrency,
+                              conditions_list=None, row_factory=None, path=None, format=EXPORT_CSV, header=False):
+        if not isinstance(partitions, int) or partitions < 1:
+            raise LemkPgError("Count of partitions should be positive integer")
+        query, params = cls.get_partition_query(table_name, fields, partition_column, conditions_list)
+        export_query = cls.get_export_query(query, format, header) if path is not None else None
+        # bounds aren't taken from result cache, stale max value would lose new rows
+        bounds_query, bounds_params = cls.get_aggregates_query(table_name, {MIN: partition_column,
+                                                                            MAX: partition_column}, conditions_list)
+        bounds = await cls.get_query_result(engine, bounds_query, bounds_params, row_factory=ROW_TUPLE, readonly=True)
+        if not bounds or bounds[0][0] is None:
+            return
+        ranges = cls.get_partition_ranges(*bounds[0], partitions)
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def scan(index, low, high):
+            async with semaphore:
+                if path is None:
+                    return await cls.get_query_result(engine, query, params + [low, high], prepare=True,
+                                                      row_factory=row_factory, readonly=True)
+                file_path = path.format(partition=index)
+                # file is opened in binary mode, so COPY data is written as it comes from server without decoding
+                with open(file_path, "wb") as file:
+                    await cls.copy_to(engine, export_query, file, params + [low, high])
+                return file_path
+
+        tasks = [asyncio.ensure_future(scan(index, low, high)) for index, (low, high) in enumerate(ranges)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @classmethod
+    async def iter_query_batches(cls, engine, query, params=None, itersize=1000, row_factory=None, readonly=False):
+        batches = cls.fetch_query_batches(engine, query, params, itersize, row_factory, readonly)
+        if engine.in_transaction:
+            # connection of transaction is locked while batches are fetched, so consumer which suspends generator
+            # would block other queries and the end of transaction. All batches are fetched before the first one
+            batches = [batch async for batch in batches]
+            for batch in batches:
+                yield batch
+            return
+        async for batch in batches:
+            yield batch
+
+    @classmethod
+    async def fetch_query_batches(cls, engine, query, params=None, itersize=1000, row_factory=None, readonly=False):
+        row_factory = LemkPgRows.check_row_factory(row_factory) or engine.row_factory
+        # psycopg2 named cursors aren't supported for async connections of aiopg,
+        # so server-side cursor is declared manually inside transaction of one connection
+        begin, commit, rollback = cls.get_transaction_queries(engine)
+        with engine.metrics.measure(query, params, "iter_query_batches") as record:
+            async with engine.acquire(readonly) as conn:
+                record.phase(PHASE_ACQUIRE)
                 async with conn.cursor() as cursor:
-                    await cursor.execute(query)
-                    return True
+                    await cursor.execute(begin)
+                    try:
+                        await cursor.execute(f"DECLARE lemkpg_cursor NO SCROLL CURSOR FOR {query}", params or None)
+                        record.phase(PHASE_EXECUTE)
+                        while True:
+                            await cursor.execute(f"FETCH FORWARD {itersize} FROM lemkpg_cursor")
+                            rows = await cursor.fetchall()
+                            record.phase(PHASE_FETCH)
+                            if not rows:
+                                break
+                            record.rows += len(rows)
+                            rows = LemkPgRows.get_rows(row_factory, cursor.description, rows)
+                            record.phase(PHASE_CONVERT)
+                            # columnar batch is yielded as one item
+                            yield [rows] if row_factory == ROW_COLUMNS else rows
+                            record.skip()
+                    except BaseException:
+                        await cursor.execute(rollback)
+                        raise
+                    # cursor lives until the end of outer transaction, so it is closed for the next iterator
+                    await cursor.execute("CLOSE lemkpg_cursor")
+                    await cursor.execute(commit)
+
+    @classmethod
+    async def iter_query_result(cls, engine, query, params=None, itersize=1000, row_factory=None, readonly=False):
+        async for rows in cls.iter_query_batches(engine, query, params, itersize, row_factory, readonly):
+            for row in rows:
+                yield row
+
+    @classmethod
+    async def execute_query(cls, engine, query, params=None, tables=None):
+        try:
+            with engine.metrics.measure(query, params, "execute_query") as record:
+                async with engine.acquire() as conn:
+                    record.phase(PHASE_ACQUIRE)
+                    async with conn.cursor() as cursor:
+                        await cursor.execute(query, params or None)
+                        record.phase(PHASE_EXECUTE)
+                        return True
+        finally:
+            await engine.invalidate(tables or [])
+
+    @classmethod
+    async def execute_statements(cls, engine, statements, tables=None):
+        # statements are joined to one multi-statement query, so they are sent to database in one round-trip
+        begin, commit, rollback = cls.get_transaction_queries(engine)
+        try:
+            with engine.metrics.measure(";\n".join(query for query, _ in statements), None,
+                                        "execute_statements") as record:
+                async with engine.acquire() as conn:
+                    record.phase(PHASE_ACQUIRE)
+                    async with conn.cursor() as cursor:
+                        queries = [cursor.mogrify(query, params or None).decode() for query, params in statements]
+                        try:
+                            await cursor.execute(";\n".join([begin] + queries + [commit]))
+                        except BaseException:
+                            await cursor.execute(rollback)
+                            raise
+                        record.phase(PHASE_EXECUTE)
+                        return True
+        finally:
+            await engine.invalidate(tables or [])
+
+    @classmethod
+    async def gather_limited(cls, awaitables, limit, timeout=None, return_exceptions=False):
+        # "limit" workers take awaitables from one iterator, so not more than "limit" queries run at once
+        # and coroutines of map() are created only when worker is ready to await them
+        awaitables = iter(awaitables)
+        items = enumerate(awaitables)
+        results = {}
+
+        async def worker():
+            for index, awaitable in items:
+                try:
+                    results[index] = await asyncio.wait_for(awaitable, timeout) if timeout else await awaitable
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results[index] = e
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(limit, 1))]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            if inspect.isgenerator(awaitables):
+                awaitables.close()
+            else:
+                for awaitable in awaitables:
+                    if inspect.iscoroutine(awaitable):
+                        awaitable.close()
+            raise
+        return [results[index] for index in range(len(results))]
+
+    @classmethod
+    async def insert_values(cls, engine, table_name, rows, columns=None, chunk_size=1000):
+        cls.check_chunk_size(chunk_size)
+        # all chunks are inserted in one transaction, so insert_many is atomic like COPY
+        begin, commit, rollback = cls.get_transaction_queries(engine)
+        insert = f"""INSERT INTO {table_name} {'(' + ', '.join(columns) + ')' if columns else ''}"""
+        try:
+            # chunks differ only by count of rows, so they are measured as one query
+            with engine.metrics.measure(f"{insert} VALUES %s", None, "insert_values") as record:
+                async with engine.acquire() as conn:
+                    record.phase(PHASE_ACQUIRE)
+                    async with conn.cursor() as cursor:
+                        await cursor.execute(begin)
+                        try:
+                            for chunk in cls.get_chunks(rows, chunk_size):
+                                query = f"""{insert} VALUES {", ".join(["%s"] * len(chunk))}"""
+                                await cursor.execute(query, [tuple(row) for row in chunk])
+                                record.rows += len(chunk)
+                        except BaseException:
+                            await cursor.execute(rollback)
+                            raise
+                        await cursor.execute(commit)
+                        record.phase(PHASE_EXECUTE)
+                        return True
+        finally:
+            await engine.invalidate([table_name])
+
+    @classmethod
+    async def upsert_values(cls, engine, table_name, rows, columns, conflict_columns, update_columns=None,
+                            chunk_size=1000, return_keys=False):
+        cls.check_chunk_size(chunk_size)
+        # query of one row checks arguments and is used as shape of query in metrics
+        query = cls.get_upsert_query(table_name, columns, conflict_columns, update_columns, return_keys=return_keys)
+        missing = [column for column in conflict_columns if column not in columns]
+        if missing:
+            message = f"Conflict columns should be in columns, but {', '.join(missing)} are not"
+            raise LemkPgError(message)
+        key_indexes = [list(columns).index(column) for column in conflict_columns]
+        chunks = cls.get_chunks(rows, chunk_size)
+        first_chunks = list(itertools.islice(chunks, 2))
+        # one statement is atomic itself, so explicit transaction (two more round-trips) is needed only for chunks
+        transaction_queries = cls.get_transaction_queries(engine) if len(first_chunks) > 1 else None
+        keys = []
+        try:
+            with engine.metrics.measure(query, None, "upsert_values") as record:
+                async with engine.acquire() as conn:
+                    record.phase(PHASE_ACQUIRE)
+                    async with conn.cursor() as cursor:
+                        if transaction_queries:
+                            await cursor.execute(transaction_queries[0])
+                        try:
+                            for chunk in itertools.chain(first_chunks, chunks):
+                                chunk = cls.get_unique_rows(chunk, key_indexes)
+                                chunk_query = cls.get_upsert_query(table_name, columns, conflict_columns,
+                                                                   update_columns, len(chunk), return_keys)
+                                await cursor.execute(chunk_query, [tuple(row) for row in chunk])
+                                if return_keys:
+                                    keys.extend(await cursor.fetchall())
+                                record.rows += len(chunk)
+                        except BaseException:
+                            if transaction_queries:
+                                await cursor.execute(transaction_queries[2])
+                            raise
+                        if transaction_queries:
+                            await cursor.execute(transaction_queries[1])
+                        record.phase(PHASE_EXECUTE)
+                        return keys if return_keys else True
+        finally:
+            await engine.invalidate([table_name])
+
+    @classmethod
+    async def copy_from(cls, engine, table_name, rows, columns=None):
+        query = f"""COPY {table_name}{' (' + ', '.join(columns) + ')' if columns else ''} FROM STDIN"""
+
+        def copy(conn):
+            reader = LemkPgCopyReader(rows)
+            with conn.cursor() as cursor:
+                cls.copy_rows(cursor, query, reader)
+            record.rows, record.bytes = reader.rows, reader.size
+
+        try:
+            with engine.metrics.measure(query, None, "copy_from") as record:
+                async with engine.copy_connection() as conn:
+                    record.phase(PHASE_ACQUIRE)
+                    await engine.run_in_thread(copy, conn)
+                    record.phase(PHASE_EXECUTE)
+        finally:
+            await engine.invalidate([table_name])
+        return True
+
+    @classmethod
+    async def update_from_copy(cls, engine, table_name, rows, key_columns, set_columns):
+        if not key_columns or not set_columns:
+            raise LemkPgError("Please define key_columns and set_columns")
+        temp_table_name = "lemkpg_update_many"
+        columns = ", ".join(list(key_columns) + list(set_columns))
+        query = cls.get_update_from_query(table_name, temp_table_name, key_columns, set_columns)
+
+        def update(conn):
+            # all statements run in one transaction of copy connection
+            reader = LemkPgCopyReader(rows)
+            with conn.cursor() as cursor:
+                # temporary table takes types of columns from target table and is dropped at the end of transaction
+                cursor.execute(f"""CREATE TEMPORARY TABLE {temp_table_name} ON COMMIT DROP AS"""
+                               f""" SELECT {columns} FROM {table_name} WITH NO DATA""")
+                cls.copy_rows(cursor, f"""COPY {temp_table_name} ({columns}) FROM STDIN""", reader)
+                # temporary table has no statistics, without them planner can choose nested loop for big update
+                cursor.execute(f"""ANALYZE {temp_table_name}""")
+                cursor.execute(query)
+                record.rows, record.bytes = cursor.rowcount, reader.size
+                return cursor.rowcount
+
+        try:
+            with engine.metrics.measure(query, None, "update_from_copy") as record:
+                async with engine.copy_connection() as conn:
+                    record.phase(PHASE_ACQUIRE)
+                    result = await engine.run_in_thread(update, conn)
+                    record.phase(PHASE_EXECUTE)
+                return result
+        finally:
+            await engine.invalidate([table_name])
+
+    @classmethod
+    async def copy_binary_result(cls, engine, query, params=None, decoder=None):
+        # data is decoded in executor thread too, so decoding of big result doesn't block event loop
+
+        def copy(conn):
+            with conn.cursor() as cursor:
+                query_text = cursor.mogrify(query, params or None).decode()
+                # COPY doesn't return description of columns, so it is taken from empty result of the same query
+                cursor.execute(f"SELECT * FROM ({query_text}) AS lemkpg_query LIMIT 0")
+                description = cursor.description
+                record.phase(PHASE_EXECUTE)
+                data = io.BytesIO()
+                cursor.copy_expert(f"COPY ({query_text}) TO STDOUT WITH (FORMAT binary)", data)
+                record.phase(PHASE_FETCH)
+            record.bytes = data.tell()
+            result = decoder(data.getbuffer(), description)
+            record.phase(PHASE_CONVERT)
+            return result
+
+        with engine.metrics.measure(query, params, "copy_binary_result") as record:
+            async with engine.copy_connection() as conn:
+                record.phase(PHASE_ACQUIRE)
+                return await engine.run_in_thread(copy, conn)
+
+    @classmethod
+    async def copy_to(cls, engine, query, file_like, params=None):
+        # copy_expert writes data to file_like block by block as it comes from server,
+        # so rows are never materialized in memory
+
+        def copy(conn):
+            with conn.cursor() as cursor:
+                cursor.copy_expert(cursor.mogrify(query, params or None).decode() if params else query, file_like)
+                record.phase(PHASE_FETCH)
+                record.rows = cursor.rowcount
+                return cursor.rowcount
+
+        with engine.metrics.measure(query, params, "copy_to") as record:
+            async with engine.copy_connection() as conn:
+                record.phase(PHASE_ACQUIRE)
+                return await engine.run_in_thread(copy, conn)
@@ -8,10 +8,14 @@ setup(name='lemkpg',
       author_email='lemk@ukr.net',
       license='MIT',
       packages=['lemkpg'],
+      python_requires='>=3.7',
       install_requires=[
           'aiopg',
           'psycopg2',
       ],
+      extras_require={
+          'numpy': ['numpy'],
+      },
       classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,203 @@
+import asyncio
+import collections
+
+import pytest
+
+from lemkpg import cache as cache_module
+from lemkpg.cache import LemkPgResultCache
+from lemkpg.utils import LemkPgUtils
+
+Column = collections.namedtuple("Column", ["name", "type_code"])
+
+DESCRIPTION = (Column("id", 23), Column("data", 3802))
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def put(cache, key, tables=("demo",), result=None):
+    cache.put(key, tables, cache.get_versions(tables), result if result is not None else [(1,)])
+
+
+def test_disabled_by_default():
+    assert not LemkPgResultCache().enabled
+    assert LemkPgResultCache(size=1).enabled
+
+
+def test_get_key_depends_on_query_and_params():
+    key = LemkPgResultCache.get_key("SELECT 1", [1])
+    assert key == LemkPgResultCache.get_key("SELECT 1", [1])
+    assert key != LemkPgResultCache.get_key("SELECT 1", [2])
+    assert key != LemkPgResultCache.get_key("SELECT 2", [1])
+
+
+def test_get_and_put():
+    cache = LemkPgResultCache(size=2)
+    assert cache.get("a") is None
+    put(cache, "a", result=[(1,), (2,)])
+    assert cache.get("a") == [(1,), (2,)]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction():
+    cache = LemkPgResultCache(size=2)
+    put(cache, "a")
+    put(cache, "b")
+    # "a" becomes the most recently used, so "b" is evicted
+    cache.get("a")
+    put(cache, "c")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 2
+
+
+def test_ttl(clock):
+    cache = LemkPgResultCache(size=2, ttl=5)
+    put(cache, "a")
+    clock.now += 4
+    assert cache.get("a") is not None
+    clock.now += 2
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.memory == 0
+
+
+def test_invalidate_removes_results_of_table():
+    cache = LemkPgResultCache(size=10)
+    put(cache, "a", tables=("demo",))
+    put(cache, "b", tables=("demo", "other"))
+    put(cache, "c", tables=("other",))
+    cache.invalidate(["demo"])
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_result_of_read_during_write_is_not_cached():
+    cache = LemkPgResultCache(size=10)
+    versions = cache.get_versions(["demo"])
+    cache.invalidate(["demo"])
+    cache.put("a", ["demo"], versions, [(1,)])
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_memory_budget():
+    row = [("x" * 100,)]
+    memory = LemkPgResultCache.get_memory_size(row)
+    cache = LemkPgResultCache(size=10, max_memory=memory * 2)
+    put(cache, "a", result=row)
+    put(cache, "b", result=row)
+    put(cache, "c", result=row)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 2
+    assert cache.memory == memory * 2
+    # result bigger than whole budget isn't cached at all
+    put(cache, "d", result=row * 10)
+    assert cache.get("d") is None
+    assert cache.get("c") is not None
+
+
+def test_clear_and_stats():
+    cache = LemkPgResultCache(size=10)
+    put(cache, "a")
+    cache.get("a")
+    cache.get("b")
+    cache.clear()
+    stats = cache.stats()
+    assert stats["entries"] == 0
+    assert stats["memory"] == 0
+    assert stats["hit_rate"] == 0.5
+
+
+class FakeEngine:
+
+    def __init__(self, rows, in_transaction=False):
+        self.rows = rows
+        self.row_factory = None
+        self.in_transaction = in_transaction
+        self.cache = LemkPgResultCache(size=10)
+        self.fetches = 0
+
+
+@pytest.fixture
+def fetch(monkeypatch):
+
+    async def fetch_query_result(engine, query, params=None, prepare=False, row_factory=None, readonly=False,
+                                 raw=False):
+        engine.fetches += 1
+        rows = [tuple(row) for row in engine.rows]
+        return (DESCRIPTION, rows) if raw else rows
+
+    monkeypatch.setattr(LemkPgUtils, "fetch_query_result", fetch_query_result)
+
+
+def get_query_result(engine, row_factory=None, tables=("demo",)):
+    return asyncio.run(LemkPgUtils.get_query_result(engine, "SELECT * FROM demo", row_factory=row_factory,
+                                                    tables=list(tables)))
+
+
+@pytest.mark.parametrize("row_factory", ["tuple", "dict", "namedtuple", "record", "columns"])
+def test_query_result_is_cached(fetch, row_factory):
+    engine = FakeEngine([(1, "a"), (2, "b")])
+    first = get_query_result(engine, row_factory)
+    assert get_query_result(engine, row_factory) == first
+    assert engine.fetches == 1
+
+
+def test_one_entry_serves_all_row_factories(fetch):
+    engine = FakeEngine([(1, "a")])
+    assert get_query_result(engine, "tuple") == [(1, "a")]
+    assert get_query_result(engine, "dict") == [{"id": 1, "data": "a"}]
+    assert get_query_result(engine, "record")[0].data == "a"
+    assert engine.fetches == 1
+    assert engine.cache.stats()["entries"] == 1
+
+
+def test_query_result_is_not_cached_without_tables_or_in_transaction(fetch):
+    engine = FakeEngine([(1, "a")])
+    get_query_result(engine, tables=())
+    get_query_result(engine, tables=())
+    engine.in_transaction = True
+    get_query_result(engine)
+    get_query_result(engine)
+    assert engine.fetches == 4
+
+
+def test_cached_rows_can_be_changed_by_caller(fetch):
+    engine = FakeEngine([(1, "a")])
+    rows = get_query_result(engine, "dict")
+    rows[0]["id"] = 100
+    rows.append({"id": 2, "data": "b"})
+    assert get_query_result(engine, "dict") == [{"id": 1, "data": "a"}]
+    rows = get_query_result(engine, "tuple")
+    rows.clear()
+    assert get_query_result(engine, "tuple") == [(1, "a")]
+    columns = get_query_result(engine, "columns")
+    columns["id"][0] = 100
+    assert list(get_query_result(engine, "columns")["id"]) == [1]
+
+
+def test_mutable_values_of_cached_rows_are_copied(fetch):
+    engine = FakeEngine([(1, {"key": [1, 2]})])
+    rows = get_query_result(engine, "tuple")
+    rows[0][1]["key"].append(3)
+    assert get_query_result(engine, "tuple") == [(1, {"key": [1, 2]})]
+    assert engine.fetches == 1
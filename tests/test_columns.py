@@ -0,0 +1,171 @@
+import collections
+import datetime
+import decimal
+import math
+import struct
+import uuid
+
+import pytest
+
+from lemkpg.columns import COPY_BINARY_SIGNATURE, LemkPgColumns
+from lemkpg.exceptions import LemkPgError
+
+Column = collections.namedtuple("Column", ["name", "type_code"])
+
+INT2, INT4, INT8, FLOAT8, TEXT, BYTEA, UUID, NUMERIC, DATE, TIMESTAMP = 21, 23, 20, 701, 25, 17, 2950, 1700, 1082, 1114
+
+
+def get_copy_data(rows):
+    # rows are lists of encoded values (None for NULL) in COPY binary format
+    data = COPY_BINARY_SIGNATURE + struct.pack(">ii", 0, 0)
+    for row in rows:
+        data += struct.pack(">h", len(row))
+        for value in row:
+            data += struct.pack(">i", -1) if value is None else struct.pack(">i", len(value)) + value
+    return data + struct.pack(">h", -1)
+
+
+def get_numeric(digits, weight, sign, dscale):
+    return struct.pack(f">hhHh{len(digits)}H", len(digits), weight, sign, dscale, *digits)
+
+
+def decode_numeric(value):
+    return LemkPgColumns.decode_numeric(memoryview(value), 0, len(value))
+
+
+@pytest.mark.parametrize("digits, weight, sign, dscale, expected", [
+    ([1, 2345, 6780], 1, 0x0000, 3, "12345.678"),
+    ([1, 2345, 6780], 1, 0x0000, 2, "12345.67"),
+    ([12], -1, 0x4000, 4, "-0.0012"),
+    ([100], 1, 0x0000, 0, "1000000"),
+    ([5], 0, 0x0000, 2, "5.00"),
+    ([], 0, 0x0000, 2, "0.00"),
+    ([], 0, 0x0000, 0, "0"),
+])
+def test_numeric(digits, weight, sign, dscale, expected):
+    value = decode_numeric(get_numeric(digits, weight, sign, dscale))
+    assert value == decimal.Decimal(expected)
+    assert str(value) == expected
+
+
+def test_numeric_special_values():
+    assert decode_numeric(get_numeric([], 0, 0xC000, 0)).is_nan()
+    assert decode_numeric(get_numeric([], 0, 0xD000, 0)) == decimal.Decimal("Infinity")
+    assert decode_numeric(get_numeric([], 0, 0xF000, 0)) == decimal.Decimal("-Infinity")
+
+
+def test_values():
+    description = [Column("id", INT4), Column("name", TEXT), Column("data", BYTEA), Column("key", UUID),
+                   Column("day", DATE), Column("time", TIMESTAMP), Column("price", NUMERIC)]
+    key = uuid.UUID(int=7)
+    data = get_copy_data([
+        [struct.pack(">i", 1), "zoë".encode(), b"\x00\x01", key.bytes, struct.pack(">i", 1),
+         struct.pack(">q", 1500000), get_numeric([3, 1400], 0, 0x0000, 2)],
+        [struct.pack(">i", -2), None, None, None, None, None, None],
+    ])
+    assert LemkPgColumns.decode_values(data, description) == [
+        [1, -2], ["zoë", None], [b"\x00\x01", None], [key, None], [datetime.date(2000, 1, 2), None],
+        [datetime.datetime(2000, 1, 1, 0, 0, 1, 500000), None], [decimal.Decimal("3.14"), None]]
+
+
+def test_empty_result():
+    assert LemkPgColumns.decode_values(get_copy_data([]), [Column("id", INT4)]) == [[]]
+
+
+def test_columns():
+    data = get_copy_data([[struct.pack(">i", 1)], [struct.pack(">i", 2)]])
+    columns = LemkPgColumns.decode_columns(data, [Column("id", INT4)])
+    assert columns["id"].typecode == "i"
+    assert list(columns["id"]) == [1, 2]
+
+
+def test_unknown_type():
+    with pytest.raises(LemkPgError):
+        LemkPgColumns.decode_values(get_copy_data([]), [Column("point", 600)])
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"NOTCOPY\n\xff\r\n\x00" + b"\x00" * 8,
+    COPY_BINARY_SIGNATURE + b"\x00\x00",
+])
+def test_incorrect_header(data):
+    with pytest.raises(LemkPgError):
+        LemkPgColumns.decode_values(data, [Column("id", INT4)])
+
+
+def test_truncated_data():
+    data = get_copy_data([[struct.pack(">i", 1), b"abc"], [struct.pack(">i", 2), b"def"]])
+    description = [Column("id", INT4), Column("name", TEXT)]
+    for size in (len(data) - 2, len(data) - 4, len(data) - 10):
+        with pytest.raises(LemkPgError):
+            LemkPgColumns.decode_values(data[:size], description)
+
+
+def test_more_fields_than_columns():
+    data = get_copy_data([[struct.pack(">i", 1), struct.pack(">i", 2)]])
+    with pytest.raises(LemkPgError):
+        LemkPgColumns.decode_values(data, [Column("id", INT4)])
+
+
+class TestNumpy:
+
+    @pytest.fixture(autouse=True)
+    def numpy(self):
+        return pytest.importorskip("numpy")
+
+    description = [Column("id", INT8), Column("small", INT2), Column("value", FLOAT8), Column("day", DATE),
+                   Column("time", TIMESTAMP)]
+
+    def get_rows(self, count):
+        return [[struct.pack(">q", index), struct.pack(">h", -index), struct.pack(">d", index / 2),
+                 struct.pack(">i", index), struct.pack(">q", index * 1000000)] for index in range(count)]
+
+    def test_fixed_width_columns_are_read_at_once(self, numpy):
+        data = get_copy_data(self.get_rows(5))
+        columns = LemkPgColumns.decode_fixed_numpy(data, self.description)
+        assert columns is not None
+        assert columns["id"].dtype == numpy.int64
+        assert columns["small"].dtype == numpy.int16
+        assert columns["id"].tolist() == [0, 1, 2, 3, 4]
+        assert columns["day"][1] == numpy.datetime64("2000-01-02")
+        assert columns["time"][2] == numpy.datetime64("2000-01-01T00:00:02")
+
+    def test_fixed_width_path_is_the_same_as_fallback(self, numpy):
+        data = get_copy_data(self.get_rows(5))
+        fixed = LemkPgColumns.decode_fixed_numpy(data, self.description)
+        fallback = {column.name: LemkPgColumns.get_numpy_column(column.type_code, values)
+                    for column, values in zip(self.description, LemkPgColumns.decode_values(data, self.description))}
+        assert fixed.keys() == fallback.keys()
+        for name in fixed:
+            assert fixed[name].dtype == fallback[name].dtype
+            assert (fixed[name] == fallback[name]).all()
+
+    def test_nulls_use_fallback(self, numpy):
+        rows = self.get_rows(3)
+        rows[1][0] = None
+        rows[2][2] = None
+        data = get_copy_data(rows)
+        assert LemkPgColumns.decode_fixed_numpy(data, self.description) is None
+        columns = LemkPgColumns.decode_numpy(data, self.description)
+        # integer column with NULL becomes float64 with NaN
+        assert columns["id"].dtype == numpy.float64
+        assert columns["id"][0] == 0 and math.isnan(columns["id"][1])
+        assert columns["small"].dtype == numpy.int16
+        assert columns["value"].dtype == numpy.float64
+        assert math.isnan(columns["value"][2])
+
+    def test_variable_width_columns_use_fallback(self, numpy):
+        description = [Column("id", INT4), Column("name", TEXT), Column("price", NUMERIC)]
+        data = get_copy_data([[struct.pack(">i", 1), b"a", get_numeric([1], 0, 0x4000, 0)]])
+        assert LemkPgColumns.decode_fixed_numpy(data, description) is None
+        columns = LemkPgColumns.decode_numpy(data, description)
+        assert columns["id"].dtype == numpy.int32
+        assert columns["name"].tolist() == ["a"]
+        assert columns["price"].dtype == numpy.float64
+        assert columns["price"].tolist() == [-1.0]
+
+    def test_truncated_data(self, numpy):
+        data = get_copy_data(self.get_rows(3))
+        with pytest.raises(LemkPgError):
+            LemkPgColumns.decode_numpy(data[:-7], self.description)
@@ -0,0 +1,108 @@
+import datetime
+import decimal
+import uuid
+
+import pytest
+from psycopg2.extras import Json
+
+from lemkpg.exceptions import LemkPgError
+from lemkpg.utils import LemkPgCopyReader, LemkPgUtils
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, "\\N"),
+    (True, "t"),
+    (False, "f"),
+    (5, "5"),
+    (1.5, "1.5"),
+    (decimal.Decimal("1.50"), "1.50"),
+    ("text", "text"),
+    ("", ""),
+    (datetime.date(2006, 1, 5), "2006-01-05"),
+    (datetime.datetime(2006, 1, 5, 10, 30), "2006-01-05 10:30:00"),
+    (datetime.time(10, 30), "10:30:00"),
+    (uuid.UUID(int=1), "00000000-0000-0000-0000-000000000001"),
+    (b"\x00\xff", "\\\\x00ff"),
+    (memoryview(b"\x01"), "\\\\x01"),
+])
+def test_scalar_values(value, expected):
+    assert LemkPgUtils.get_copy_value(value) == expected
+
+
+def test_special_characters_are_escaped():
+    assert LemkPgUtils.get_copy_value("a\tb\nc\rd\\e") == "a\\tb\\nc\\rd\\\\e"
+    # NULL marker inside text is text, not NULL
+    assert LemkPgUtils.get_copy_value("\\N") == "\\\\N"
+
+
+def test_interval():
+    assert LemkPgUtils.get_copy_value(datetime.timedelta(days=1, seconds=5)) == "1 days 5.000000 seconds"
+    assert LemkPgUtils.get_copy_value(datetime.timedelta(seconds=-1, microseconds=5)) == \
+        "-1 days 86399.000005 seconds"
+
+
+def test_json():
+    assert LemkPgUtils.get_copy_value({"key": [1, None]}) == '{"key": [1, null]}'
+    assert LemkPgUtils.get_copy_value(Json({"key": "a\tb"})) == '{"key": "a\\\\tb"}'
+
+
+def test_array():
+    assert LemkPgUtils.get_copy_value([1, 2, None]) == '{"1","2",NULL}'
+    assert LemkPgUtils.get_copy_value((True, False)) == '{"t","f"}'
+    assert LemkPgUtils.get_copy_value([[1, 2], [3, 4]]) == '{{"1","2"},{"3","4"}}'
+    assert LemkPgUtils.get_copy_value([]) == "{}"
+    # quotes and backslashes are escaped for array literal, then backslashes are escaped again for COPY
+    assert LemkPgUtils.get_copy_value(['a"b', "c\\d", "NULL"]) == '{"a\\\\"b","c\\\\\\\\d","NULL"}'
+
+
+def test_unsupported_value():
+    with pytest.raises(LemkPgError):
+        LemkPgUtils.get_copy_value(object())
+    with pytest.raises(LemkPgError):
+        LemkPgUtils.get_copy_value([{1, 2}])
+
+
+def test_copy_line():
+    assert LemkPgUtils.get_copy_line((1, None, "a\tb")) == "1\t\\N\ta\\tb\n"
+
+
+def test_reader_reads_all_rows():
+    reader = LemkPgCopyReader([(1, "a"), (2, None)])
+    assert reader.read() == "1\ta\n2\t\\N\n"
+    assert reader.read() == ""
+    assert reader.rows == 2
+    assert reader.size == 9
+
+
+def test_reader_reads_blocks_of_size():
+    rows = [(index, "x" * 5) for index in range(10)]
+    reader = LemkPgCopyReader(iter(rows))
+    blocks = []
+    block = reader.read(7)
+    while block:
+        assert len(block) <= 7
+        blocks.append(block)
+        block = reader.read(7)
+    assert "".join(blocks) == "".join(LemkPgUtils.get_copy_line(row) for row in rows)
+    assert reader.rows == 10
+    assert reader.size == sum(len(block) for block in blocks)
+
+
+def test_reader_takes_rows_lazily():
+    taken = []
+
+    def rows():
+        for index in range(100):
+            taken.append(index)
+            yield (index,)
+
+    reader = LemkPgCopyReader(rows())
+    reader.read(4)
+    assert len(taken) < 100
+
+
+def test_reader_keeps_error():
+    reader = LemkPgCopyReader([(1,), (object(),)])
+    with pytest.raises(LemkPgError):
+        reader.read()
+    assert isinstance(reader.error, LemkPgError)
@@ -0,0 +1,170 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from lemkpg import engine as engine_module
+from lemkpg.engine import LemkPgEngine, LemkPgTransactionEngine
+
+
+class FakeCursor:
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    async def execute(self, query, params=None):
+        self.queries.append(query)
+
+
+class FakeAsyncConnection:
+
+    closed = False
+
+    def __init__(self):
+        self.queries = []
+
+    @contextlib.asynccontextmanager
+    async def cursor(self):
+        yield FakeCursor(self.queries)
+
+
+class FakePool:
+
+    def __init__(self):
+        self.closed = False
+        self.size = 1
+        self.freesize = 1
+        self.conn = FakeAsyncConnection()
+
+    async def acquire(self):
+        self.freesize -= 1
+        return self.conn
+
+    async def release(self, conn):
+        self.freesize += 1
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    pools = []
+
+    async def create_pool(dsn, **kwargs):
+        # concurrent get_pool() calls wait for lock while pool is created
+        await asyncio.sleep(0)
+        pools.append(FakePool())
+        return pools[-1]
+
+    monkeypatch.setattr(engine_module.aiopg, "create_pool", create_pool)
+    return pools
+
+
+def test_pool_is_created_once(pools):
+    engine = LemkPgEngine("dbname=test")
+
+    async def main():
+        return await asyncio.gather(engine.get_pool(), engine.get_pool(), engine.get_pool())
+
+    assert asyncio.run(main()) == [pools[0]] * 3
+    assert len(pools) == 1
+
+
+def test_pool_is_opened_again_after_close_in_another_loop(pools):
+    engine = LemkPgEngine("dbname=test")
+
+    async def get_pools():
+        return await asyncio.gather(engine.get_pool(), engine.get_pool())
+
+    asyncio.run(get_pools())
+    asyncio.run(engine.close())
+    assert pools[0].closed
+    assert engine.closed
+    assert asyncio.run(get_pools()) == [pools[1]] * 2
+    assert len(pools) == 2
+
+
+def test_transaction_connection_is_counted_in_pool_stats(pools):
+    engine = LemkPgEngine("dbname=test")
+
+    async def main():
+        tx = await LemkPgTransactionEngine(engine).begin()
+        assert engine.busy == 1
+        assert engine.get_pool_stats()["in_use"] == 1
+        await tx.end()
+
+    asyncio.run(main())
+    stats = engine.get_pool_stats()
+    assert stats["acquires"] == 1
+    assert sum(stats["wait_histogram"].values()) == 1
+    assert stats["in_use"] == 0
+    assert engine.busy == 0
+    assert pools[0].conn.queries == ["BEGIN", "COMMIT"]
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = 0
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    connections = []
+
+    def connect(dsn):
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(engine_module.psycopg2, "connect", connect)
+    return connections
+
+
+def test_copy_connections_are_reused(connections):
+    engine = LemkPgEngine("dbname=test", maxsize=2)
+
+    async def use(count):
+        async with engine.copy_connection():
+            await asyncio.sleep(0)
+        await asyncio.gather(*(use_one() for _ in range(count)))
+
+    async def use_one():
+        async with engine.copy_connection():
+            await asyncio.sleep(0.01)
+
+    asyncio.run(use(3))
+    # the first connection is reused, gather opens one more and waits for free one instead of opening third
+    assert len(connections) == 2
+    assert engine.get_pool_stats()["copy_size"] == 2
+    assert engine.get_pool_stats()["copy_idle"] == 2
+    asyncio.run(engine.close())
+    assert all(conn.closed for conn in connections)
+    assert engine.copy_size == 0
+    assert engine.closed
+
+
+def test_broken_copy_connection_isnt_kept(connections):
+    engine = LemkPgEngine("dbname=test")
+
+    async def fail():
+        async with engine.copy_connection() as conn:
+            conn.closed = 2
+            raise ValueError("connection lost")
+
+    with pytest.raises(ValueError):
+        asyncio.run(fail())
+    assert engine.get_pool_stats()["copy_idle"] == 0
+    assert engine.copy_size == 0
@@ -0,0 +1,31 @@
+import pytest
+
+from lemkpg.exceptions import LemkPgError
+from lemkpg.utils import LemkPgUtils
+
+
+def test_first_page():
+    assert LemkPgUtils.get_page_query("demo", ["date"], ["id"], 10) == \
+        ("SELECT date, id FROM demo ORDER BY id ASC LIMIT 11", [])
+
+
+def test_next_page():
+    assert LemkPgUtils.get_page_query("demo", ["date"], ["date", "id"], 2, after=("2006-01-05", 3),
+                                      conditions_list=[("price", ">", 1, None)], sort_type="desc") == \
+        ("SELECT date, date, id FROM demo WHERE (price > %s) AND (date, id) < (%s, %s) ORDER BY date DESC, id DESC "
+         "LIMIT 3", [1, "2006-01-05", 3])
+
+
+@pytest.mark.parametrize("page_size", [0, -1, 1.5, "10", None])
+def test_incorrect_page_size(page_size):
+    with pytest.raises(LemkPgError):
+        LemkPgUtils.get_page_query("demo", ["date"], ["id"], page_size)
+
+
+def test_incorrect_order_by_and_cursor():
+    with pytest.raises(LemkPgError):
+        LemkPgUtils.get_page_query("demo", ["date"], [], 10)
+    with pytest.raises(LemkPgError):
+        LemkPgUtils.get_page_query("demo", ["date"], ["date", "id"], 10, after=3)
+    with pytest.raises(LemkPgError):
+        LemkPgUtils.get_page_query("demo", ["date"], ["id"], 10, sort_type="UP")
@@ -0,0 +1,81 @@
+import pytest
+
+from lemkpg.exceptions import LemkPgError
+from lemkpg.query import LemkPgQuery
+from lemkpg.utils import LemkPgUtils
+
+ON_CONDITION = ("demo.trans", "=", "datatable.trans")
+
+
+@pytest.fixture
+def query():
+    return LemkPgQuery("demo", executor=None)
+
+
+def get_sql(query):
+    return LemkPgQuery.get_sql(*query.get_key())
+
+
+def test_select(query):
+    assert get_sql(query) == ("SELECT * FROM demo", 0)
+    assert get_sql(query.select("id", "date")) == ("SELECT id, date FROM demo", 0)
+
+
+def test_where(query):
+    assert get_sql(query.where("id", "=")) == ("SELECT * FROM demo WHERE id = %s", 1)
+    assert get_sql(query.where("id", "=").where("price", ">").or_where("symbol", "=")) == \
+        ("SELECT * FROM demo WHERE id = %s AND price > %s OR symbol = %s", 3)
+
+
+def test_distinct_and_order_by(query):
+    assert get_sql(query.select("date").distinct().order_by("date", "DESC")) == \
+        ("SELECT DISTINCT date FROM demo ORDER BY date DESC", 0)
+    assert get_sql(query.order_by("id")) == ("SELECT * FROM demo ORDER BY id ASC", 0)
+
+
+def test_update(query):
+    assert get_sql(query.update("price", "symbol").where("id", "=")) == \
+        ("UPDATE demo SET price = %s, symbol = %s WHERE id = %s", 3)
+    with pytest.raises(LemkPgError):
+        get_sql(query.update())
+
+
+def test_delete(query):
+    assert get_sql(query.delete()) == ("DELETE FROM demo", 0)
+    assert get_sql(query.delete().where("id", "<")) == ("DELETE FROM demo WHERE id < %s", 1)
+
+
+def test_join(query):
+    joined = query.join("datatable", "INNER JOIN", ON_CONDITION).select("demo.id").where("demo.id", ">")
+    assert get_sql(joined) == \
+        ("SELECT demo.id FROM demo INNER JOIN datatable ON demo.trans = datatable.trans WHERE demo.id > %s", 1)
+    # the same SQL as get_with_join, so both share prepared statements
+    assert get_sql(joined)[0] == LemkPgUtils.get_join_query("demo", "datatable", "INNER JOIN", ["demo.id"],
+                                                            ON_CONDITION, [("demo.id", ">", 1, None)])[0]
+    with pytest.raises(LemkPgError):
+        get_sql(query.join("datatable", "CROSS", ON_CONDITION))
+
+
+def test_join_with_distinct_and_order_by(query):
+    joined = query.join("datatable", "LEFT JOIN", ON_CONDITION).select("demo.date")
+    assert get_sql(joined.distinct().order_by("demo.date", "DESC")) == \
+        ("SELECT DISTINCT demo.date FROM demo LEFT JOIN datatable ON demo.trans = datatable.trans "
+         "ORDER BY demo.date DESC", 0)
+
+
+def test_compile(query):
+    compiled = query.join("datatable", "INNER JOIN", ON_CONDITION).where("demo.id", "=").compile()
+    assert compiled.param_count == 1
+    assert compiled.tables == ["demo", "datatable"]
+    assert compiled.readonly
+    compiled = query.delete().where("id", "=").compile()
+    assert compiled.tables == ["demo"]
+    assert not compiled.readonly
+    with pytest.raises(LemkPgError):
+        compiled()
+
+
+def test_builder_methods_return_new_query(query):
+    filtered = query.where("id", "=")
+    assert query.conditions == ()
+    assert filtered.conditions == (("id", "=", None),)